@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+#
+# Copyright 2024 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+# Compare finding the Zuul configuration files with os.walk over the whole
+# directory tree (as get_config_paths() used to do) with the scanner that
+# checks only the known locations, e.g. on a full nova checkout:
+#
+#   git clone https://opendev.org/openstack/nova /tmp/nova
+#   tools/benchmark-config-paths.py /tmp/nova
+#
+
+from argparse import ArgumentParser
+import logging
+import os
+import re
+import timeit
+
+from znoyder.lib import utils
+
+
+def get_config_paths_walk(local_path: str) -> list:
+    zuul_config_files = []
+    zuul_file_regex = re.compile('|'.join(utils.ZUUL_CONFIGS))
+
+    for root, subdirs, files in os.walk(local_path):
+        for zuul_config_dir in utils.ZUUL_CONFIG_DIRS:
+            if root.endswith(zuul_config_dir):
+                for walk_file in files:
+                    zuul_config_files.append(os.path.join(root, walk_file))
+
+        for walk_file in files:
+            if zuul_file_regex.match(walk_file):
+                zuul_config_files.append(os.path.join(root, walk_file))
+
+    return zuul_config_files
+
+
+def main() -> None:
+    parser = ArgumentParser(description='Benchmark finding Zuul configs.')
+    parser.add_argument('directory',
+                        help='path to directory with zuul configuration')
+    parser.add_argument('-r', '--rounds', type=int, default=5,
+                        help='number of times the directory is searched')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    scanners = [
+        ('os.walk', lambda: get_config_paths_walk(args.directory)),
+        ('scandir', lambda: utils.get_config_paths(args.directory)),
+        ('recursive', lambda: utils.get_config_paths(args.directory,
+                                                     recursive=True)),
+    ]
+
+    results = {}
+    for name, scanner in scanners:
+        found = len(scanner())
+        results[name] = min(timeit.repeat(scanner, repeat=args.rounds,
+                                          number=1))
+        print(f'{name:>10}: {results[name] * 1000:.2f}ms, {found} files '
+              f'(best of {args.rounds})')
+
+    for name in ('scandir', 'recursive'):
+        speedup = results['os.walk'] / results[name]
+        print(f'{name:>10}: {speedup:.1f}x faster than os.walk')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+#
+# Copyright 2024 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+# Compare matching of the project, tag and job specifiers from the rules
+# in config.d done by compiling regular expression on every call (as the
+# match() function used to do) with the precompiled specifiers:
+#
+#   tools/benchmark-specifiers.py
+#
+
+from argparse import ArgumentParser
+import re
+import timeit
+
+from znoyder.config import add_map
+from znoyder.config import copy_map
+from znoyder.config import exclude_map
+from znoyder.config import override_map
+from znoyder.lib.utils import match
+
+
+def match_uncompiled(string: str, specifier: str) -> bool:
+    if specifier.startswith('/') and specifier.endswith('/'):
+        return bool(re.compile(specifier[1:-1]).search(string))
+    else:
+        return bool(re.compile(specifier).fullmatch(string))
+
+
+def collect_specifiers() -> dict:
+    specifiers = {'projects': set(), 'tags': set(), 'jobs': set()}
+
+    for rules_map in (exclude_map, add_map, override_map, copy_map):
+        for project, tags in rules_map.items():
+            specifiers['projects'].add(project)
+            for tag, jobs in tags.items():
+                specifiers['tags'].add(tag)
+                if isinstance(jobs, dict):
+                    specifiers['jobs'].update(jobs)
+                else:  # copy rules are a list of single-key mappings
+                    for entry in jobs:
+                        specifiers['jobs'].update(entry)
+
+    return {kind: sorted(values) for kind, values in specifiers.items()}
+
+
+def run(function, specifiers: dict) -> None:
+    # Every known value is checked against every specifier of its kind,
+    # like the mapper does for each project, tag and job
+    for values in specifiers.values():
+        for specifier in values:
+            for value in values:
+                function(value, specifier)
+
+
+def main() -> None:
+    parser = ArgumentParser(description='Benchmark the specifiers matching.')
+    parser.add_argument('-r', '--rounds', type=int, default=5,
+                        help='number of times all specifiers are matched')
+    args = parser.parse_args()
+
+    specifiers = collect_specifiers()
+    calls = sum(len(values) ** 2 for values in specifiers.values())
+    print('Specifiers: ' + ', '.join(f'{len(values)} {kind}'
+                                     for kind, values in specifiers.items()))
+    print(f'Matches per round: {calls}')
+
+    results = {}
+    for name, function in [('uncompiled', match_uncompiled),
+                           ('match()', match)]:
+        results[name] = min(timeit.repeat(
+            lambda: run(function, specifiers),
+            repeat=args.rounds, number=1
+        ))
+        print(f'{name:>12}: {results[name]:.3f}s (best of {args.rounds})')
+
+    speedup = results['uncompiled'] / results['match()']
+    print(f'{"speedup":>12}: {speedup:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
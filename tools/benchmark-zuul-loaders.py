@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+#
+# Copyright 2024 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+# Compare the pure Python and libyaml-backed Zuul loaders on a corpus
+# of Zuul configuration files, e.g. the openstack-zuul-jobs repository:
+#
+#   znoyder download --branch master --destination files-upstream/ \
+#       --repo https://opendev.org/openstack/openstack-zuul-jobs
+#   tools/benchmark-zuul-loaders.py \
+#       files-upstream/openstack/openstack-zuul-jobs
+#
+
+from argparse import ArgumentParser
+import timeit
+
+from znoyder.lib import utils
+from znoyder.lib.zuul import extract_config
+from znoyder.lib.zuul import ExtractionError
+from znoyder.lib.zuul import ZuulCSafeLoader
+from znoyder.lib.zuul import ZuulSafeLoader
+
+
+def load_corpus(directory: str) -> list:
+    corpus = []
+
+    for path in utils.get_config_paths(directory):
+        with open(path, 'r') as file:
+            corpus.append(file.read())
+
+    return corpus
+
+
+def parse_corpus(loader, corpus: list) -> None:
+    for data in corpus:
+        loader(data, 'null').get_single_data()
+
+
+def extract_corpus(corpus: list) -> None:
+    for data in corpus:
+        try:
+            extract_config(data, ['check', 'gate'])
+        except ExtractionError:
+            ZuulCSafeLoader(data, 'null').get_single_data()
+
+
+def main() -> None:
+    parser = ArgumentParser(description='Benchmark the Zuul YAML loaders.')
+    parser.add_argument('directory',
+                        help='path to directory with zuul configuration')
+    parser.add_argument('-r', '--rounds', type=int, default=5,
+                        help='number of times the corpus is parsed')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.directory)
+    size = sum(len(data) for data in corpus)
+    print(f'Corpus: {len(corpus)} files, {size} characters')
+
+    loaders = [('pure Python', ZuulSafeLoader)]
+    if ZuulCSafeLoader is not None:
+        loaders.append(('libyaml', ZuulCSafeLoader))
+    else:
+        print('libyaml is not available, skipping the C loader')
+
+    results = {}
+    for name, loader in loaders:
+        results[name] = min(timeit.repeat(
+            lambda: parse_corpus(loader, corpus),
+            repeat=args.rounds, number=1
+        ))
+        print(f'{name:>12}: {results[name]:.3f}s (best of {args.rounds})')
+
+    if len(results) == 2:
+        speedup = results['pure Python'] / results['libyaml']
+        print(f'{"speedup":>12}: {speedup:.1f}x')
+
+        extraction = min(timeit.repeat(
+            lambda: extract_corpus(corpus),
+            repeat=args.rounds, number=1
+        ))
+        print(f'{"extraction":>12}: {extraction:.3f}s (best of {args.rounds})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+#
+# Copyright 2024 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+from znoyder.lib import logger
+from znoyder.lib.cache import FileCache
+
+
+LOG = logger.LOG
+
+CACHE_FILE = 'jobs.db'
+
+STATS_HEADER = ('function', 'entries', 'size', 'hits', 'misses',
+                'hit-ratio', 'saved')
+
+
+def format_stats(stats: dict) -> list:
+    rows = []
+
+    for function, values in sorted(stats.items()):
+        calls = values['hits'] + values['misses']
+        ratio = f'{values["hits"] / calls:.0%}' if calls else '-'
+        rows.append((function, str(values['entries']), str(values['size']),
+                     str(values['hits']), str(values['misses']), ratio,
+                     f'{values["time_saved"]:.1f}s'))
+
+    return rows
+
+
+def print_table(header: tuple, rows: list) -> None:
+    widths = [max(len(row[index]) for row in [header] + rows)
+              for index in range(len(header))]
+
+    for row in [header, tuple('-' * width for width in widths)] + rows:
+        print('  '.join(value.ljust(width)
+                        for value, width in zip(row, widths)).rstrip())
+
+
+def main(args) -> None:
+    cache = FileCache(args.cache_file)
+
+    if args.subcommand == 'stats':
+        print_table(STATS_HEADER, format_stats(cache.stats()))
+
+    elif args.subcommand == 'list':
+        for key in cache.keys(args.pattern):
+            print(key)
+
+    elif args.subcommand == 'evict':
+        removed = cache.evict(args.pattern)
+        cache.save()
+        LOG.info(f'Evicted {removed} cache entries')
+
+    elif args.subcommand == 'purge':
+        if args.all:
+            removed = len(cache)
+            cache.clear()
+            cache.save()
+        else:
+            removed = cache.purge()
+        LOG.info(f'Purged {removed} cache entries')
@@ -24,9 +24,11 @@ from argparse import _SubParsersAction
 from argparse import _UNRECOGNIZED_ARGS_ATTR
 from argparse import SUPPRESS
 from argparse import ArgumentError
+from argparse import ArgumentTypeError
 import os
 
 from znoyder import browser
+from znoyder import cacher
 from znoyder import downloader
 from znoyder import finder
 from znoyder import generator
@@ -102,6 +104,18 @@ class OverridenSubparserAction(_SubParsersAction):
             getattr(namespace, _UNRECOGNIZED_ARGS_ATTR).extend(arg_strings)
 
 
+def non_negative_int(value) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+
+    if number < 0:
+        raise ArgumentTypeError(f'expected 0 or more, got {value!r}')
+
+    return number
+
+
 def extend_parser_browser(parser) -> None:
     subparsers = parser.add_subparsers(dest='subcommand', metavar='subcommand')
     subparsers.required = True
@@ -132,6 +146,32 @@ def extend_parser_browser(parser) -> None:
     releases.add_argument('--tag', dest='tag')
 
 
+def extend_parser_cacher(parser) -> None:
+    parser.add_argument('--cache-file', dest='cache_file',
+                        default=cacher.CACHE_FILE,
+                        help='path to the cache file, default is jobs.db')
+
+    subparsers = parser.add_subparsers(dest='subcommand', metavar='subcommand')
+    subparsers.required = True
+
+    subparsers.add_parser('stats',
+                          help='show entries, hits, misses and time saved'
+                               ' of every cached function')
+
+    list_keys = subparsers.add_parser('list', help='list keys of entries')
+    list_keys.add_argument('pattern', nargs='?', default='*',
+                           help='shell-style pattern of keys to list')
+
+    evict = subparsers.add_parser('evict', help='remove matching entries')
+    evict.add_argument('pattern',
+                       help='shell-style pattern of keys to remove')
+
+    purge = subparsers.add_parser('purge', help='remove expired entries')
+    purge.add_argument('--all', dest='all',
+                       default=False, action='store_true',
+                       help='remove all entries instead')
+
+
 def extend_parser_downloader(parser) -> None:
     parser.add_argument(
         '-r', '--repo', '--repository',
@@ -168,6 +208,14 @@ def extend_parser_downloader(parser) -> None:
         action='store_true',
         help='do not overwrite existing files'
     )
+    parser.add_argument(
+        '-m', '--mode',
+        dest='mode',
+        default='contents',
+        choices=downloader.DOWNLOAD_MODES,
+        help='how to find the files: list directories with contents API'
+             ' (default), list the whole git tree or fetch an archive'
+    )
 
 
 def extend_parser_finder(parser) -> None:
@@ -193,6 +241,10 @@ def extend_parser_finder(parser) -> None:
 
 
 def extend_parser_generator(parser) -> None:
+    parser.add_argument('-j', '--jobs', dest='jobs',
+                        type=non_negative_int, default=1,
+                        help='number of processes to discover jobs with,'
+                             ' 0 means as many as CPUs, default is 1')
     parser.add_argument('--component', dest='component',
                         help='OSP component name to filter projects')
     parser.add_argument('--name', dest='name',
@@ -217,6 +269,11 @@ COMMANDS = {
         'module': browser,
         'extend_parser_func': extend_parser_browser
     },
+    'cache': {
+        'help': 'inspect and maintain the cache of generated data',
+        'module': cacher,
+        'extend_parser_func': extend_parser_cacher
+    },
     'download': {
         'help': 'fetch Zuul configuration files from repository',
         'module': downloader,
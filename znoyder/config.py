@@ -23,6 +23,7 @@ except ImportError:  # Fallback for Python < 3.7
 
 import yaml
 
+from znoyder.lib.utils import compile_specifiers
 from znoyder.lib.utils import merge_dicts
 
 
@@ -43,6 +44,11 @@ add_map = CONFIG.get('add', {})
 override_map = CONFIG.get('override', {})
 copy_map = CONFIG.get('copy', {})
 
+# Projects, tags and jobs specifiers are compiled once, when loaded
+for rules_map in (exclude_map, add_map, override_map):
+    compile_specifiers(rules_map, depth=3)
+compile_specifiers(copy_map, depth=2)
+
 UPSTREAM_CONFIGS_DIR = 'files-upstream/'
 GENERATED_CONFIGS_DIR = 'files-generated/'
 GENERATED_CONFIG_PREFIX = 'cre-'
@@ -16,17 +16,26 @@
 #    under the License.
 #
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 import json
-from multiprocessing import cpu_count
-from multiprocessing import Pool
 from os import getenv
 import os.path
 from pathlib import Path
 from sys import exit
+import tarfile
+import threading
+from time import sleep
+from time import time
+from urllib.parse import quote
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from znoyder.lib.cache import FileCache
+from znoyder.lib.cache import write_atomically
 from znoyder.lib import logger
 
 
@@ -38,33 +47,249 @@ OPENDEV_API_URL = 'https://opendev.org/api/v1/'
 REPO_ENDPOINT = 'repos/{project}/'
 CONTENT_ENDPOINT = 'contents/{path}?ref={gitref}'
 
+GITHUB_COMMITS_ENDPOINT = 'commits?sha={gitref}&per_page=1'
+GITHUB_TREE_ENDPOINT = 'git/trees/{gitref}?recursive=1'
+GITHUB_ARCHIVE_ENDPOINT = 'tarball/{gitref}'
+GITHUB_RAW_URL = 'https://raw.githubusercontent.com/{project}/{gitref}/{path}'
+OPENDEV_COMMITS_ENDPOINT = 'commits?sha={gitref}&limit=1&stat=false'
+OPENDEV_TREE_ENDPOINT = 'git/trees/{gitref}?recursive=true&page={page}'
+OPENDEV_ARCHIVE_ENDPOINT = 'archive/{gitref}.tar.gz'
+OPENDEV_RAW_URL = OPENDEV_API_URL + REPO_ENDPOINT + 'raw/{path}?ref={gitref}'
+
+DOWNLOAD_MODES = ('contents', 'tree', 'archive')
+
+HTTP_POOL_SIZE = int(getenv('ZNOYDER_HTTP_POOL_SIZE', 16))
+HTTP_RETRIES = 5
+HTTP_BACKOFF_FACTOR = 0.5  # seconds, doubled after each failed attempt
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+HTTP_RATE_LIMIT_MAX_WAIT = 300  # seconds
+
+DOWNLOAD_CONCURRENCY = HTTP_POOL_SIZE  # requests in flight at once
+
+HTTP_METADATA_FILE = 'http.db'
+HTTP_METADATA_TTL = 30 * 24 * 60 * 60  # 30 days in seconds
+HTTP_METADATA_MAX_BYTES = 64 * 1024 * 1024
+
+ZUUL_CONFIG_WANTED = {
+    'directories': ['zuul.d', '.zuul.d'],
+    'files': ['zuul.yaml', '.zuul.yaml']
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+# ETag and Last-Modified of fetched URLs, with the body of listings
+http_metadata = FileCache(HTTP_METADATA_FILE,
+                          max_bytes=HTTP_METADATA_MAX_BYTES)
+
+
+def get_session(pool_size: int = None, retries: int = None,
+                backoff_factor: float = None) -> requests.Session:
+    '''Returns the HTTP session shared by all the requests of the module.
+
+    The session keeps the connections alive in a pool, so consecutive
+    requests to the same host reuse them, and retries the requests that
+    failed with 429 or 5xx status, with an exponential backoff between
+    attempts and respecting the Retry-After header sent by the server.
+
+    Passing any of the parameters replaces the shared session with a new
+    one, configured with given values instead of module defaults.
+    '''
+    defaults = all(value is None for value in
+                   (pool_size, retries, backoff_factor))
+
+    # The first requests of concurrent downloads ask for it all at once
+    with _session_lock:
+        if _session is None or not defaults:
+            _replace_session(pool_size, retries, backoff_factor)
+
+        return _session
+
+
+def _replace_session(pool_size, retries, backoff_factor) -> None:
+    global _session
+
+    retry = Retry(
+        total=HTTP_RETRIES if retries is None else retries,
+        backoff_factor=(HTTP_BACKOFF_FACTOR if backoff_factor is None
+                        else backoff_factor),
+        status_forcelist=HTTP_RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # give the last response to the caller
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE if pool_size is None else pool_size,
+        pool_maxsize=HTTP_POOL_SIZE if pool_size is None else pool_size,
+        max_retries=retry,
+    )
+
+    if _session is not None:
+        _session.close()
+
+    _session = requests.Session()
+    _session.mount('https://', adapter)
+    _session.mount('http://', adapter)
+
+
+def _drop_session() -> None:
+    # Pooled connections must not be shared with the forked processes,
+    # and the lock might have been held by other thread while forking
+    global _session, _session_lock
+    _session = None
+    _session_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_drop_session)
+
+
+def get_rate_limit_delay(response) -> float:
+    '''Returns the number of seconds to wait until the GitHub rate limit
+       resets, if the response was rejected due to it, None otherwise.'''
+    if response.status_code not in (403, 429):
+        return None
+
+    headers = response.headers or {}
+    if headers.get('X-RateLimit-Remaining') != '0':
+        return None
+
+    try:
+        reset = float(headers.get('X-RateLimit-Reset'))
+    except (TypeError, ValueError):
+        return None
+
+    return max(reset - time(), 0) + 1
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    '''Sends GET request using the shared session, waiting for the reset
+       of GitHub rate limit when it is exhausted (up to a limit).'''
+    for attempt in range(HTTP_RETRIES + 1):
+        response = get_session().get(url=url, **kwargs)
+        delay = get_rate_limit_delay(response)
+
+        if delay is None or attempt == HTTP_RETRIES:
+            return response
+
+        if delay > HTTP_RATE_LIMIT_MAX_WAIT:
+            LOG.error(f'Rate limit exceeded, reset in {int(delay)} seconds')
+            return response
+
+        LOG.warning(f'Rate limit exceeded, waiting {int(delay)} seconds')
+        sleep(delay)
+
+
+class StoredResponse(object):
+    '''Response replayed from the HTTP metadata store, when the server
+       confirmed with 304 that the resource has not been modified.'''
+    status_code = 200
+
+    def __init__(self, url: str, text: str):
+        self.url = url
+        self.text = text
+        self.content = text.encode()
+        self.headers = {}
+
+
+def conditional_get(url: str, file_path: str = None, **kwargs):
+    '''Sends GET request with the validators recorded for given URL.
+
+    When the server replies with 304 Not Modified, the listing body kept
+    in the metadata store is replayed as StoredResponse. For a file URL
+    (with `file_path` given) the 304 response is returned as is, so the
+    caller can keep the local copy; validators are sent only when that
+    local copy exists. On 200 the new validators of a listing are
+    recorded, while those of a file have to be recorded by the caller
+    with record_validators() once the file is stored.
+    '''
+    entry = http_metadata.get(url, {})
+    headers = {}
+
+    if entry and (file_path is None or os.path.exists(file_path)):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last-modified'):
+            headers['If-Modified-Since'] = entry['last-modified']
+
+    if headers:
+        kwargs['headers'] = headers
+
+    response = http_get(url=url, **kwargs)
+
+    if response.status_code == 304:
+        LOG.info(f'Not modified: {url}')
+        if file_path is None:
+            return StoredResponse(url, entry['body'])
+        return response
+
+    if response.status_code == 200 and file_path is None:
+        record_validators(url, response, body=response.text)
+
+    return response
+
+
+def record_validators(url: str, response, body: str = None) -> None:
+    '''Records the validators of response to given URL, with the body to
+       replay for a listing, or forgets the previous ones if there are
+       none. They expire after a while, so the URLs which are not used
+       anymore, e.g. of old branches, do not pile up.'''
+    validators = {
+        key: response.headers[header]
+        for key, header in (('etag', 'ETag'),
+                            ('last-modified', 'Last-Modified'))
+        if response.headers.get(header)
+    }
+
+    if validators:
+        if body is not None:
+            validators['body'] = body
+        http_metadata.set(url, validators,
+                          expires=time() + HTTP_METADATA_TTL)
+    elif url in http_metadata:
+        del http_metadata[url]
+
+
+def get_repository_host(repository: str, errors_fatal: bool = True) -> str:
+    if 'opendev.org' in repository:
+        return 'opendev.org'
+    elif 'github.com' in repository:
+        return 'github.com'
+
+    LOG.error('Unrecognized or unsupported repository host.')
+    LOG.error('The tool supports github.com and opendev.org repositories.')
+    if errors_fatal:
+        exit(1)
+
+    return None
+
+
+def get_github_auth() -> tuple:
+    if getenv('GITHUB_USERNAME') and getenv('GITHUB_TOKEN'):
+        return (getenv('GITHUB_USERNAME'), getenv('GITHUB_TOKEN'))
+
+    return None
+
 
 def get_raw_url_files_in_repository(repository: str,
                                     data_required: dict,
                                     branch: str = 'master',
                                     errors_fatal: bool = True) -> dict:
-    if 'opendev.org' in repository:
+    host = get_repository_host(repository, errors_fatal)
+
+    if host == 'opendev.org':
         ENDPOINT = (OPENDEV_API_URL + REPO_ENDPOINT + CONTENT_ENDPOINT)
         AUTH = None
-    elif 'github.com' in repository:
+    elif host == 'github.com':
         ENDPOINT = (GITHUB_API_URL + REPO_ENDPOINT + CONTENT_ENDPOINT)
-        AUTH = None
-
-        if getenv('GITHUB_USERNAME') and getenv('GITHUB_TOKEN'):
-            AUTH = (getenv('GITHUB_USERNAME'), getenv('GITHUB_TOKEN'))
+        AUTH = get_github_auth()
     else:
-        LOG.error('Unrecognized or unsupported repository host.')
-        LOG.error('The tool supports github.com and opendev.org repositories.')
-        if errors_fatal:
-            exit(1)
-        else:
-            return {}
+        return {}
 
     project_name = '/'.join(repository.split('/')[-2:])
-    response = requests.get(url=ENDPOINT.format(project=project_name,
-                                                path='.',
-                                                gitref=branch),
-                            auth=AUTH)
+    response = conditional_get(url=ENDPOINT.format(project=project_name,
+                                                   path='.',
+                                                   gitref=branch),
+                               auth=AUTH)
 
     LOG.info(f'Requested: {response.url}')
     if response.status_code != 200:
@@ -88,10 +313,12 @@ def get_raw_url_files_in_repository(repository: str,
             )
 
         if file_name in data_required['directories']:
-            response = requests.get(url=ENDPOINT.format(project=project_name,
-                                                        path=file_name,
-                                                        gitref=branch),
-                                    auth=AUTH)
+            response = conditional_get(
+                url=ENDPOINT.format(project=project_name,
+                                    path=file_name,
+                                    gitref=branch),
+                auth=AUTH
+            )
 
             for directory_file_information in json.loads(response.text):
                 if directory_file_information['type'] != 'file':
@@ -104,9 +331,218 @@ def get_raw_url_files_in_repository(repository: str,
     return url_files
 
 
+def _select_zuul_config_path(project_name: str, path: str,
+                             data_required: dict) -> str:
+    '''Returns the key under which a file at given path in repository
+       should be collected, or None if it is not wanted at all.'''
+    directory, file_name = os.path.split(path)
+
+    if not directory and file_name in data_required['files']:
+        return project_name
+    if directory in data_required['directories']:
+        return f'{project_name}/{directory}'
+
+    return None
+
+
+def get_last_commit(endpoint: str, project_name: str, gitref: str,
+                    auth=None, errors_fatal: bool = True) -> str:
+    '''Returns SHA of the last commit of the branch (or other reference)
+       with the commits API endpoint, or None on errors.'''
+    response = http_get(url=endpoint.format(project=project_name,
+                                            gitref=quote(gitref, safe='')),
+                        auth=auth)
+
+    LOG.info(f'Requested: {response.url}')
+    commits = json.loads(response.text) if response.status_code == 200 \
+        else None
+    if not commits:
+        LOG.error('Error getting the last commit of remote repository.')
+        LOG.error(f'Details: {response.text}')
+        if errors_fatal:
+            exit(1)
+        return None
+
+    return commits[0]['sha']
+
+
+def get_raw_url_files_in_tree(repository: str,
+                              data_required: dict,
+                              branch: str = 'master',
+                              errors_fatal: bool = True) -> dict:
+    '''Works like get_raw_url_files_in_repository(), but lists the whole
+       repository with a single recursive git trees API request (a few
+       pages of it in case of Gitea) instead of one per directory.'''
+    host = get_repository_host(repository, errors_fatal)
+
+    if host == 'opendev.org':
+        ENDPOINT = (OPENDEV_API_URL + REPO_ENDPOINT + OPENDEV_TREE_ENDPOINT)
+        COMMITS = (OPENDEV_API_URL + REPO_ENDPOINT + OPENDEV_COMMITS_ENDPOINT)
+        RAW_URL = OPENDEV_RAW_URL
+        AUTH = None
+    elif host == 'github.com':
+        ENDPOINT = (GITHUB_API_URL + REPO_ENDPOINT + GITHUB_TREE_ENDPOINT)
+        COMMITS = (GITHUB_API_URL + REPO_ENDPOINT + GITHUB_COMMITS_ENDPOINT)
+        RAW_URL = GITHUB_RAW_URL
+        AUTH = get_github_auth()
+    else:
+        return {}
+
+    project_name = '/'.join(repository.split('/')[-2:])
+    url_files = {}
+    page = 1
+
+    # The trees endpoints take the reference as a single path segment,
+    # so branches like stable/2023.1 are resolved to their last commit
+    tree = branch
+    if '/' in branch:
+        tree = get_last_commit(COMMITS, project_name, branch, AUTH,
+                               errors_fatal)
+        if tree is None:
+            return {project_name: []}
+
+    while True:
+        response = http_get(url=ENDPOINT.format(project=project_name,
+                                                gitref=tree,
+                                                page=page),
+                            auth=AUTH)
+
+        LOG.info(f'Requested: {response.url}')
+        if response.status_code != 200:
+            LOG.error('Error getting the tree of remote repository.')
+            LOG.error(f'Details: {response.text}')
+            if errors_fatal:
+                exit(1)
+            else:
+                return {project_name: []}
+
+        data = json.loads(response.text)
+
+        for entry in data.get('tree', []):
+            if entry.get('type') != 'blob':
+                continue
+
+            key = _select_zuul_config_path(project_name, entry['path'],
+                                           data_required)
+            if key:
+                url_files.setdefault(key, []).append(
+                    RAW_URL.format(project=project_name, gitref=branch,
+                                   path=entry['path'])
+                )
+
+        # GitHub truncates only huge trees, while Gitea paginates them
+        if not data.get('truncated'):
+            break
+        if host == 'github.com':
+            LOG.warning(f'Truncated tree of repository: {project_name}')
+            break
+        page += 1
+
+    return url_files
+
+
+def download_zuul_config_archive(repository: str,
+                                 data_required: dict,
+                                 branch: str,
+                                 destination: str,
+                                 errors_fatal: bool = True) -> dict:
+    '''Fetches the repository as a single tarball and extracts from it only
+       the wanted files. Returns the same structure as the listing
+       functions, but with paths of files in repository instead of URLs.'''
+    host = get_repository_host(repository, errors_fatal)
+
+    if host == 'opendev.org':
+        ENDPOINT = (OPENDEV_API_URL + REPO_ENDPOINT + OPENDEV_ARCHIVE_ENDPOINT)
+        AUTH = None
+    elif host == 'github.com':
+        ENDPOINT = (GITHUB_API_URL + REPO_ENDPOINT + GITHUB_ARCHIVE_ENDPOINT)
+        AUTH = get_github_auth()
+    else:
+        return {}
+
+    project_name = '/'.join(repository.split('/')[-2:])
+    response = http_get(url=ENDPOINT.format(project=project_name,
+                                            gitref=branch),
+                        auth=AUTH, stream=True)
+
+    LOG.info(f'Requested: {response.url}')
+    if response.status_code != 200:
+        LOG.error('Error getting the archive of remote repository.')
+        if errors_fatal:
+            exit(1)
+        else:
+            return {project_name: []}
+
+    files = {}
+
+    with tarfile.open(fileobj=response.raw, mode='r|gz') as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+
+            # Archives keep everything in a single top-level directory
+            path = member.name.split('/', 1)[-1]
+            key = _select_zuul_config_path(project_name, path, data_required)
+            if not key:
+                continue
+
+            destination_directory = os.path.join(destination, key)
+            Path(destination_directory).mkdir(parents=True, exist_ok=True)
+            file_path = os.path.join(destination_directory,
+                                     os.path.basename(path))
+
+            LOG.info(f'Extracting: {path} -> {file_path}')
+            write_atomically(file_path, archive.extractfile(member).read())
+
+            files.setdefault(key, []).append(path)
+
+    return files
+
+
+def get_file_name(url: str) -> str:
+    return url.split('?')[0].split('/')[-1]
+
+
+def remove_stale_zuul_config(destination: str, project_directory: str,
+                             project_files: dict) -> None:
+    '''Removes the local Zuul config files of the project which are not
+       in the listing of the repository anymore, so the files deleted
+       upstream are not parsed with the rest.
+
+       Nothing is removed when the listing is empty or incomplete, i.e.
+       any of its entries has no files, as it happens on errors.'''
+    if not project_files or not all(project_files.values()):
+        return
+
+    wanted = {
+        key: {get_file_name(url) for url in urls}
+        for key, urls in project_files.items()
+    }
+
+    locations = [(project_directory, ZUUL_CONFIG_WANTED['files'])]
+    locations.extend(
+        (f'{project_directory}/{directory}', None)
+        for directory in ZUUL_CONFIG_WANTED['directories']
+    )
+
+    for key, names in locations:
+        directory = os.path.join(destination, key)
+        if not os.path.isdir(directory):
+            continue
+
+        for entry in os.scandir(directory):
+            if not entry.is_file() or entry.name in wanted.get(key, ()):
+                continue
+            if names is not None and entry.name not in names:
+                continue
+
+            LOG.info(f'Removing file deleted upstream: {entry.path}')
+            os.remove(entry.path)
+
+
 def download_file(url: str, destination_directory: str,
                   skip_existing: bool = False) -> None:
-    file_name = url.split('/')[-1]
+    file_name = get_file_name(url)
     file_path = f'{destination_directory}/{file_name}'
     LOG.info(f'Processing: {url} -> {file_path}')
 
@@ -119,66 +555,170 @@ def download_file(url: str, destination_directory: str,
 
     try:
         LOG.info(f'Downloading new file: {file_path}')
-        data = requests.get(url)
-        with open(file_path, 'wb') as file:
-            file.write(data.content)
+        data = conditional_get(url, file_path=file_path)
+        if data.status_code == 304:
+            LOG.info(f'Keeping the not modified file: {file_path}')
+            return
+
+        # The validators must never describe a partially written file
+        write_atomically(file_path, data.content)
+        if data.status_code == 200:
+            record_validators(url, data)
 
     except Exception as e:
         LOG.error(f'Error downloading file: {file_path}.\nDetails: {repr(e)}')
         exit(1)
 
 
-def download_files_parallel(urls: list, destination_directory: str,
-                            skip_existing: bool = False) -> None:
-    Path(destination_directory).mkdir(parents=True, exist_ok=True)
-    pool = Pool(cpu_count())
+class DownloadEngine(object):
+    '''Runs the blocking downloader functions concurrently on asyncio.
+
+    All the requests, be it directory listings or file downloads for any
+    of the repositories, share a single limit of concurrent operations.
+    They are executed in a thread pool, using the shared HTTP session.
+    '''
+
+    def __init__(self, concurrency: int = DOWNLOAD_CONCURRENCY):
+        self.concurrency = concurrency
+        self._executor = None
+        self._semaphore = None
+
+    def run(self, coroutine):
+        try:
+            with ThreadPoolExecutor(self.concurrency) as self._executor:
+                return asyncio.run(self._run(coroutine))
+        finally:
+            if http_metadata.changed:
+                http_metadata.save()
+
+    async def _run(self, coroutine):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return await coroutine
+
+    async def call(self, function, *args, **kwargs):
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, partial(function, *args, **kwargs)
+            )
 
-    download_function = partial(
-        download_file,
-        destination_directory=destination_directory,
-        skip_existing=skip_existing
-    )
+    async def download_files(self, urls: list, destination_directory: str,
+                             skip_existing: bool = False) -> None:
+        Path(destination_directory).mkdir(parents=True, exist_ok=True)
+
+        await asyncio.gather(*[
+            self.call(download_file, url, destination_directory,
+                      skip_existing=skip_existing)
+            for url in urls
+        ])
+
+    async def download_zuul_config(self, repository: str, branch: str,
+                                   destination: str,
+                                   errors_fatal: bool = True,
+                                   skip_existing: bool = False,
+                                   mode: str = 'contents') -> dict:
+        project_directory = '/'.join(repository.split('/')[-2:])
+        final_destination = os.path.join(destination, project_directory)
+
+        if os.path.exists(final_destination):
+            LOG.warning(f'Directory already exists: {final_destination}')
+
+            if skip_existing:
+                LOG.info(f'Skipping the download to: {final_destination}')
+                return {project_directory: []}
+
+        if mode == 'archive':
+            project_files = await self.call(
+                download_zuul_config_archive,
+                repository,
+                ZUUL_CONFIG_WANTED,
+                branch,
+                destination,
+                errors_fatal
+            )
+            remove_stale_zuul_config(destination, project_directory,
+                                     project_files)
+            return project_files
+
+        project_urls = await self.call(
+            get_raw_url_files_in_tree if mode == 'tree'
+            else get_raw_url_files_in_repository,
+            repository,
+            ZUUL_CONFIG_WANTED,
+            branch,
+            errors_fatal
+        )
+
+        await asyncio.gather(*[
+            self.download_files(project_urls[project_directory],
+                                f'{destination}/{project_directory}',
+                                skip_existing=skip_existing)
+            for project_directory in project_urls
+        ])
 
-    pool.map(download_function, urls)
-    pool.close()
-    pool.join()
+        remove_stale_zuul_config(destination, project_directory,
+                                 project_urls)
+        return project_urls
 
+    async def download_zuul_configs(self, repositories: list,
+                                    **kwargs) -> dict:
+        repositories = list(dict.fromkeys(repositories))  # drop duplicates
 
-def download_zuul_config(**kwargs):
-    data_wanted = {
-        'directories': ['zuul.d', '.zuul.d'],
-        'files': ['zuul.yaml', '.zuul.yaml']
-    }
+        results = await asyncio.gather(*[
+            self.download_zuul_config(repository, **kwargs)
+            for repository in repositories
+        ])
 
-    repository = kwargs.get('repository')
-    branch = kwargs.get('branch')
-    destination = kwargs.get('destination')
-    errors_fatal = kwargs.get('errors_fatal', True)
-    skip_existing = kwargs.get('skip_existing', False)
+        return dict(zip(repositories, results))
 
-    project_directory = '/'.join(repository.split('/')[-2:])
-    final_destination = os.path.join(destination, project_directory)
 
-    if os.path.exists(final_destination):
-        LOG.warning(f'Directory already exists: {final_destination}')
+def download_files_parallel(urls: list, destination_directory: str,
+                            skip_existing: bool = False) -> None:
+    engine = DownloadEngine()
+    engine.run(engine.download_files(urls, destination_directory,
+                                     skip_existing=skip_existing))
+
+
+def download_zuul_configs(repositories: list, branch: str, destination: str,
+                          errors_fatal: bool = True,
+                          skip_existing: bool = False,
+                          concurrency: int = DOWNLOAD_CONCURRENCY,
+                          mode: str = 'contents') -> dict:
+    '''Fetches Zuul configuration of many repositories at once.
+
+    The `mode` selects how the files are found and fetched: 'contents'
+    lists the repository root and Zuul directories with the contents API,
+    'tree' lists the whole repository with the git trees API, 'archive'
+    downloads the repository tarball and extracts only Zuul files from it.
+
+    Returns dictionary with the result of download_zuul_config() for each
+    of given repositories.
+    '''
+    if mode not in DOWNLOAD_MODES:
+        raise ValueError(f'Unknown download mode: {mode}')
+
+    engine = DownloadEngine(concurrency)
+    return engine.run(engine.download_zuul_configs(
+        repositories,
+        branch=branch,
+        destination=destination,
+        errors_fatal=errors_fatal,
+        skip_existing=skip_existing,
+        mode=mode
+    ))
 
-        if skip_existing:
-            LOG.info(f'Skipping the download to: {final_destination}')
-            return {project_directory: []}
-
-    project_urls = get_raw_url_files_in_repository(
-        repository,
-        data_wanted,
-        branch,
-        errors_fatal
-    )
 
-    for project_directory in project_urls:
-        download_files_parallel(project_urls[project_directory],
-                                f'{destination}/{project_directory}',
-                                skip_existing=skip_existing)
+def download_zuul_config(**kwargs):
+    repository = kwargs.get('repository')
 
-    return project_urls
+    return download_zuul_configs(
+        repositories=[repository],
+        branch=kwargs.get('branch'),
+        destination=kwargs.get('destination'),
+        errors_fatal=kwargs.get('errors_fatal', True),
+        skip_existing=kwargs.get('skip_existing', False),
+        mode=kwargs.get('mode') or 'contents'
+    )[repository]
 
 
 def main(args) -> None:
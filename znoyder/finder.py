@@ -32,8 +32,11 @@ def find_jobs(directory, templates, pipelines):
     LOG.debug('Directory: %s' % directory)
     zuul_jobs = set()
 
+    # Only the lists of jobs are needed, not the source marks nor
+    # definitions of jobs and other pipelines
     project = zuul.ZuulProject(project_path=directory,
-                               templates=templates)
+                               templates=templates, marks=False,
+                               pipelines=pipelines)
 
     zuul_jobs.update(project.get_list_of_jobs(pipelines))
 
@@ -44,13 +47,15 @@ def find_jobs(directory, templates, pipelines):
     return list(zuul_jobs)
 
 
-def find_templates(directories, pipelines):
+def find_templates(directories, pipelines, processes=1):
     LOG.debug('Directories: %s' % directories)
 
-    zuul_templates = []
+    zuul_templates = zuul.TemplateRegistry()
 
     for directory in directories.split(','):
-        project = zuul.ZuulProject(project_path=directory)
+        project = zuul.ZuulProject(project_path=directory,
+                                   processes=processes, marks=False,
+                                   pipelines=pipelines)
         templates = project.get_list_of_defined_templates(pipelines)
         zuul_templates.extend(templates)
 
@@ -77,7 +82,7 @@ def _cli_find_jobs(directory, templates, pipelines):
     for pipeline in pipelines.split(','):
         pipelines_list.append(zuul.ZuulPipeline.to_type(pipeline))
 
-    zuul_templates = []
+    zuul_templates = zuul.TemplateRegistry()
 
     for template_dir in templates.split(','):
         project = zuul.ZuulProject(project_path=template_dir)
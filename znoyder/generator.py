@@ -34,13 +34,20 @@ from znoyder import downloader
 from znoyder import finder
 from znoyder.lib.cache import FileCache
 from znoyder.lib import logger
+from znoyder.lib import utils
+from znoyder.lib.zuul import TemplateRegistry
 from znoyder import mapper
 from znoyder import templater
 
 
 LOG = logger.LOG
 
-cache = FileCache('jobs.db')
+CACHE_TTL = 24 * 60 * 60  # 1 day in seconds
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+cache = FileCache('jobs.db', max_bytes=CACHE_MAX_BYTES)
+cache.register_key_function(TemplateRegistry,
+                            lambda templates: templates.fingerprint)
 
 
 def cleanup_generated_jobs_dir() -> None:
@@ -61,7 +68,7 @@ def cleanup_generated_jobs_dir() -> None:
     Path(destination_directory).mkdir(parents=True, exist_ok=True)
 
 
-@cache
+@cache(ttl=CACHE_TTL)
 def fetch_templates_directory():
     templates_repository = 'https://opendev.org/openstack/openstack-zuul-jobs'
     templates_branch = 'master'
@@ -71,7 +78,7 @@ def fetch_templates_directory():
         branch=templates_branch,
         destination=UPSTREAM_CONFIGS_DIR,
         errors_fatal=False,
-        skip_existing=True
+        skip_existing=False
     )
 
     templates_directory = list(templates_urls.keys())[0]
@@ -79,7 +86,28 @@ def fetch_templates_directory():
     return templates_directory
 
 
-@cache(readable=True)
+@cache('path', 'pipelines', 'fingerprint', 'version', readable=True)
+def discover_templates(path, pipelines, fingerprint, version, processes=1):
+    # The fingerprint and version are only part of the cache key,
+    # so any change to the templates or snapshot format is noticed.
+    return finder.find_templates(path, pipelines, processes).serialize()
+
+
+def fetch_templates(pipelines, processes=1) -> TemplateRegistry:
+    templates_directory = fetch_templates_directory()
+    path = os.path.join(UPSTREAM_CONFIGS_DIR, templates_directory)
+    fingerprint = utils.get_files_fingerprint(utils.get_config_paths(path))
+
+    snapshot = discover_templates(path, pipelines, fingerprint,
+                                  TemplateRegistry.SNAPSHOT_VERSION,
+                                  processes)
+
+    templates = TemplateRegistry.deserialize(snapshot)
+    templates.fingerprint = fingerprint
+    return templates
+
+
+@cache(readable=True, ttl=CACHE_TTL)
 def fetch_osp_projects(branch: str, filters: dict) -> list:
     projects = {package.get('osp-project'): package.get('upstream')
                 for package in browser.get_packages(**filters)
@@ -89,23 +117,26 @@ def fetch_osp_projects(branch: str, filters: dict) -> list:
         if project not in projects:
             projects[project] = extra_projects[project]
 
-    for osp_name, repository in projects.items():
-        project_urls = downloader.download_zuul_config(
-            repository=repository,
-            branch=branch,
-            destination=os.path.join(UPSTREAM_CONFIGS_DIR, branch),
-            errors_fatal=False,
-            skip_existing=True
-        )
+    repositories_urls = downloader.download_zuul_configs(
+        repositories=list(projects.values()),
+        branch=branch,
+        destination=os.path.join(UPSTREAM_CONFIGS_DIR, branch),
+        errors_fatal=False,
+        skip_existing=False
+    )
 
-        for directory in project_urls.keys():
+    for osp_name, repository in projects.items():
+        for directory in repositories_urls[repository].keys():
             projects[osp_name] = os.path.join(branch, directory)
 
     return projects
 
 
-@cache('path', readable=True)
-def discover_upstream_jobs(path, templates, pipelines):
+@cache(readable=True)
+def discover_upstream_jobs(path, templates, pipelines, fingerprint):
+    # The templates are represented in the key by their fingerprint and
+    # the fingerprint of project files is only part of the key, so jobs
+    # are found again only when the project files or templates change.
     return sorted(finder.find_jobs(path, templates, pipelines))
 
 
@@ -117,13 +148,14 @@ def discover_jobs(project_name, osp_tag, directory,
         path = os.path.join(UPSTREAM_CONFIGS_DIR, directory)
         if os.path.exists(path):
             LOG.info(f'Including from: {directory}')
-            upstream_jobs = discover_upstream_jobs(path, templates, pipelines)
+            fingerprint = utils.get_files_fingerprint(
+                utils.get_config_paths(path)
+            )
+            upstream_jobs = discover_upstream_jobs(path, templates,
+                                                   pipelines, fingerprint)
             jobs = mapper.include_jobs(upstream_jobs, osp_tag)
 
-    jobs = mapper.exclude_jobs(jobs, project_name, osp_tag)
-    jobs = mapper.add_jobs(jobs, project_name, osp_tag)
-    jobs = mapper.override_jobs(jobs, project_name, osp_tag)
-    jobs = mapper.copy_jobs(jobs, project_name, osp_tag)
+    jobs = mapper.map_jobs(jobs, project_name, osp_tag)
 
     LOG.info(f'Jobs number: {len(jobs)}')
     for job in jobs:
@@ -132,6 +164,64 @@ def discover_jobs(project_name, osp_tag, directory,
     return jobs
 
 
+# Arguments shared by all the tasks of a worker process
+_worker_templates = None
+_worker_pipelines = None
+
+
+def _init_discover_jobs_worker(templates, pipelines) -> None:
+    # With the fork start method the templates are shared copy-on-write,
+    # otherwise they are passed to the worker as a serialized copy.
+    global _worker_templates, _worker_pipelines
+    _worker_templates = templates
+    _worker_pipelines = pipelines
+    cache.pop_changes()  # the ones inherited from the main process
+
+
+def _discover_jobs_worker(task) -> tuple:
+    project_name, osp_tag, directory = task
+    cache.reset_counters()
+
+    LOG.info(f'Processing: {project_name} ({directory})')
+    jobs = discover_jobs(project_name, osp_tag, directory,
+                         _worker_templates, _worker_pipelines)
+
+    # Hand over the new cache entries and access times of the hits, so
+    # the main process can save them
+    entries, accessed = cache.pop_changes()
+
+    return jobs, entries, accessed, cache.counters
+
+
+def discover_projects_jobs(projects, osp_tag, templates, pipelines,
+                           processes=1) -> list:
+    if processes == 1:
+        results = []
+        for project_name, directory in projects.items():
+            LOG.info(f'Processing: {project_name} ({directory})')
+            results.append(discover_jobs(project_name, osp_tag, directory,
+                                         templates, pipelines))
+        return results
+
+    context = utils.get_process_context()
+
+    tasks = [(project_name, osp_tag, directory)
+             for project_name, directory in projects.items()]
+
+    with context.Pool(processes or os.cpu_count(),
+                      initializer=_init_discover_jobs_worker,
+                      initargs=(templates, pipelines)) as pool:
+        outputs = pool.map(_discover_jobs_worker, tasks)
+
+    results = []
+    for jobs, entries, accessed, counters in outputs:  # same order
+        cache.merge_changes(entries, accessed)
+        cache.merge_counters(counters)
+        results.append(jobs)
+
+    return results
+
+
 def generate_projects_pipelines_dict(args):
     # The scheme is: projects{} -> pipelines{} -> jobs[]
     projects_pipelines_dict = defaultdict(lambda: defaultdict(list))
@@ -141,6 +231,10 @@ def generate_projects_pipelines_dict(args):
     else:
         tags = list(branches_map.keys())
 
+    # The templates come from the master branch regardless of the tag
+    pipelines = finder.find_pipelines('check,gate')
+    templates = fetch_templates(pipelines, args.jobs)
+
     for osp_tag in tags:
         upstream_branch = branches_map.get(osp_tag, {}).get('upstream')
         downstream_branch = branches_map.get(osp_tag, {}).get('downstream')
@@ -159,7 +253,6 @@ def generate_projects_pipelines_dict(args):
 
         LOG.info('Downloading Zuul configuration from upstream...')
         LOG.info(f'Zuul configuration files: {UPSTREAM_CONFIGS_DIR}')
-        templates_directory = fetch_templates_directory()
         projects = fetch_osp_projects(
             branch=upstream_branch,
             filters=ospinfo_filters,
@@ -170,19 +263,14 @@ def generate_projects_pipelines_dict(args):
                         f'{ospinfo_filters}.')
             continue
 
-        path = os.path.join(UPSTREAM_CONFIGS_DIR, templates_directory)
-
-        pipelines = finder.find_pipelines('check,gate')
-        templates = finder.find_templates(path, pipelines)
-
         LOG.info('Generating new downstream configuration files...')
         LOG.info(f'Output path: {GENERATED_CONFIGS_DIR}')
 
-        for project_name, directory in projects.items():
-            LOG.info(f'Processing: {project_name} ({directory})')
-            jobs = discover_jobs(project_name, osp_tag, directory,
-                                 templates, pipelines)
+        projects_jobs = discover_projects_jobs(projects, osp_tag,
+                                               templates, pipelines,
+                                               args.jobs)
 
+        for project_name, jobs in zip(projects, projects_jobs):
             if not jobs and project_name not in projects_pipelines_dict:
                 projects_pipelines_dict[project_name] = defaultdict(list)
 
@@ -261,6 +349,10 @@ def main(args) -> None:
     generate_projects_config(projects_pipelines_dict)
     generate_resources_config(projects_pipelines_dict)
 
+    cache.report()
+
     if cache.changed:
         LOG.info('Saving cache file')
-        cache.save()
+
+    # Also records access times and evicts entries, when nothing changed
+    cache.save()
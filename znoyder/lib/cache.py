@@ -16,64 +16,516 @@
 #    under the License.
 #
 
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
 from functools import wraps
 import hashlib
 import math
 import os
 import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+from time import perf_counter
+from time import time
 
 import yaml
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
 from znoyder.lib import logger
-from znoyder.lib.utils import get_args_dict
 from znoyder.lib.yaml import NoAliasDumper
 
 
 LOG = logger.LOG
 
+SQLITE_HEADER = b'SQLite format 3\x00'
+SQLITE_TIMEOUT = 60  # seconds to wait for other writers
+
+# Files already checked for the legacy format by the current process
+_checked_files = set()
+
+if yaml.__with_libyaml__:
+    SafeLoader = yaml.CSafeLoader
+else:  # pragma: no cover
+    SafeLoader = yaml.SafeLoader
+
+
+def dump_yaml(data) -> str:
+    return yaml.dump(
+        data,
+        Dumper=NoAliasDumper,
+        default_flow_style=False,
+        sort_keys=True,
+        width=math.inf,
+    )
+
+
+def stable_repr(value) -> str:
+    '''Returns representation of the value that does not depend on memory
+       addresses nor on the order of items in dictionaries and sets. It is
+       used to derive keys from arguments that cannot be pickled.
+
+       Raises TypeError for objects without any state to be represented
+       by, e.g. functions or locks, as they could not be told apart.'''
+    if isinstance(value, (str, bytes, int, float, bool, type(None))):
+        return repr(value)
+
+    if isinstance(value, dict):
+        items = sorted(f'{stable_repr(key)}: {stable_repr(item)}'
+                       for key, item in value.items())
+        return '{' + ', '.join(items) + '}'
+
+    if isinstance(value, (set, frozenset)):
+        return '{' + ', '.join(sorted(map(stable_repr, value))) + '}'
+
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(map(stable_repr, value)) + ']'
+
+    # Objects with custom state are represented by it, not by attributes
+    getstate = getattr(type(value), '__getstate__', None)
+    if getstate is not None \
+            and getstate is not getattr(object, '__getstate__', None):
+        return f'{type(value).__qualname__}({stable_repr(getstate(value))})'
+
+    if getattr(value, '__dict__', None):
+        return f'{type(value).__qualname__}({stable_repr(vars(value))})'
+
+    slots = {name: getattr(value, name)
+             for cls in type(value).__mro__
+             for name in getattr(cls, '__slots__', ())
+             if hasattr(value, name)}
+    if slots:
+        return f'{type(value).__qualname__}({stable_repr(slots)})'
+
+    raise TypeError(f'No stable representation of {type(value).__qualname__}'
+                    ' object')
+
+
+def get_function_name(key: str) -> str:
+    '''Returns name of the cached function from a cache key.'''
+    return key.split('(', 1)[0]
+
+
+def new_counters() -> dict:
+    return {'hits': 0, 'misses': 0, 'key_time': 0.0, 'time_saved': 0.0}
+
+
+@contextmanager
+def file_lock(filename):
+    '''Holds an exclusive advisory lock on a file next to the given one,
+       so concurrent processes do not modify the same cache at once.'''
+    if fcntl is None:  # pragma: no cover
+        yield
+        return
+
+    with open(filename + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def write_atomically(filename, data) -> None:
+    '''Writes data (str or bytes) to a temporary file and moves it in
+       place, so readers never see a partially written file, even if the
+       writer is killed.'''
+    directory, name = os.path.split(os.path.abspath(filename))
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    file = tempfile.NamedTemporaryFile(mode, dir=directory, prefix=name + '.',
+                                       suffix='.tmp', delete=False)
+    try:
+        with file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(filename):
+            shutil.copymode(filename, file.name)
+        os.replace(file.name, filename)
+    except BaseException:
+        os.unlink(file.name)
+        raise
+
+
+class YAMLBackend(object):
+    '''Keeps all entries in a single YAML file, read and written as
+       a whole.'''
+
+    lazy = False
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def read_all(self) -> dict:
+        if not os.path.exists(self.filename):
+            return {}
+
+        with open(self.filename, 'r') as file:
+            return yaml.safe_load(file) or {}
+
+    def write(self, entries, deleted=(), clear=False, expires=None,
+              accessed=None, durations=None, counters=None) -> dict:
+        '''Merges the changes into entries currently stored in the file,
+           which may have been saved by other process in the meantime,
+           and returns the merged entries. Expiration and access times,
+           durations and counters are not kept in this format.'''
+        with file_lock(self.filename):
+            merged = {} if clear else self.read_all()
+            for key in deleted:
+                merged.pop(key, None)
+            merged.update(entries)
+
+            write_atomically(self.filename,
+                             '---\n' + dump_yaml(merged) + '\n')
+
+        return merged
+
+
+class SQLiteBackend(object):
+    '''Keeps every entry in a separate row of SQLite database, so entries
+       are read only when requested and only changed ones are written.
+
+       Each row also records its size, the last access time and optional
+       expiration time, which are used to drop stale entries and to evict
+       the least recently used ones, and the duration of the call which
+       computed the value. Hits and misses of every cached function are
+       accumulated in a separate table.'''
+
+    lazy = True
+
+    COLUMNS = {
+        'size': 'INTEGER NOT NULL DEFAULT 0',
+        'accessed': 'REAL NOT NULL DEFAULT 0',
+        'expires': 'REAL',
+        'duration': 'REAL NOT NULL DEFAULT 0',
+    }
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        return self._local.connection
+
+    def _connect(self, create=False):
+        # Connections must not be shared with forked processes, and sqlite3
+        # does not allow to use them from other threads, so each thread of
+        # each process opens its own
+        if getattr(self._local, 'pid', None) == os.getpid():
+            return self._local.connection
+
+        if not create and not os.path.exists(self.filename):
+            return None
+
+        # Migration and schema changes must not race with other processes
+        with file_lock(self.filename):
+            legacy = self._read_legacy()
+
+            self._local.connection = sqlite3.connect(self.filename,
+                                                     timeout=SQLITE_TIMEOUT)
+            self._local.pid = os.getpid()
+            # Readers are not blocked by a concurrent writer in WAL mode
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            with self._connection:
+                self._connection.execute(
+                    'CREATE TABLE IF NOT EXISTS cache '
+                    '(key TEXT PRIMARY KEY, value TEXT NOT NULL)'
+                )
+                self._connection.execute(
+                    'CREATE TABLE IF NOT EXISTS stats '
+                    '(function TEXT PRIMARY KEY, '
+                    'hits INTEGER NOT NULL DEFAULT 0, '
+                    'misses INTEGER NOT NULL DEFAULT 0, '
+                    'time_saved REAL NOT NULL DEFAULT 0)'
+                )
+                self._upgrade_schema()
+
+            if legacy:
+                self.write(legacy)
+
+        return self._connection
+
+    def _upgrade_schema(self):
+        columns = [row[1] for row in self._connection.execute(
+            'PRAGMA table_info(cache)'
+        )]
+
+        for name, definition in self.COLUMNS.items():
+            if name not in columns:
+                self._connection.execute(
+                    f'ALTER TABLE cache ADD COLUMN {name} {definition}'
+                )
+
+        if 'size' not in columns:
+            self._connection.execute('UPDATE cache SET size = length(value)')
+
+    def _read_legacy(self) -> dict:
+        # Closing any descriptor of the database file releases all POSIX
+        # locks the process holds on it, including those of SQLite, hence
+        # the file is opened only before the process connects to it.
+        checked = (os.getpid(), os.path.realpath(self.filename))
+        if checked in _checked_files:
+            return {}
+        _checked_files.add(checked)
+
+        if not os.path.exists(self.filename):
+            return {}
+
+        with open(self.filename, 'rb') as file:
+            header = file.read(len(SQLITE_HEADER))
+
+        if not header or header == SQLITE_HEADER:
+            return {}
+
+        LOG.info(f'Migrating cache file to SQLite: {self.filename}')
+        entries = YAMLBackend(self.filename).read_all()
+        os.replace(self.filename, self.filename + '.yaml')
+        return entries
+
+    def read(self, key) -> tuple:
+        '''Returns the value of entry and duration of the call which
+           computed it.'''
+        connection = self._connect()
+        row = connection and connection.execute(
+            'SELECT value, duration FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)', (key, time())
+        ).fetchone()
+
+        if not row:
+            raise KeyError(key)
+
+        return yaml.load(row[0], Loader=SafeLoader), row[1]
+
+    def read_all(self) -> dict:
+        return {key: self.read(key)[0] for key in self.keys()}
+
+    def contains(self, key) -> bool:
+        connection = self._connect()
+        return bool(connection and connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)', (key, time())
+        ).fetchone())
+
+    def keys(self) -> list:
+        connection = self._connect()
+        if not connection:
+            return []
+
+        return [row[0] for row in connection.execute(
+            'SELECT key FROM cache WHERE expires IS NULL OR expires > ? '
+            'ORDER BY key', (time(),)
+        )]
+
+    def write(self, entries, deleted=(), clear=False, expires=None,
+              accessed=None, durations=None, counters=None):
+        expires = expires or {}
+        accessed = accessed or {}
+        durations = durations or {}
+        counters = counters or {}
+        connection = self._connect(create=bool(entries))
+        if connection is None:  # nothing to keep and nothing stored yet
+            return
+
+        now = time()
+        rows = []
+        for key, value in entries.items():
+            data = dump_yaml(value)
+            rows.append((key, data, len(data.encode()),
+                         accessed.get(key, now), expires.get(key),
+                         durations.get(key, 0.0)))
+
+        with connection:  # single transaction
+            if clear:
+                connection.execute('DELETE FROM cache')
+            connection.executemany(
+                'DELETE FROM cache WHERE key = ?',
+                [(key,) for key in deleted]
+            )
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache '
+                '(key, value, size, accessed, expires, duration) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(timestamp, key) for key, timestamp in accessed.items()
+                 if key not in entries]
+            )
+            connection.executemany(
+                'INSERT INTO stats (function, hits, misses, time_saved) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT (function) DO UPDATE SET '
+                'hits = hits + excluded.hits, '
+                'misses = misses + excluded.misses, '
+                'time_saved = time_saved + excluded.time_saved',
+                [(function, values['hits'], values['misses'],
+                  values['time_saved'])
+                 for function, values in counters.items()
+                 if values['hits'] or values['misses']]
+            )
+
+    def evict(self, max_entries=None, max_bytes=None) -> int:
+        '''Drops expired entries, then the least recently used ones until
+           the cache fits within the given budget. Returns the number of
+           removed entries.'''
+        connection = self._connect()
+        if connection is None:
+            return 0
+
+        with connection:
+            removed = connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time(),)
+            ).rowcount
+
+            if max_entries is not None:
+                removed += connection.execute(
+                    'DELETE FROM cache WHERE key IN ('
+                    'SELECT key FROM cache ORDER BY accessed DESC, key '
+                    'LIMIT -1 OFFSET ?)', (max_entries,)
+                ).rowcount
+
+            if max_bytes is not None:
+                removed += connection.execute(
+                    'DELETE FROM cache WHERE key IN ('
+                    'SELECT key FROM (SELECT key, SUM(size) OVER '
+                    '(ORDER BY accessed DESC, key) AS total FROM cache) '
+                    'WHERE total > ?)', (max_bytes,)
+                ).rowcount
+
+        return removed
+
+    def stats(self) -> dict:
+        '''Returns number and size of stored entries, hits, misses and time
+           saved of every cached function.'''
+        connection = self._connect()
+        stats = {}
+        if connection is None:
+            return stats
+
+        for key, size in connection.execute(
+            'SELECT key, size FROM cache '
+            'WHERE expires IS NULL OR expires > ?', (time(),)
+        ):
+            function = stats.setdefault(get_function_name(key),
+                                        {'entries': 0, 'size': 0})
+            function['entries'] += 1
+            function['size'] += size
+
+        for name, hits, misses, time_saved in connection.execute(
+            'SELECT function, hits, misses, time_saved FROM stats'
+        ):
+            stats.setdefault(name, {'entries': 0, 'size': 0}).update(
+                hits=hits, misses=misses, time_saved=time_saved
+            )
+
+        return stats
+
 
 class FileCache(object):
-    '''General-purpose persistent cache.'''
+    '''General-purpose persistent cache.
+
+    Entries are stored with the given backend class, SQLite by default.
+    Without a filename the cache is kept in memory only.
+
+    Entries may be given a time to live, after which they are ignored.
+    With max_entries or max_bytes the least recently used entries are
+    evicted on save, so the cache file does not grow without bounds.
+    Only lazy backends (SQLite) keep expiration and access times.
+    '''
 
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, backend=SQLiteBackend,
+                 max_entries=None, max_bytes=None):
         self._cache = dict()
+        self._dirty = set()
+        self._deleted = set()
+        self._cleared = False
+        self._expires = dict()
+        self._accessed = dict()
+        self._durations = dict()
         self.filename = filename
+        self.backend = backend(filename) if filename else None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.key_functions = dict()
+        self.counters = dict()
         self.changed = False
 
         self.reload()
 
-    def __call__(self, *keys, readable=False):
+    def __call__(self, *keys, readable=False, ttl=None):
         def decorator(function):
+            qualname = function.__qualname__
+            code = function.__code__
+            names = code.co_varnames[
+                :code.co_argcount + code.co_kwonlyargcount
+            ]
+            # Positions of the wanted arguments are resolved only once
+            wanted = [(index if index < code.co_argcount else None, name)
+                      for index, name in enumerate(names)
+                      if not keys or name in keys]
+            self.counters.setdefault(qualname, new_counters())
+
             @wraps(function)
             def wrapper(*args, **kwargs):
-                call_args = get_args_dict(function, args, kwargs)
+                start = perf_counter()
+                call_args = {}
+
+                for index, name in wanted:
+                    if index is not None and index < len(args):
+                        call_args[name] = self._key_value(args[index])
+                    elif name in kwargs:
+                        call_args[name] = self._key_value(kwargs[name])
+
+                if not keys:  # e.g. arguments passed as **kwargs
+                    for name in kwargs:
+                        if name not in call_args:
+                            call_args[name] = self._key_value(kwargs[name])
+
                 args_hash = ''
 
                 if call_args:
-                    if keys:  # filter out everything but wanted keys
-                        for key in call_args.copy().keys():
-                            if key not in keys:
-                                del call_args[key]
-
                     if readable:
                         args_hash = str(list(call_args.values()))[1:-1]
 
                     else:
-                        args_hash = hashlib.sha256(
-                            pickle.dumps(call_args)
-                        ).hexdigest()
-
-                uuid = f'{function.__qualname__}({args_hash})'
+                        try:
+                            args_hash = self._hash(call_args)
+                        except TypeError as error:
+                            # The call cannot be told apart from others
+                            LOG.debug(f'Not caching call of {qualname}: '
+                                      f'{error}')
+                            self.counters.setdefault(
+                                qualname, new_counters()
+                            )['misses'] += 1
+                            return function(*args, **kwargs)
 
-                if uuid in self._cache:
-                    return self._cache[uuid]
+                uuid = f'{qualname}({args_hash})'
+                counters = self.counters.setdefault(qualname, new_counters())
+                counters['key_time'] += perf_counter() - start
 
+                try:
+                    result = self[uuid]
+                except KeyError:
+                    pass
                 else:
-                    result = function(*args, **kwargs)
-                    self._cache[uuid] = result
-                    self.changed = True
+                    counters['hits'] += 1
+                    counters['time_saved'] += self._durations.get(uuid, 0.0)
                     return result
 
+                counters['misses'] += 1
+                start = perf_counter()
+                result = function(*args, **kwargs)
+                self.set(uuid, result,
+                         expires=time() + ttl if ttl is not None else None,
+                         duration=perf_counter() - start)
+                return result
+
             return wrapper
 
         if len(keys) == 1 and callable(keys[0]):
@@ -82,36 +534,272 @@ class FileCache(object):
         else:
             return decorator
 
+    def register_key_function(self, type_, function) -> None:
+        '''Makes arguments of given type (or its subclasses) represented
+           in cache keys by the result of function called on them, e.g.
+           a cheap fingerprint instead of a large object.'''
+        self.key_functions[type_] = function
+
+    def _key_value(self, value):
+        if self.key_functions:
+            for type_ in type(value).__mro__:
+                if type_ in self.key_functions:
+                    return self.key_functions[type_](value)
+
+        return value
+
+    @staticmethod
+    def _hash(call_args) -> str:
+        try:
+            data = pickle.dumps(call_args)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            data = stable_repr(call_args).encode()
+
+        return hashlib.sha256(data).hexdigest()
+
+    def report(self) -> None:
+        '''Logs hits, misses, time saved and time spent on keys of cached
+           functions.'''
+        for qualname, counters in sorted(self.counters.items()):
+            LOG.debug(f'Cache of {qualname}: {counters["hits"]} hits, '
+                      f'{counters["misses"]} misses, '
+                      f'{counters["time_saved"]:.3f}s saved, '
+                      f'{counters["key_time"]:.6f}s spent on keys')
+
+    def merge_counters(self, counters) -> None:
+        '''Adds counters collected by other process, e.g. a worker.'''
+        for qualname, values in counters.items():
+            totals = self.counters.setdefault(qualname, new_counters())
+            for name, value in values.items():
+                totals[name] += value
+
+    def reset_counters(self) -> None:
+        self.counters = dict()
+
+    def _expired(self, key) -> bool:
+        expires = self._expires.get(key)
+        if expires is None or expires > time():
+            return False
+
+        self._cache.pop(key, None)
+        self._dirty.discard(key)
+        self._expires.pop(key)
+        self._deleted.add(key)
+        return True
+
+    def _in_backend(self, key) -> bool:
+        return (self.backend is not None and self.backend.lazy
+                and not self._cleared and key not in self._deleted
+                and self.backend.contains(key))
+
+    def __contains__(self, key):
+        if self._expired(key):
+            return False
+
+        return key in self._cache or self._in_backend(key)
+
     def __delitem__(self, key):
-        del self._cache[key]
+        if key not in self:
+            raise KeyError(key)
+
+        self._cache.pop(key, None)
+        self._dirty.discard(key)
+        self._expires.pop(key, None)
+        self._accessed.pop(key, None)
+        self._durations.pop(key, None)
+        self._deleted.add(key)
+        self.changed = True
 
     def __getitem__(self, key):
+        if self._expired(key):
+            raise KeyError(key)
+
+        if key not in self._cache:
+            if self.backend is None or not self.backend.lazy \
+                    or self._cleared or key in self._deleted:
+                raise KeyError(key)
+            self._cache[key], self._durations[key] = self.backend.read(key)
+
+        self._accessed[key] = time()
         return self._cache[key]
 
+    def __iter__(self):
+        for key in list(self._cache):
+            if not self._expired(key):
+                yield key
+
+        if self.backend is not None and self.backend.lazy \
+                and not self._cleared:
+            for key in self.backend.keys():
+                if key not in self._cache and key not in self._deleted:
+                    yield key
+
     def __len__(self):
-        return len(self._cache)
+        return sum(1 for _ in self)
 
     def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def set(self, key, value, expires=None, duration=None):
+        '''Stores the value, optionally until the given timestamp, with
+           the duration of the call which computed it.'''
         self._cache[key] = value
+        self._durations[key] = duration or 0.0
+        self._dirty.add(key)
+        self._deleted.discard(key)
+        self._accessed[key] = time()
+        if expires is None:
+            self._expires.pop(key, None)
+        else:
+            self._expires[key] = expires
+        self.changed = True
+
+    def get_entry(self, key) -> tuple:
+        '''Returns the value, expiration timestamp and duration of entry,
+           which are the arguments of set() to recreate it elsewhere.'''
+        return self[key], self._expires.get(key), self._durations.get(key)
+
+    def pop_changes(self) -> tuple:
+        '''Returns the entries set since the last call, as arguments of
+           set() to recreate them, and the access times of other entries
+           read since then, and forgets both. Used to hand over what
+           a worker did to the main process, see merge_changes().'''
+        entries = {key: (self._cache[key], self._expires.get(key),
+                         self._durations.get(key))
+                   for key in self._dirty}
+        accessed = {key: timestamp
+                    for key, timestamp in self._accessed.items()
+                    if key not in self._dirty}
+
+        self._dirty.clear()
+        self._accessed.clear()
+        return entries, accessed
+
+    def merge_changes(self, entries, accessed) -> None:
+        '''Applies entries and access times from pop_changes() of other
+           process, so they are saved by this one.'''
+        for key, (value, expires, duration) in entries.items():
+            self.set(key, value, expires=expires, duration=duration)
+
+        for key, timestamp in accessed.items():
+            if key not in self._deleted \
+                    and timestamp > self._accessed.get(key, 0):
+                self._accessed[key] = timestamp
 
     def clear(self):
-        self.changed = bool(self._cache)
+        self.changed = len(self) > 0
         self._cache.clear()
+        self._dirty.clear()
+        self._deleted.clear()
+        self._expires.clear()
+        self._accessed.clear()
+        self._durations.clear()
+        self._cleared = True
+
+    def update(self, entries):
+        for key, value in entries.items():
+            self[key] = value
 
     def reload(self):
-        if self.filename and os.path.exists(self.filename):
-            with open(self.filename, 'r') as file:
-                self._cache = yaml.safe_load(file)
-                self.changed = False
+        self._cache = dict()
+        self._dirty.clear()
+        self._deleted.clear()
+        self._expires.clear()
+        self._accessed.clear()
+        self._durations.clear()
+        self._cleared = False
+        self.changed = False
+
+        if self.backend is not None and not self.backend.lazy:
+            self._cache = self.backend.read_all()
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
 
     def save(self):
-        with open(self.filename, 'w') as file:
-            data = '---\n' + yaml.dump(
-                self._cache,
-                Dumper=NoAliasDumper,
-                default_flow_style=False,
-                sort_keys=True,
-                width=math.inf,
+        if self.backend is None:
+            return
+
+        if self.backend.lazy:
+            self.backend.write(
+                {key: self._cache[key] for key in sorted(self._dirty)},
+                deleted=self._deleted,
+                clear=self._cleared,
+                expires=self._expires,
+                accessed=self._accessed,
+                durations=self._durations,
+                counters=self.counters
             )
-            file.write(data)
-            file.write('\n')
+
+            # Counters are accumulated in the backend from now on
+            for counters in self.counters.values():
+                counters.update(hits=0, misses=0, time_saved=0.0)
+
+            removed = self.backend.evict(self.max_entries, self.max_bytes)
+            if removed:
+                LOG.debug(f'Evicted {removed} cache entries')
+
+        elif self.changed:
+            self._cache = self.backend.write(
+                {key: self._cache[key] for key in sorted(self._dirty)},
+                deleted=self._deleted,
+                clear=self._cleared
+            )
+
+        self._dirty.clear()
+        self._deleted.clear()
+        self._accessed.clear()
+        self._cleared = False
+
+    def export(self, filename):
+        '''Writes all entries to a YAML file in the legacy format.'''
+        YAMLBackend(filename).write({key: self[key] for key in self},
+                                    clear=True)
+
+    def stats(self) -> dict:
+        '''Returns number and size of entries, hits, misses and time saved
+           of every cached function, including the unsaved counters.'''
+        if self.backend is not None and self.backend.lazy:
+            stats = self.backend.stats()
+        else:
+            stats = {}
+            for key, value in self._cache.items():
+                function = stats.setdefault(get_function_name(key),
+                                            {'entries': 0, 'size': 0})
+                function['entries'] += 1
+                function['size'] += len(dump_yaml(value).encode())
+
+        for qualname, counters in self.counters.items():
+            function = stats.setdefault(qualname, {'entries': 0, 'size': 0})
+            for name in ('hits', 'misses', 'time_saved'):
+                function[name] = function.get(name, 0) + counters[name]
+
+        for function in stats.values():
+            for name in ('hits', 'misses', 'time_saved'):
+                function.setdefault(name, 0)
+
+        return stats
+
+    def keys(self, pattern='*') -> list:
+        '''Returns sorted keys matching the shell-style pattern.'''
+        return sorted(key for key in self if fnmatchcase(key, pattern))
+
+    def evict(self, pattern) -> int:
+        '''Removes entries with keys matching the shell-style pattern.
+           Returns the number of removed entries.'''
+        keys = self.keys(pattern)
+        for key in keys:
+            del self[key]
+
+        return len(keys)
+
+    def purge(self) -> int:
+        '''Removes expired entries from the backend. Returns the number of
+           removed entries.'''
+        if self.backend is None or not self.backend.lazy:
+            return 0
+
+        return self.backend.evict()
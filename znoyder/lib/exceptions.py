@@ -62,8 +62,8 @@ class YAMLDuplicateKeyError(ZnoyderCliException):
         intro = textwrap.fill(textwrap.dedent('''\
         Zuul encountered a syntax error while parsing its configuration in the
         repo {repo} on branch {branch}.  The error was:'''.format(
-            repo=context.project_name,
-            branch=context.branch,
+            repo=getattr(context, 'project_name', context),
+            branch=getattr(context, 'branch', None),
         )))
 
         e = textwrap.fill(textwrap.dedent('''\
@@ -16,6 +16,9 @@
 #    under the License.
 #
 
+from copy import deepcopy
+import hashlib
+import multiprocessing
 import os
 import re
 
@@ -27,6 +30,7 @@ LOG = logger.LOG
 
 ZUUL_CONFIGS = ['zuul.yaml', '.zuul.yaml', 'zuul.d', '.zuul.d']
 ZUUL_CONFIG_DIRS = ['zuul.d', '.zuul.d']
+SCAN_SKIP_DIRS = ['.git', '.tox']  # never contain zuul configuration
 
 
 def drop_nones_from_dict(collection: dict) -> dict:
@@ -59,24 +63,48 @@ def drop_nones_from_dict(collection: dict) -> dict:
     return collection
 
 
-def get_config_paths(local_path: str) -> list:
+def _scan_config_dir(path: str, paths: set) -> None:
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.endswith('.yaml') and entry.is_file():
+                paths.add(entry.path)
+
+
+def _scan_config_paths(path: str, recursive: bool, paths: set) -> None:
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name in ZUUL_CONFIG_DIRS and entry.is_dir():
+                _scan_config_dir(entry.path, paths)
+            elif entry.name in ZUUL_CONFIGS and entry.is_file():
+                paths.add(entry.path)
+            elif recursive and entry.name not in SCAN_SKIP_DIRS \
+                    and entry.is_dir(follow_symlinks=False):
+                _scan_config_paths(entry.path, recursive, paths)
+
+
+def get_config_paths(local_path: str, recursive: bool = False) -> list:
     '''Returns the list of all absolute paths to zuul configuration
        files from the given project directory
 
+    Only the locations read by Zuul are checked: zuul.yaml and .zuul.yaml
+    files and YAML files in zuul.d and .zuul.d directories of the project.
+    The given path may also be one of such directories. In the recursive
+    mode the whole directory tree is searched, e.g. for full checkouts
+    with configuration of nested projects.
+
     Raises:
         PathError: If there was error for a given local_path
 
     Args:
         local_path (:obj:`str`): absolute path to the project directory
+        recursive (:obj:`bool`): whether to search subdirectories as well
 
     Returns:
-        (:obj:`list`): paths to zuul configuration files
+        (:obj:`list`): sorted paths to zuul configuration files
     '''
 
     LOG.debug('Finding zuul config files in: %s' % local_path)
 
-    zuul_config_files = []
-
     if not os.path.exists(local_path):
         raise PathError('Provided path does not exist: %s' % local_path)
 
@@ -86,19 +114,14 @@ def get_config_paths(local_path: str) -> list:
     if not os.path.isdir(local_path):
         raise PathError('Provided path is not directory: %s' % local_path)
 
-    zuul_file_regex = re.compile('|'.join(ZUUL_CONFIGS))
+    paths = set()
+
+    if os.path.basename(os.path.normpath(local_path)) in ZUUL_CONFIG_DIRS:
+        _scan_config_dir(local_path, paths)
 
-    for root, subdirs, files in os.walk(local_path):
-        # Get the list of all config files from zuul config dir
-        for zuul_config_dir in ZUUL_CONFIG_DIRS:
-            if root.endswith(zuul_config_dir):
-                for walk_file in files:
-                    zuul_config_files.append(os.path.join(root, walk_file))
+    _scan_config_paths(local_path, recursive, paths)
 
-        # Get the individual zuul config files
-        for walk_file in files:
-            if zuul_file_regex.match(walk_file):
-                zuul_config_files.append(os.path.join(root, walk_file))
+    zuul_config_files = sorted(paths)
 
     LOG.debug('Using zuul config files: %s' % zuul_config_files)
 
@@ -108,13 +131,142 @@ def get_config_paths(local_path: str) -> list:
     return zuul_config_files
 
 
-def get_args_dict(fn, args, kwargs):
-    # by https://stackoverflow.com/a/40363565
-    args_names = fn.__code__.co_varnames[:fn.__code__.co_argcount]
-    return {**dict(zip(args_names, args)), **kwargs}
+def get_files_fingerprint(paths: list) -> str:
+    '''Returns a fingerprint of the content of the given files.
+
+    The fingerprint changes whenever any of the files is modified, added
+    to the list or removed from it, hence it is a cheap way to tell if
+    a result computed from these files is still valid.
+
+    Parameters
+    ----------
+    paths : list
+        The paths to files that should be included in the fingerprint.
+
+    Returns
+    -------
+    fingerprint : str
+        The hexadecimal SHA-256 digest of the paths and files content.
+    '''
+
+    digest = hashlib.sha256()
+
+    for path in sorted(paths):
+        digest.update(path.encode() + b'\0')
+        with open(path, 'rb') as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+
+    return digest.hexdigest()
+
+
+def get_process_context():
+    '''Returns the multiprocessing context for pools of worker processes.
+
+    The fork start method is preferred where available, so the workers
+    share the memory of the main process copy-on-write, instead of
+    receiving a serialized copy of their arguments.
+
+    Returns
+    -------
+    context : multiprocessing.context.BaseContext
+        The fork context, or the default one if fork is not supported.
+    '''
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+
+    return multiprocessing.get_context()  # pragma: no cover
+
+
+class Specifier(object):
+    '''Compiled form of a specifier used by the match() function.
+
+    Specifiers enclosed in forward slashes, e.g. /foo/, hold precompiled
+    regular expression, while any other value is matched by a plain
+    comparison, without involving regular expressions at all.
+
+    Parameters
+    ----------
+    specifier : str
+        The expected value or regular expression between slashes.
+
+    Examples
+    --------
+    >>> Specifier('/^osp-1[67]/').match('osp-17.1')
+    True
+    >>> Specifier('osp-17.1').match('osp-1701')
+    False
+    '''
+
+    __slots__ = ('specifier', 'literal', 'regex')
+
+    def __init__(self, specifier: str):
+        self.specifier = specifier
+
+        if isinstance(specifier, str) and len(specifier) > 1 \
+                and specifier.startswith('/') and specifier.endswith('/'):
+            self.literal = None
+            self.regex = re.compile(specifier[1:-1])
+        else:
+            self.literal = specifier
+            self.regex = None
+
+    def match(self, string: str) -> bool:
+        if self.regex is None:
+            return string == self.literal
+
+        return self.regex.search(string) is not None
+
+    def __repr__(self) -> str:
+        return f'Specifier({self.specifier!r})'
+
+
+_specifiers = {}
+
+
+def get_specifier(specifier) -> Specifier:
+    '''Returns the compiled specifier, compiling each one only once.
+
+    Parameters
+    ----------
+    specifier : str or Specifier
+        The expected value or regular expression between slashes.
+
+    Returns
+    -------
+    specifier : Specifier
+        The compiled specifier.
+    '''
+
+    if isinstance(specifier, Specifier):
+        return specifier
+
+    compiled = _specifiers.get(specifier)
+    if compiled is None:
+        compiled = _specifiers[specifier] = Specifier(specifier)
+
+    return compiled
+
+
+def compile_specifiers(rules: dict, depth: int = 1) -> None:
+    '''Compiles specifiers used as keys of the nested rules dictionary.
+
+    Parameters
+    ----------
+    rules : dict
+        The dictionary with specifiers as keys, e.g. a config map.
+    depth : int
+        The number of nested levels with specifiers as keys.
+    '''
+
+    for specifier, nested in rules.items():
+        get_specifier(specifier)
+
+        if depth > 1 and isinstance(nested, dict):
+            compile_specifiers(nested, depth - 1)
 
 
-def match(string: str, specifier: str) -> bool:
+def match(string: str, specifier) -> bool:
     '''Function checks if a given string is matched by a given specifier.
 
     The match is performed in the awk-inspired fashion:
@@ -126,7 +278,7 @@ def match(string: str, specifier: str) -> bool:
     ----------
     string : str
         The string that should be tested against specifier.
-    specifier : str
+    specifier : str or Specifier
         The expected value or regular expression to be matched against.
 
     Returns
@@ -142,19 +294,21 @@ def match(string: str, specifier: str) -> bool:
     False
     >>> match('foobar', '/foo/')
     True
+    >>> match('foobar', '/bar$/')
+    True
+    >>> match('foo.bar', 'foo*bar')
+    False
     '''
 
-    if specifier.startswith('/') and specifier.endswith('/'):
-        regex = re.compile(specifier[1:-2])
-        return bool(regex.search(string))
-    else:
-        regex = re.compile(specifier)
-        return bool(regex.fullmatch(string))
+    return get_specifier(specifier).match(string)
 
 
 def merge_dicts(a: dict, b: dict, path=None, override=False) -> dict:
     '''Merges dict `b` into dict `a` in place and also returns updated `a`.
 
+    Values taken from `b` are deep-copied, so `a` never shares any nested
+    objects with `b` and modifying one of them does not affect the other.
+
     Inspired by https://stackoverflow.com/a/7205107
 
     Parameters
@@ -192,12 +346,12 @@ def merge_dicts(a: dict, b: dict, path=None, override=False) -> dict:
                 elif a[key] == b[key]:
                     pass
                 elif not a[key] and b[key] or override:
-                    a[key] = b[key]
+                    a[key] = deepcopy(b[key])
                 else:
                     path = '.'.join(path + [str(key)])
                     raise Exception(f'Conflict at path: {path}')
             else:
-                a[key] = b[key]
+                a[key] = deepcopy(b[key])
 
     return a
 
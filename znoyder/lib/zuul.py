@@ -20,7 +20,9 @@
 
 import collections
 from copy import deepcopy
-import io
+import hashlib
+import os
+import sys
 
 import yaml
 
@@ -33,6 +35,11 @@ from znoyder.lib.exceptions import YAMLDuplicateKeyError
 LOG = logger.LOG
 
 
+def _intern(value):
+    """Interns strings, so repeated names are kept in memory only once."""
+    return sys.intern(value) if type(value) is str else value
+
+
 class ZuulPipeline(object):
     """Enumeration for the Zuul Pipeline"""
     # TEMPLATES are same level as other pipelines
@@ -91,6 +98,13 @@ class ZuulMark:
     # The yaml mark class differs between the C and python versions.
     # The C version does not provide a snippet, and also appears to
     # lose data under some circumstances.
+    #
+    # Marks keep only the indices and a reference to the whole stream, and
+    # the snippet is sliced out of it when requested, so the file content
+    # is not copied piece by piece into every mark.
+    __slots__ = ('name', 'index', 'line', 'end_line', 'end_index',
+                 'column', 'end_column', '_stream', '_offset')
+
     def __init__(self, start_mark, end_mark, stream):
         self.name = start_mark.name
         self.index = start_mark.index
@@ -99,7 +113,13 @@ class ZuulMark:
         self.end_index = end_mark.index
         self.column = start_mark.column
         self.end_column = end_mark.column
-        self.snippet = stream[start_mark.index:end_mark.index]
+        self._stream = stream
+        self._offset = 0  # index of the stream start in the file
+
+    @property
+    def snippet(self) -> str:
+        return self._stream[self.index - self._offset:
+                            self.end_index - self._offset]
 
     def __str__(self):
         return '  in "{name}", line {line}, column {column}'.format(
@@ -112,6 +132,17 @@ class ZuulMark:
         return (self.line == other.line and
                 self.snippet == other.snippet)
 
+    def __getstate__(self):
+        return self.serialize()
+
+    def __setstate__(self, data):
+        for name in self.__slots__[:-2]:
+            setattr(self, name, data[name])
+
+        # The stream of a restored mark is the snippet alone
+        self._stream = data['snippet']
+        self._offset = self.index
+
     def serialize(self):
         return {
             "name": self.name,
@@ -127,24 +158,77 @@ class ZuulMark:
     @classmethod
     def deserialize(cls, data):
         o = cls.__new__(cls)
-        o.__dict__.update(data)
+        o.__setstate__(data)
         return o
 
 
+class ZuulConfigBuffer(object):
+    """Content of a config file, shared by the YAML reader and the marks
+       of the entries loaded from it.
+
+       The reader consumes the buffer in chunks, like a file, and decodes
+       them on its own, while the text as a whole is decoded only when
+       a mark snippet is requested.
+    """
+    __slots__ = ('name', '_data', '_text', '_position')
+
+    def __init__(self, data, name='null'):
+        self.name = str(name)
+        self._data = data
+        self._text = data if isinstance(data, str) else None
+        self._position = 0
+
+    @classmethod
+    def from_file(cls, path, name='null'):
+        with open(path, 'rb') as file:
+            return cls(file.read(), name)
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self._data.decode('utf-8')
+        return self._text
+
+    def __getitem__(self, key):
+        return self.text[key]
+
+    def __len__(self):
+        return len(self._data)
+
+    def seek(self, position):
+        self._position = position
+
+    def read(self, size=-1):
+        start = self._position
+        if size < 0:
+            self._position = len(self._data)
+        else:
+            self._position = min(start + size, len(self._data))
+        return self._data[start:self._position]
+
+
 # Check the class ZuulSafeLoader from configloader.py from zuul project
-class ZuulSafeLoader(yaml.SafeLoader):
+class ZuulLoaderMixin(object):
+    """Zuul-specific behavior shared by the pure Python and libyaml loaders:
+       detection of duplicate keys and tracking of the source marks.
+
+       The `_start_mark` of Zuul nodes is only needed to point at the
+       source of errors, so with `marks` set to False it is not recorded.
+       Duplicate keys are reported with their marks regardless."""
     zuul_node_types = frozenset(('job', 'nodeset', 'secret', 'pipeline',
                                  'project', 'project-template',
                                  'semaphore', 'queue', 'pragma'))
 
-    def __init__(self, stream, context):
-        wrapped_stream = io.StringIO(stream)
-        wrapped_stream.name = str(context)
-        super(ZuulSafeLoader, self).__init__(wrapped_stream)
+    def __init__(self, stream, context, marks=True):
+        if not isinstance(stream, ZuulConfigBuffer):
+            stream = ZuulConfigBuffer(stream, context)
+        stream.seek(0)
+        super(ZuulLoaderMixin, self).__init__(stream)
         self.add_multi_constructor('!encrypted/', self.construct_encrypted)
         self.name = str(context)
         self.zuul_context = context
         self.zuul_stream = stream
+        self.zuul_marks = marks
 
     @classmethod
     def construct_encrypted(cls, loader, tag_suffix, node):
@@ -170,18 +254,260 @@ class ZuulSafeLoader(yaml.SafeLoader):
                 raise YAMLDuplicateKeyError(k.value, node, self.zuul_context,
                                             mark)
             keys.add(k.value)
-        r = super(ZuulSafeLoader, self).construct_mapping(node, deep)
+        r = super(ZuulLoaderMixin, self).construct_mapping(node, deep)
         keys = frozenset(r.keys())
         if len(keys) == 1 and keys.intersection(self.zuul_node_types):
             d = list(r.values())[0]
             if isinstance(d, dict):
-                d['_start_mark'] = ZuulMark(node.start_mark,
-                                            node.end_mark,
-                                            self.zuul_stream)
+                if self.zuul_marks:
+                    d['_start_mark'] = ZuulMark(node.start_mark,
+                                                node.end_mark,
+                                                self.zuul_stream)
                 d['_source_context'] = self.zuul_context
         return r
 
 
+class ZuulSafeLoader(ZuulLoaderMixin, yaml.SafeLoader):
+    """Pure Python loader, always available."""
+
+
+if getattr(yaml, '__with_libyaml__', False):
+    class ZuulCSafeLoader(ZuulLoaderMixin, yaml.CSafeLoader):
+        """Loader backed by the libyaml parser, used when available.
+
+           The marks of libyaml nodes do not carry the buffer, so the
+           snippets are taken from the original stream by ZuulMark.
+        """
+
+    ZuulLoader = ZuulCSafeLoader
+    EventLoader = yaml.CSafeLoader
+else:  # pragma: no cover
+    ZuulCSafeLoader = None
+    ZuulLoader = ZuulSafeLoader
+    EventLoader = yaml.SafeLoader
+
+
+# Sections and their keys built by extract_config(), besides the pipelines
+EXTRACTED_SECTIONS = frozenset(('project', 'project-template'))
+EXTRACTED_KEYS = frozenset(('name', 'templates'))
+
+
+class ExtractionError(Exception):
+    """The config cannot be extracted from the YAML events alone, e.g. it
+       uses aliases or tags, so it has to be loaded as a whole."""
+
+
+def _skip_node(events, event, aliases=True) -> None:
+    depth = 0
+    while True:
+        if not aliases and isinstance(event, yaml.AliasEvent):
+            raise ExtractionError(f'Alias at {event.start_mark}')
+
+        if isinstance(event, (yaml.MappingStartEvent,
+                              yaml.SequenceStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.MappingEndEvent,
+                                yaml.SequenceEndEvent)):
+            depth -= 1
+
+        if depth == 0:
+            return
+
+        event = next(events)
+
+
+def _compose_node(events, event, resolver) -> yaml.Node:
+    if isinstance(event, yaml.AliasEvent) or event.tag is not None:
+        raise ExtractionError(f'Alias or tag at {event.start_mark}')
+
+    if isinstance(event, yaml.ScalarEvent):
+        tag = resolver.resolve(yaml.ScalarNode, event.value, event.implicit)
+        return yaml.ScalarNode(tag, event.value, event.start_mark,
+                               event.end_mark, style=event.style)
+
+    if isinstance(event, yaml.SequenceStartEvent):
+        items = []
+        for item in events:
+            if isinstance(item, yaml.SequenceEndEvent):
+                break
+            items.append(_compose_node(events, item, resolver))
+
+        return yaml.SequenceNode('tag:yaml.org,2002:seq', items,
+                                 event.start_mark, item.end_mark)
+
+    pairs = []
+    keys = set()
+    for key in events:
+        if isinstance(key, yaml.MappingEndEvent):
+            break
+
+        key_node = _compose_node(events, key, resolver)
+        if not isinstance(key_node, yaml.ScalarNode) \
+                or key_node.value in keys:
+            raise ExtractionError(f'Unexpected key at {key.start_mark}')
+        keys.add(key_node.value)
+
+        pairs.append((key_node, _compose_node(events, next(events),
+                                              resolver)))
+
+    return yaml.MappingNode('tag:yaml.org,2002:map', pairs,
+                            event.start_mark, key.end_mark)
+
+
+def _extract_section(events, event, wanted, resolver, constructor):
+    if not isinstance(event, yaml.MappingStartEvent):
+        return constructor.construct_document(
+            _compose_node(events, event, resolver))
+
+    section = {}
+    for key in events:
+        if isinstance(key, yaml.MappingEndEvent):
+            return section
+
+        # Merge keys could bring in any of the wanted keys
+        if not isinstance(key, yaml.ScalarEvent) or key.tag is not None \
+                or key.value in section or key.value == '<<':
+            raise ExtractionError(f'Unexpected key at {key.start_mark}')
+
+        value = next(events)
+        if key.value in wanted:
+            section[key.value] = constructor.construct_document(
+                _compose_node(events, value, resolver))
+        else:
+            _skip_node(events, value, aliases=False)
+
+
+def extract_config(stream, pipelines, context='null', marks=True) -> dict:
+    """Extracts project and project-template entries from the YAML events,
+       without building the rest of the config.
+
+    Only the name, templates and the given pipelines of the entries are
+    constructed, while any other entries, like job definitions, and keys
+    are skipped over. The result has the same format as for a loaded
+    config, just with fewer items.
+
+    Raises:
+        ExtractionError: If the config uses aliases, tags, duplicate keys
+            or has unexpected structure; it should be loaded then.
+
+    Args:
+        stream (:obj:`str`, :obj:`ZuulConfigBuffer`): content of the config
+            file
+        context (:obj:`str`): source context of the entries
+        marks (:obj:`bool`): whether to record source marks of entries
+
+    Returns:
+        (:obj:`dict`): lists of config entries keyed by section name
+    """
+    wanted = EXTRACTED_KEYS.union(pipelines)
+    resolver = yaml.resolver.Resolver()
+    constructor = yaml.constructor.SafeConstructor()
+    if not isinstance(stream, ZuulConfigBuffer):
+        stream = ZuulConfigBuffer(stream, context)
+    stream.seek(0)
+    events = yaml.parse(stream, Loader=EventLoader)
+    config = {}
+
+    next(events)  # StreamStartEvent
+    event = next(events)
+    if isinstance(event, yaml.StreamEndEvent):  # empty file
+        return config
+
+    event = next(events)  # the one after DocumentStartEvent
+    if isinstance(event, yaml.ScalarEvent):
+        if constructor.construct_document(
+                _compose_node(events, event, resolver)) is not None:
+            raise ExtractionError('Config is not a list')
+    elif not isinstance(event, yaml.SequenceStartEvent):
+        raise ExtractionError('Config is not a list')
+
+    for event in events:
+        if isinstance(event, (yaml.SequenceEndEvent, yaml.DocumentEndEvent)):
+            break
+
+        if not isinstance(event, yaml.MappingStartEvent):
+            _skip_node(events, event)
+            continue
+
+        entry = {}
+        start = event
+        for key in events:
+            if isinstance(key, yaml.MappingEndEvent):
+                break
+
+            if not isinstance(key, yaml.ScalarEvent) \
+                    or key.tag is not None or key.value in entry \
+                    or key.value == '<<':
+                raise ExtractionError(f'Unexpected key at {key.start_mark}')
+
+            value = next(events)
+            if key.value in EXTRACTED_SECTIONS:
+                entry[key.value] = _extract_section(
+                    events, value, wanted, resolver, constructor
+                )
+            else:
+                entry[key.value] = None
+                _skip_node(events, value)
+
+        if len(entry) == 1:
+            section = entry.get(next(iter(entry)))
+            if isinstance(section, dict):
+                if marks:
+                    section['_start_mark'] = ZuulMark(start.start_mark,
+                                                      key.end_mark, stream)
+                section['_source_context'] = context
+
+        for section, value in entry.items():
+            if section in EXTRACTED_SECTIONS:
+                config.setdefault(section, []).append(value)
+
+    for event in events:
+        if isinstance(event, yaml.DocumentStartEvent):
+            raise ExtractionError('Config has multiple documents')
+
+    return config
+
+
+def parse_config(config_file, marks=True, pipelines=None) -> dict:
+    """Parses the config file and indexes its entries by the section name,
+       e.g. project, project-template, job.
+
+    The result is made of builtin types and ZuulMark objects only, hence
+    it is cheap to pass from a worker process.
+
+    Args:
+        config_file (:obj:`str`): path to the config file
+        marks (:obj:`bool`): whether to record source marks of entries
+        pipelines (:obj:`list`): names of pipelines to extract only, along
+            with the projects and project templates, see extract_config()
+
+    Returns:
+        (:obj:`dict`): lists of config entries keyed by section name
+    """
+    LOG.debug('Parsing config: %s' % config_file)
+
+    # The raw content is shared by the reader and the marks, and decoded
+    # as a whole only if a snippet of a mark is requested
+    data = ZuulConfigBuffer.from_file(config_file)
+
+    if pipelines is not None:
+        try:
+            return extract_config(data, pipelines, 'null', marks)
+        except ExtractionError as error:
+            LOG.debug('Loading whole config: %s' % error)
+
+    config = {}
+
+    loader = ZuulLoader(data, 'null', marks).get_single_data()
+    for entry in loader or []:
+        if not isinstance(entry, dict):
+            continue
+        for section, value in entry.items():
+            config.setdefault(section, []).append(value)
+
+    return config
+
+
 class ZuulProject(object):
     """A Project represents top level component.
        It may define or use jobs directly as well job templates.
@@ -189,18 +515,31 @@ class ZuulProject(object):
     Args:
         project_name (:obj:`str`): Name of the project e.g. neutron
         project_path (:obj:`str`): Local path to the project directory
+        processes (:obj:`int`): Number of processes to parse config files
+            with, 0 means as many as CPUs, default is 1 (no extra processes)
+        marks (:obj:`bool`): Whether to record source marks of entries
+        pipelines (:obj:`list`): Pipelines as list of ZuulPipeline objects
+            to extract from the config files, with projects and templates
+            only; the config files are loaded as a whole by default
     """
-    def __init__(self, project_name=None, project_path=None, templates=None):
-        if templates is None:
-            templates = []
+    def __init__(self, project_name=None, project_path=None, templates=None,
+                 processes=1, marks=True, pipelines=None):
+        if not isinstance(templates, TemplateRegistry):
+            templates = TemplateRegistry(templates)
 
         self.project_name = project_name
         self.project_path = project_path
+        self.processes = processes
+        self.marks = marks
+        self.pipelines = pipelines
+        if pipelines is not None:
+            self.pipelines = ZuulPipeline.get_pipelines_str(pipelines)
         self.all_templates = templates  # defined by other projects
         self.project_templates = []     # used by this project
         self.defined_templates = []     # defined by this project
         self.project_jobs = []
         self.config_paths = []
+        self.parsed_configs = {}        # config file -> entries by section
         if project_path and not self.project_name:
             self.project_name = project_path.strip("/").split("/")[-1]
 
@@ -208,8 +547,44 @@ class ZuulProject(object):
         if self.config_paths:
             return self.config_paths
         self.config_paths = utils.get_config_paths(self.project_path)
+        if self.processes != 1:
+            self._parse_configs_in_parallel(self.config_paths)
         return self.config_paths
 
+    def _parse_configs_in_parallel(self, config_files) -> None:
+        """Parses the config files on a pool of processes up front.
+
+        The results are stored in the order of files, so they do not depend
+        on which process finishes first. If parsing fails in any process,
+        the files are left to be parsed one by one, which reports the error
+        as usual.
+
+        Args:
+            config_files (:obj:`list`): paths to the config files
+        """
+        pending = [config_file for config_file in config_files
+                   if config_file not in self.parsed_configs]
+        if len(pending) < 2:
+            return
+
+        context = utils.get_process_context()
+
+        processes = min(self.processes or os.cpu_count(), len(pending))
+        LOG.debug('Parsing %d config files with %d processes' %
+                  (len(pending), processes))
+
+        try:
+            with context.Pool(processes) as pool:
+                configs = pool.starmap(parse_config, [
+                    (config_file, self.marks, self.pipelines)
+                    for config_file in pending
+                ])
+        except Exception as exception:
+            LOG.debug('Parallel parsing failed: %s' % exception)
+            return
+
+        self.parsed_configs.update(zip(pending, configs))
+
     def get_list_of_jobs(self, pipelines=None) -> list:
         """Gets list of jobs for a particular project.
            This does not include jobs defined under templates.
@@ -280,15 +655,9 @@ class ZuulProject(object):
         Returns:
             (:obj:`ZuulProjectTemplate`): project template
         """
-        found = False
-        template_obj = None
-        for template in self.all_templates:
-            if str(template) == template_name:
-                found = True
-                template_obj = template
-                break
+        template_obj = self.all_templates.get(template_name)
 
-        if not found:
+        if template_obj is None:
             LOG.warning("Used template not found in base templates: %s"
                         % template_name)
             template_obj = ZuulProjectTemplate(template_name)
@@ -348,14 +717,23 @@ class ZuulProject(object):
         LOG.debug('Discovering section "%s" from config: %s' %
                   (config_section, config_file))
 
-        config = []
+        return self._get_parsed_config(config_file).get(config_section, [])
+
+    def _get_parsed_config(self, config_file) -> dict:
+        """Helper function to parse the config file only once and index its
+           entries by the section name, e.g. project, project-template, job.
+
+        Args:
+            config_file (:obj:`str`): path to the config file
+
+        Returns:
+            (:obj:`dict`): lists of config entries keyed by section name
+        """
+        if config_file in self.parsed_configs:
+            return self.parsed_configs[config_file]
 
-        with open(config_file, 'r') as file:
-            data = file.read()
-            loader = ZuulSafeLoader(data, 'null').get_single_data()
-            for entry in loader:
-                if config_section in entry:
-                    config.append(entry.get(config_section))
+        config = parse_config(config_file, self.marks, self.pipelines)
+        self.parsed_configs[config_file] = config
         return config
 
     def _get_jobs_from_entry(self, job_entry, pipeline) -> list:
@@ -389,14 +767,17 @@ class ZuulProjectTemplate(object):
     Args:
         template_name (:obj:`str`): Template name
     """
+    __slots__ = ('template_project', 'template_name', 'template_data',
+                 'template_jobs')
+
     def __init__(self, template_name, template_project=None,
                  template_data=None):
         if template_data is None:
             template_data = {}
 
         # Project that defines template
-        self.template_project = template_project
-        self.template_name = template_name
+        self.template_project = _intern(template_project)
+        self.template_name = _intern(template_name)
         self.template_data = template_data
         self.template_jobs = []
 
@@ -423,6 +804,19 @@ class ZuulProjectTemplate(object):
 
         return jobs
 
+    def serialize(self):
+        return {
+            "name": self.template_name,
+            "project": self.template_project,
+            "jobs": self.template_jobs,
+        }
+
+    @classmethod
+    def deserialize(cls, data):
+        o = cls(data['name'], data['project'])
+        o.template_jobs = list(data['jobs'])
+        return o
+
     def __str__(self) -> str:
         return self.template_name
 
@@ -430,6 +824,120 @@ class ZuulProjectTemplate(object):
         return self.template_name
 
 
+class TemplateRegistry(object):
+    """Collection of project templates indexed by the template name.
+
+    The first definition of a template wins, like in the lookup done by
+    Zuul projects. Any further definition with the same name is recorded
+    in the `collisions` list and reported either as a duplicate (when it
+    comes from the same project) or as shadowed (when it comes from other
+    template directory).
+
+    The registry can be stored as a snapshot, a plain structure made of
+    builtin types and ZuulJob objects, hence safe to dump as YAML. Only
+    the registered templates and their jobs are preserved in a snapshot,
+    the raw template data is dropped. The snapshot format is versioned
+    with SNAPSHOT_VERSION, which should be bumped on every change of it.
+
+    The `fingerprint` identifies the set of templates in cache keys. It is
+    either set to the fingerprint of the files the templates come from, or
+    derived from names and jobs of the registered templates.
+
+    Args:
+        templates (:obj:`list`): ZuulProjectTemplate objects to register
+    """
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, templates=None):
+        self._templates = {}
+        self._fingerprint = None
+        self.collisions = []  # (registered, ignored) pairs of templates
+
+        if templates:
+            self.extend(templates)
+
+    def add(self, template) -> bool:
+        """Registers template unless there is one with the same name already.
+
+        Args:
+            template (:obj:`ZuulProjectTemplate`): template to register
+
+        Returns:
+            (:obj:`bool`): True if the template was registered
+        """
+        name = str(template)
+        registered = self._templates.get(name)
+
+        if registered is None:
+            self._templates[name] = template
+            self._fingerprint = None
+            return True
+
+        if registered.template_project == template.template_project:
+            LOG.warning('Template %s defined multiple times in %s'
+                        % (name, template.template_project))
+        else:
+            LOG.warning('Template %s from %s is shadowed by the one from %s'
+                        % (name, template.template_project,
+                           registered.template_project))
+
+        self.collisions.append((registered, template))
+        return False
+
+    def extend(self, templates) -> None:
+        for template in templates:
+            self.add(template)
+
+    def get(self, template_name, default=None) -> object:
+        return self._templates.get(template_name, default)
+
+    def __contains__(self, template_name) -> bool:
+        return template_name in self._templates
+
+    def __getitem__(self, template_name) -> object:
+        return self._templates[template_name]
+
+    def __iter__(self):
+        return iter(self._templates.values())
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    @property
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for template in self:
+                digest.update(repr((
+                    template.template_name,
+                    template.template_project,
+                    [(job.name, job.pipeline)
+                     for job in template.template_jobs],
+                )).encode())
+            self._fingerprint = digest.hexdigest()
+
+        return self._fingerprint
+
+    @fingerprint.setter
+    def fingerprint(self, value) -> None:
+        self._fingerprint = value
+
+    def serialize(self):
+        return {
+            "version": self.SNAPSHOT_VERSION,
+            "templates": [template.serialize() for template in self],
+        }
+
+    @classmethod
+    def deserialize(cls, data):
+        if data.get('version') != cls.SNAPSHOT_VERSION:
+            raise ValueError('Unsupported templates snapshot version: %s'
+                             % data.get('version'))
+
+        return cls([ZuulProjectTemplate.deserialize(template)
+                    for template in data['templates']])
+
+
 class ZuulJob(yaml.YAMLObject):
     """Zuul Job representation
 
@@ -437,17 +945,92 @@ class ZuulJob(yaml.YAMLObject):
         name (:obj:`str`): Job name
         pipeline (:obj:`str`): Job pipeline, e.g. check, gate, post
         parameters (:obj:`dict`): JSON job parameters
+
+    The given parameters are shared with the caller, and jobs made with
+    copy() share them with each other, until the `parameters` attribute
+    is accessed for the first time. Only then they are deep-copied, so
+    modifying them never affects anything else.
+
+    Jobs are slotted, with interned name and pipeline and a cached hash,
+    as there are tens of thousands of them. The state is a plain mapping
+    of name, pipeline and parameters, the same in !ZuulJob YAML nodes of
+    the cache files and in pickles passed between processes.
     """
-    yaml_loader = yaml.SafeLoader
+    __slots__ = ('_name', '_pipeline', '_parameters', '_shared', '_hash')
+
+    yaml_loader = [yaml.SafeLoader]
+    if yaml.__with_libyaml__:
+        yaml_loader.append(yaml.CSafeLoader)
     yaml_tag = u'!ZuulJob'
 
     def __init__(self, name, pipeline, parameters=None):
-        if parameters is None:
-            parameters = {}
-
         self.name = name
         self.pipeline = pipeline
-        self.parameters = deepcopy(parameters)
+        self._parameters = parameters if parameters is not None else {}
+        self._shared = parameters is not None
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @name.setter
+    def name(self, value) -> None:
+        self._name = _intern(value)
+        self._hash = None
+
+    @property
+    def pipeline(self) -> str:
+        return self._pipeline
+
+    @pipeline.setter
+    def pipeline(self, value) -> None:
+        self._pipeline = _intern(value)
+        self._hash = None
+
+    @property
+    def parameters(self) -> dict:
+        if self._shared:
+            self._parameters = deepcopy(self._parameters)
+            self._shared = False
+
+        return self._parameters
+
+    @parameters.setter
+    def parameters(self, value) -> None:
+        self._parameters = value
+        self._shared = False
+
+    def copy(self) -> 'ZuulJob':
+        """Returns copy of the job, sharing the parameters until accessed.
+
+        Returns:
+            (:obj:`ZuulJob`): new job with the same name, pipeline and
+                parameters
+        """
+        self._shared = True
+        return ZuulJob(self._name, self._pipeline, self._parameters)
+
+    @classmethod
+    def _restore(cls, name, pipeline, parameters) -> 'ZuulJob':
+        job = cls(name, pipeline)
+        job._parameters = parameters  # unpickled, hence not shared
+        return job
+
+    def __reduce__(self) -> tuple:
+        return (self._restore, (self._name, self._pipeline, self._parameters))
+
+    def __getstate__(self) -> dict:
+        return {
+            'name': self._name,
+            'pipeline': self._pipeline,
+            'parameters': self._parameters,
+        }
+
+    def __setstate__(self, state) -> None:
+        self.name = state['name']
+        self.pipeline = state['pipeline']
+        self._parameters = state.get('parameters', {})
+        self._shared = False
 
     def __str__(self) -> str:
         return self.name
@@ -456,7 +1039,10 @@ class ZuulJob(yaml.YAMLObject):
         return self.name
 
     def __hash__(self) -> int:
-        return hash((self.name, self.pipeline))
+        if self._hash is None:
+            self._hash = hash((self._name, self._pipeline))
+
+        return self._hash
 
     def __eq__(self, other) -> bool:
         return type(other) is type(self) and (
@@ -474,5 +1060,102 @@ class ZuulJob(yaml.YAMLObject):
         return type(other) is type(self) and (
             self.name == other.name
             and self.pipeline == other.pipeline
-            and self.parameters == other.parameters
+            and self._parameters == other._parameters
         )
+
+
+class JobSet(object):
+    """Collection of jobs indexed by the job name and pipeline.
+
+    Jobs are kept in the given list, in the order they were added, and
+    the list is updated in place. Specifiers without regular expressions
+    are looked up directly in the index, while regular expressions are
+    matched once per distinct name or pipeline rather than once per job.
+    Names and pipelines of jobs must not change while they are in the set.
+
+    Args:
+        jobs (:obj:`list`): ZuulJob objects to index
+    """
+
+    def __init__(self, jobs=None):
+        self.jobs = jobs if jobs is not None else []
+        self._index = {}  # name -> pipeline -> jobs
+        self._positions = {}  # id(job) -> order of addition
+        self._added = 0
+
+        for job in self.jobs:
+            self._index_job(job)
+
+    def _index_job(self, job) -> None:
+        pipelines = self._index.setdefault(job.name, {})
+        pipelines.setdefault(job.pipeline, []).append(job)
+        self._positions[id(job)] = self._added
+        self._added += 1
+
+    def add(self, job) -> None:
+        self.jobs.append(job)
+        self._index_job(job)
+
+    def extend(self, jobs) -> None:
+        for job in jobs:
+            self.add(job)
+
+    def get(self, name, pipeline) -> list:
+        return list(self._index.get(name, {}).get(pipeline, []))
+
+    def __iter__(self):
+        return iter(self.jobs)
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    @staticmethod
+    def _lookup(index, specifier) -> list:
+        specifier = utils.get_specifier(specifier)
+
+        if specifier.regex is None:
+            return [specifier.literal] if specifier.literal in index else []
+
+        return [key for key in index if specifier.match(key)]
+
+    def select(self, name, pipeline='/.*/') -> list:
+        """Returns jobs matching the name and pipeline specifiers.
+
+        Args:
+            name (:obj:`str`): job name specifier
+            pipeline (:obj:`str`): pipeline specifier, any by default
+
+        Returns:
+            (:obj:`list`): matching jobs, in the order they were added
+        """
+        buckets = []
+        for job_name in self._lookup(self._index, name):
+            pipelines = self._index[job_name]
+            for job_pipeline in self._lookup(pipelines, pipeline):
+                buckets.append(pipelines[job_pipeline])
+
+        if len(buckets) == 1:
+            return list(buckets[0])
+
+        return sorted((job for jobs in buckets for job in jobs),
+                      key=lambda job: self._positions[id(job)])
+
+    def exclude(self, specifiers) -> None:
+        """Removes all jobs with names matching any of the specifiers.
+
+        Args:
+            specifiers (:obj:`list`): job name specifiers
+        """
+        names = set()
+        for specifier in specifiers:
+            names.update(self._lookup(self._index, specifier))
+
+        if not names:
+            return
+
+        for name in names:
+            for jobs in self._index.pop(name).values():
+                for job in jobs:
+                    self._positions.pop(id(job), None)
+
+        self.jobs = [job for job in self.jobs if job.name not in names]
@@ -16,7 +16,6 @@
 #    under the License.
 #
 
-from copy import deepcopy
 import sys
 
 from znoyder.config import add_map
@@ -25,9 +24,10 @@ from znoyder.config import exclude_map
 from znoyder.config import include_map
 from znoyder.config import override_map
 from znoyder.lib import logger
+from znoyder.lib.zuul import JobSet
 from znoyder.lib.zuul import ZuulJob
 from znoyder.lib.utils import drop_nones_from_dict
-from znoyder.lib.utils import match
+from znoyder.lib.utils import get_specifier
 from znoyder.lib.utils import merge_dicts
 from znoyder.lib.utils import sort_dict_by_keys
 
@@ -37,6 +37,7 @@ LOG = logger.LOG
 
 def new_jobs_from_map_entry(entry: dict) -> ZuulJob:
     job_name, job_options = entry
+    job_options = dict(job_options)  # keep the map entry intact
     pipeline = job_options.pop('pipeline', 'check')
 
     if isinstance(pipeline, str):
@@ -47,20 +48,23 @@ def new_jobs_from_map_entry(entry: dict) -> ZuulJob:
 
 
 def update_jobs_from_map_entry(jobs: list, entry: dict) -> list:
-    job_name, job_options = deepcopy(entry)
+    job_set = jobs if isinstance(jobs, JobSet) else JobSet(jobs)
+    job_name, job_options = entry
+    job_options = dict(job_options)  # keep the map entry intact
     pipeline = job_options.pop('pipeline', '/.*/')  # any pipeline by default
 
-    for index, job in enumerate(jobs):
-        if match(job.name, job_name) and match(job.pipeline, pipeline):
-            merge_dicts(jobs[index].parameters, job_options, override=True)
-            drop_nones_from_dict(jobs[index].parameters)
-            sort_dict_by_keys(jobs[index].parameters)
+    for job in job_set.select(job_name, pipeline):
+        merge_dicts(job.parameters, job_options, override=True)
+        drop_nones_from_dict(job.parameters)
+        sort_dict_by_keys(job.parameters)
 
     return jobs
 
 
 def copy_jobs_from_map_entry(jobs: list, entry: dict) -> list:
-    job_name, job_options = tuple(deepcopy(entry).items())[0]
+    job_set = jobs if isinstance(jobs, JobSet) else JobSet(jobs)
+    job_name, job_options = tuple(entry.items())[0]
+    job_options = dict(job_options)  # keep the map entry intact
     pipeline = job_options.pop('from', '/.*/')  # any pipeline by default
     new_pipeline = job_options.pop('to', None)
     new_name = job_options.pop('as', job_name)
@@ -73,28 +77,27 @@ def copy_jobs_from_map_entry(jobs: list, entry: dict) -> list:
 
     new_jobs = []
 
-    for index, job in enumerate(jobs):
-        if match(job.name, job_name) and match(job.pipeline, pipeline):
-            new_job = deepcopy(job)
+    for job in job_set.select(job_name, pipeline):
+        new_job = job.copy()
 
-            merge_dicts(new_job.parameters, job_options, override=True)
-            drop_nones_from_dict(new_job.parameters)
-            sort_dict_by_keys(new_job.parameters)
+        merge_dicts(new_job.parameters, job_options, override=True)
+        drop_nones_from_dict(new_job.parameters)
+        sort_dict_by_keys(new_job.parameters)
 
-            if new_name:
-                new_job.name = new_name
-            if new_pipeline:
-                new_job.pipeline = new_pipeline
+        if new_name:
+            new_job.name = new_name
+        if new_pipeline:
+            new_job.pipeline = new_pipeline
 
-            new_jobs.append(new_job)
+        new_jobs.append(new_job)
 
-    jobs.extend(new_jobs)
+    job_set.extend(new_jobs)
 
     return jobs
 
 
 def include_jobs(jobs, tag) -> list:
-    upstream_jobs = deepcopy(jobs)
+    upstream_jobs = [job.copy() for job in jobs]
     collected_jobs = []
     jobs_to_collect = include_map.get(tag, {})
 
@@ -115,65 +118,138 @@ def include_jobs(jobs, tag) -> list:
     return collected_jobs
 
 
-def exclude_jobs(jobs, project, tag) -> list:
-    for project_specifier in exclude_map:
-        if not match(project, project_specifier):
-            continue
-
-        for tag_specifier in exclude_map[project_specifier]:
-            if not match(tag, tag_specifier):
+class RuleSet(object):
+    """Compiled exclude, add, override and copy rules.
+
+    Every project and tag specifier is compiled once, and the list of
+    actions applicable to a given project and tag is resolved only on
+    the first request and then reused for all subsequent ones.
+
+    Args:
+        exclude (:obj:`dict`): Map of jobs to exclude
+        add (:obj:`dict`): Map of jobs to add
+        override (:obj:`dict`): Map of job options to override
+        copy (:obj:`dict`): Map of jobs to copy
+    """
+
+    def __init__(self, exclude=None, add=None, override=None, copy=None):
+        self.exclude = self._compile(exclude)
+        self.add = self._compile(add)
+        self.override = self._compile(override)
+        self.copy = self._compile(copy)
+        self._resolved = {}
+
+    @staticmethod
+    def _compile(rules) -> list:
+        return [
+            (get_specifier(project_specifier),
+             [(get_specifier(tag_specifier), entries)
+              for tag_specifier, entries in tags.items()])
+            for project_specifier, tags in (rules or {}).items()
+        ]
+
+    @staticmethod
+    def _select(rules: list, project: str, tag: str):
+        for project_specifier, tags in rules:
+            if not project_specifier.match(project):
                 continue
 
-            exclude_map_jobs = exclude_map[project_specifier][tag_specifier]
-            for job_specifier in exclude_map_jobs.keys():
-                jobs = [job for job in jobs
-                        if not match(job.name, job_specifier)]
+            for tag_specifier, entries in tags:
+                if tag_specifier.match(tag):
+                    yield entries
 
-    return jobs
+    def resolve(self, project: str, tag: str) -> tuple:
+        """Returns the actions applicable to the given project and tag.
 
+        The actions are returned as a tuple of four lists: specifiers of
+        jobs to exclude, jobs to add (copied on every use), (name,
+        pipeline, options) tuples of overrides with compiled specifiers,
+        and entries of jobs to copy, all in the map order.
+        """
+        key = (project, tag)
+        actions = self._resolved.get(key)
+        if actions is not None:
+            return actions
 
-def add_jobs(jobs, project, tag) -> list:
-    for project_specifier in add_map:
-        if not match(project, project_specifier):
-            continue
+        exclude = []
+        for entries in self._select(self.exclude, project, tag):
+            exclude.extend(get_specifier(job) for job in entries)
 
-        for tag_specifier in add_map[project_specifier]:
-            if not match(tag, tag_specifier):
-                continue
+        add = []
+        for entries in self._select(self.add, project, tag):
+            for job_entry in entries.items():
+                add.extend(new_jobs_from_map_entry(job_entry))
 
-            add_map_jobs = add_map[project_specifier][tag_specifier]
-            for job_entry in add_map_jobs.items():
-                jobs.extend(new_jobs_from_map_entry(job_entry))
+        override = []
+        for entries in self._select(self.override, project, tag):
+            for job_name, job_options in entries.items():
+                job_options = dict(job_options)
+                pipeline = job_options.pop('pipeline', '/.*/')
+                override.append((get_specifier(job_name),
+                                 get_specifier(pipeline), job_options))
 
-    return jobs
+        copy = []
+        for entries in self._select(self.copy, project, tag):
+            copy.extend(entries)
 
+        actions = self._resolved[key] = (exclude, add, override, copy)
+        return actions
 
-def override_jobs(jobs, project, tag) -> list:
-    for project_specifier in override_map:
-        if not match(project, project_specifier):
-            continue
+    def apply(self, jobs: list, project: str, tag: str) -> list:
+        """Applies all the actions resolved for the project and tag.
 
-        for tag_specifier in override_map[project_specifier]:
-            if not match(tag, tag_specifier):
-                continue
+        Jobs are excluded first, all at once, then new jobs are added,
+        options of the jobs matching overrides are updated and the copies
+        are made at the end, which gives the same result as calling
+        exclude_jobs(), add_jobs(), override_jobs() and copy_jobs() in
+        a sequence.
+        """
+        exclude, add, override, copy = self.resolve(project, tag)
+        job_set = JobSet(jobs)
 
-            override_map_jobs = override_map[project_specifier][tag_specifier]
-            for job_entry in override_map_jobs.items():
-                jobs = update_jobs_from_map_entry(jobs, job_entry)
+        job_set.exclude(exclude)
+        job_set.extend(job.copy() for job in add)
 
-    return jobs
+        for job_name, pipeline, job_options in override:
+            for job in job_set.select(job_name, pipeline):
+                merge_dicts(job.parameters, job_options, override=True)
+                drop_nones_from_dict(job.parameters)
+                sort_dict_by_keys(job.parameters)
 
+        for map_entry in copy:
+            copy_jobs_from_map_entry(job_set, map_entry)
 
-def copy_jobs(jobs, project, tag) -> list:
-    for project_specifier in copy_map:
-        if not match(project, project_specifier):
-            continue
+        return job_set.jobs
 
-        for tag_specifier in copy_map[project_specifier]:
-            if not match(tag, tag_specifier):
-                continue
 
-            for map_entry in copy_map[project_specifier][tag_specifier]:
-                jobs = copy_jobs_from_map_entry(jobs, map_entry)
+_rules = None
 
-    return jobs
+
+def get_rules() -> RuleSet:
+    global _rules
+
+    if _rules is None:
+        _rules = RuleSet(exclude=exclude_map, add=add_map,
+                         override=override_map, copy=copy_map)
+
+    return _rules
+
+
+def map_jobs(jobs, project, tag) -> list:
+    return get_rules().apply(jobs, project, tag)
+
+
+def exclude_jobs(jobs, project, tag) -> list:
+    return RuleSet(exclude=exclude_map).apply(jobs, project, tag)
+
+
+def add_jobs(jobs, project, tag) -> list:
+    return RuleSet(add=add_map).apply(jobs, project, tag)
+
+
+def override_jobs(jobs, project, tag) -> list:
+    return RuleSet(override=override_map).apply(jobs, project, tag)
+
+
+def copy_jobs(jobs, project, tag) -> list:
+    return RuleSet(copy=copy_map).apply(jobs, project, tag)
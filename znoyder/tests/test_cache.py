@@ -17,11 +17,23 @@
 #
 
 import inspect
+import multiprocessing
+import os
+import sqlite3
+from tempfile import TemporaryDirectory
+from threading import Lock
 from unittest import TestCase
+from unittest.mock import Mock
 from unittest.mock import mock_open
 from unittest.mock import patch
 
 from znoyder.lib.cache import FileCache
+from znoyder.lib.cache import SQLiteBackend
+from znoyder.lib.cache import stable_repr
+from znoyder.lib.cache import YAMLBackend
+from znoyder.lib.logger import LOG
+from znoyder.lib.zuul import ZuulJob
+from znoyder.lib.zuul import ZuulProjectTemplate
 
 
 def _noop():  # pragma: no cover
@@ -29,6 +41,14 @@ def _noop():  # pragma: no cover
     pass
 
 
+def _save_entries(path, backend, index):
+    '''Saves a few entries from a separate process.'''
+    for entry in range(10):
+        cache = FileCache(path, backend=backend)
+        cache[f'{index}-{entry}'] = entry
+        cache.save()
+
+
 class TestFileCache(TestCase):
     @patch('os.path.exists')
     @patch('builtins.open', new_callable=mock_open)
@@ -36,7 +56,7 @@ class TestFileCache(TestCase):
         mock_os.return_value = True
         path = 'some/file/and.extension'
 
-        FileCache(path)
+        FileCache(path, backend=YAMLBackend)
 
         mock_file.assert_called_once_with(path, 'r')
 
@@ -101,6 +121,139 @@ class TestFileCache(TestCase):
         ])
         self.assertTrue(uuid in cache._cache)
 
+    @patch('znoyder.tests.test_cache._noop')
+    def test_call_positional_and_keyword(self, mock_noop):
+        cache = FileCache()
+
+        @cache
+        def function(a: int, b: int = 0, *, c: int = 0) -> int:
+            '''Helper function to be decorated in tests.'''
+            _noop()
+            return a + b + c
+
+        function(1, 2, c=3)
+        function(1, b=2, c=3)
+        function(c=3, b=2, a=1)
+
+        self.assertEqual(mock_noop.call_count, 1)
+        self.assertEqual(len(cache), 1)
+
+        function(1, 2, c=4)
+        self.assertEqual(mock_noop.call_count, 2)
+
+    def test_unwanted_arguments_ignored(self):
+        cache = FileCache()
+        key_function = Mock(return_value='key')
+        cache.register_key_function(Lock().__class__, key_function)
+
+        @cache('n', readable=True)
+        def function(n: int, lock: object) -> int:
+            '''Helper function to be decorated in tests.'''
+            return n
+
+        self.assertEqual(function(1, Lock()), 1)
+        key_function.assert_not_called()
+
+    def test_key_functions(self):
+        cache = FileCache()
+
+        class Base(object):
+            def __init__(self, name):
+                self.name = name
+
+        class Derived(Base):
+            pass
+
+        cache.register_key_function(Base, lambda value: value.name)
+
+        @cache(readable=True)
+        def function(value: Base) -> str:
+            '''Helper function to be decorated in tests.'''
+            return value.name
+
+        function(Base('aa'))
+        function(Derived('aa'))
+        function(Derived('bb'))
+
+        self.assertEqual(sorted(cache), [
+            f"{function.__qualname__}('aa')",
+            f"{function.__qualname__}('bb')",
+        ])
+
+    @patch('znoyder.tests.test_cache._noop')
+    def test_not_picklable_arguments(self, mock_noop):
+        cache = FileCache()
+
+        @cache
+        def function(data: dict) -> int:
+            '''Helper function to be decorated in tests.'''
+            _noop()
+            return len(data)
+
+        class Local(object):  # local classes cannot be pickled
+            def __init__(self, name):
+                self.name = name
+
+        function({'local': Local('aa'), 'items': {'aa', 'bb'}})
+        function({'items': {'bb', 'aa'}, 'local': Local('aa')})
+        function({'local': Local('bb'), 'items': {'aa', 'bb'}})
+        function({'local': Local('aa'), 'items': {'aa'}})
+
+        self.assertEqual(mock_noop.call_count, 3)
+        self.assertEqual(len(cache), 3)
+
+    def test_arguments_without_state(self):
+        cache = FileCache()
+
+        @cache
+        def function(callback, value):
+            '''Helper function to be decorated in tests.'''
+            return callback(value)
+
+        self.assertEqual(function(lambda v: v + 1, 1), 2)
+        self.assertEqual(function(lambda v: v * 100, 1), 100)
+        self.assertEqual(function(Lock().acquire, False), True)
+
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.counters[function.__qualname__]['misses'], 3)
+
+    def test_stable_repr(self):
+        self.assertEqual(stable_repr({'b': [1, (2, None)], 'a': {'y', 'x'}}),
+                         "{'a': {'x', 'y'}, 'b': [1, [2, None]]}")
+        self.assertEqual(stable_repr(ZuulJob('job1', 'check')),
+                         "ZuulJob({'name': 'job1', 'parameters': {}, "
+                         "'pipeline': 'check'})")
+        self.assertEqual(stable_repr(ZuulProjectTemplate('t1', 'p1')),
+                         "ZuulProjectTemplate({'template_data': {}, "
+                         "'template_jobs': [], 'template_name': 't1', "
+                         "'template_project': 'p1'})")
+        for value in (Lock(), lambda: None, [object()]):
+            with self.assertRaises(TypeError):
+                stable_repr(value)
+
+    def test_counters(self):
+        cache = FileCache()
+
+        @cache
+        def function(n: int) -> int:
+            '''Helper function to be decorated in tests.'''
+            return n
+
+        function(1)
+        function(1)
+        function(2)
+
+        counters = cache.counters[function.__qualname__]
+        self.assertEqual(counters['hits'], 1)
+        self.assertEqual(counters['misses'], 2)
+        self.assertGreater(counters['key_time'], 0)
+
+        with self.assertLogs(LOG, level='DEBUG') as mock_log:
+            cache.report()
+
+        self.assertEqual(len(mock_log.records), 1)
+        self.assertIn('1 hits, 2 misses', mock_log.output[0])
+
     @patch('znoyder.tests.test_cache._noop')
     def test_clear(self, mock_noop):
         cache = FileCache()
@@ -134,10 +287,16 @@ class TestFileCache(TestCase):
         cache = FileCache()
 
         self.assertEqual(len(cache), 0)
+        self.assertFalse(cache.changed)
 
         cache['aa'] = 1
 
+        self.assertTrue(cache.changed)
         self.assertEqual(cache['aa'], 1)
+        self.assertEqual(cache.get('aa'), 1)
+        self.assertEqual(cache.get('bb', 2), 2)
+        self.assertIn('aa', cache)
+        self.assertEqual(list(cache), ['aa'])
         self.assertEqual(len(cache), 1)
 
         del cache['aa']
@@ -152,7 +311,7 @@ class TestFileCache(TestCase):
         mock_os.return_value = True
         path = 'some/file/and.extension'
 
-        cache = FileCache(path)
+        cache = FileCache(path, backend=YAMLBackend)
 
         mock_file.assert_called_once_with(path, 'r')
         self.assertEqual(len(cache), 2)
@@ -170,20 +329,422 @@ class TestFileCache(TestCase):
         self.assertEqual(cache['aa'], 1)
         self.assertEqual(cache['bb'], 2)
 
-    @patch('builtins.open', new_callable=mock_open, read_data='data')
-    def test_save(self, mock_file):
-        path = 'some/file/and.extension'
+    def test_save(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.yaml')
+
+            cache = FileCache(path, backend=YAMLBackend)
+            cache['aa'] = 1
+            cache['bb'] = 2
+            cache.save()
+
+            with open(path, 'r') as file:
+                self.assertEqual(file.read(), '---\naa: 1\nbb: 2\n\n')
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ['cache.yaml', 'cache.yaml.lock'])
+
+    def test_save_interrupted(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.yaml')
+
+            cache = FileCache(path, backend=YAMLBackend)
+            cache['aa'] = 1
+            cache.save()
+
+            cache['bb'] = 2
+            with patch('os.fsync', side_effect=KeyboardInterrupt), \
+                    self.assertRaises(KeyboardInterrupt):
+                cache.save()
+
+            with open(path, 'r') as file:
+                self.assertEqual(file.read(), '---\naa: 1\n\n')
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ['cache.yaml', 'cache.yaml.lock'])
+
+    def test_save_merges_concurrent_changes(self):
+        for backend in (YAMLBackend, SQLiteBackend):
+            with self.subTest(backend=backend.__name__), \
+                    TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'cache.db')
+
+                cache1 = FileCache(path, backend=backend)
+                cache1.update({'aa': 1, 'bb': 2})
+                cache1.save()
+
+                cache1 = FileCache(path, backend=backend)
+                cache2 = FileCache(path, backend=backend)
+                cache1['cc'] = 3
+                del cache1['aa']
+                cache2['dd'] = 4
+                cache1.save()
+                cache2.save()
+
+                cache = FileCache(path, backend=backend)
+                self.assertEqual({key: cache[key] for key in cache},
+                                 {'bb': 2, 'cc': 3, 'dd': 4})
+
+    def test_concurrent_processes(self):
+        for backend in (YAMLBackend, SQLiteBackend):
+            with self.subTest(backend=backend.__name__), \
+                    TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'cache.db')
+                context = multiprocessing.get_context('fork')
+
+                processes = [context.Process(target=_save_entries,
+                                             args=(path, backend, index))
+                             for index in range(4)]
+                for process in processes:
+                    process.start()
+                for process in processes:
+                    process.join()
+
+                self.assertEqual(
+                    [process.exitcode for process in processes], [0] * 4)
+                self.assertEqual(len(FileCache(path, backend=backend)), 40)
 
+    @patch('builtins.open', new_callable=mock_open)
+    def test_save_without_file(self, mock_file):
         cache = FileCache()
-        cache.filename = path
         cache['aa'] = 1
+        cache.save()
+
+        mock_file.assert_not_called()
+
+
+class TestSQLiteBackend(TestCase):
+    def setUp(self):
+        self.test_directory = TemporaryDirectory()
+        self.path = os.path.join(self.test_directory.name, 'cache.db')
+
+    def tearDown(self):
+        self.test_directory.cleanup()
+
+    def test_default_backend(self):
+        cache = FileCache(self.path)
+
+        self.assertIsInstance(cache.backend, SQLiteBackend)
+        self.assertEqual(len(cache), 0)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_save_and_lazy_reload(self):
+        cache = FileCache(self.path)
+        cache['aa'] = {'bb': [1, 2]}
+        cache['cc'] = [ZuulJob('job1', 'check', {'voting': False})]
+        cache.save()
+
+        cache = FileCache(self.path)
+
+        self.assertEqual(cache._cache, {})
+        self.assertEqual(list(cache), ['aa', 'cc'])
+        self.assertIn('aa', cache)
+        self.assertNotIn('dd', cache)
+        self.assertEqual(cache['aa'], {'bb': [1, 2]})
+        self.assertEqual(list(cache._cache), ['aa'])
+        self.assertTrue(cache['cc'][0].really_equal(
+            ZuulJob('job1', 'check', {'voting': False})))
+        self.assertFalse(cache.changed)
+
+    def test_per_key_writes(self):
+        cache = FileCache(self.path)
+        cache.update({'aa': 1, 'bb': 2, 'cc': 3})
+        cache.save()
+
+        cache = FileCache(self.path)
+        cache['aa'] = 10
+        del cache['bb']
+
+        self.assertEqual(cache._dirty, {'aa'})
+        self.assertEqual(cache._deleted, {'bb'})
+        self.assertEqual(list(cache), ['aa', 'cc'])
+        with self.assertRaises(KeyError):
+            cache['bb']
+        with self.assertRaises(KeyError):
+            del cache['bb']
+
+        cache.save()
+
+        with sqlite3.connect(self.path) as connection:
+            rows = connection.execute(
+                'SELECT key FROM cache ORDER BY key').fetchall()
+        self.assertEqual(rows, [('aa',), ('cc',)])
+        self.assertEqual(dict((key, cache[key]) for key in cache),
+                         {'aa': 10, 'cc': 3})
+
+    def test_clear(self):
+        cache = FileCache(self.path)
+        cache.update({'aa': 1, 'bb': 2})
+        cache.save()
+
+        cache = FileCache(self.path)
+        cache.clear()
+        cache['cc'] = 3
+
+        self.assertEqual(list(cache), ['cc'])
+        self.assertNotIn('aa', cache)
+
+        cache.save()
+        cache = FileCache(self.path)
+
+        self.assertEqual(list(cache), ['cc'])
+
+    def test_legacy_yaml_migration(self):
+        with open(self.path, 'w') as file:
+            file.write('---\naa: 1\nbb:\n- 2\n')
+
+        cache = FileCache(self.path)
+
+        self.assertEqual(cache['aa'], 1)
+        self.assertEqual(cache['bb'], [2])
+        with open(self.path, 'rb') as file:
+            self.assertTrue(file.read().startswith(b'SQLite format 3'))
+        self.assertTrue(os.path.exists(self.path + '.yaml'))
+
+    def test_export(self):
+        cache = FileCache(self.path)
+        cache.update({'bb': 2, 'aa': 1})
+        cache.save()
+
+        export = os.path.join(self.test_directory.name, 'cache.yaml')
+        FileCache(self.path).export(export)
+
+        with open(export, 'r') as file:
+            self.assertEqual(file.read(), '---\naa: 1\nbb: 2\n\n')
+        self.assertEqual(dict(FileCache(export, backend=YAMLBackend)._cache),
+                         {'aa': 1, 'bb': 2})
+
+
+class TestCacheLimits(TestCase):
+    def setUp(self):
+        self.test_directory = TemporaryDirectory()
+        self.path = os.path.join(self.test_directory.name, 'cache.db')
+        self.now = 1000.0
+        self.time_patcher = patch('znoyder.lib.cache.time',
+                                  side_effect=lambda: self.now)
+        self.time_patcher.start()
+
+    def tearDown(self):
+        self.time_patcher.stop()
+        self.test_directory.cleanup()
+
+    @patch('znoyder.tests.test_cache._noop')
+    def test_ttl(self, mock_noop):
+        cache = FileCache(self.path)
+
+        @cache(ttl=60)
+        def function(n: int) -> int:
+            '''Helper function to be decorated in tests.'''
+            _noop()
+            return n
+
+        function(1)
+        self.now += 30
+        function(1)
+        self.assertEqual(mock_noop.call_count, 1)
+        self.assertEqual(cache.get_entry(list(cache)[0])[1], 1060.0)
+
+        cache.save()
+        self.assertEqual(len(FileCache(self.path)), 1)
+
+        self.now += 30
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(len(FileCache(self.path)), 0)
+
+        function(1)
+        self.assertEqual(mock_noop.call_count, 2)
+
+    def test_expired_entries_removed_on_save(self):
+        cache = FileCache(self.path)
+        cache.set('aa', 1, expires=1010.0)
         cache['bb'] = 2
         cache.save()
 
-        expected = '---\naa: 1\nbb: 2\n'
+        self.now += 60
+        FileCache(self.path).save()
+
+        with sqlite3.connect(self.path) as connection:
+            rows = connection.execute('SELECT key FROM cache').fetchall()
+        self.assertEqual(rows, [('bb',)])
+
+    def test_max_entries(self):
+        cache = FileCache(self.path, max_entries=2)
+        for key in ['aa', 'bb', 'cc']:
+            cache[key] = key
+            self.now += 1
+        cache.save()
+
+        cache = FileCache(self.path, max_entries=2)
+        self.assertEqual(list(cache), ['bb', 'cc'])
+
+        self.now += 1
+        cache['bb']  # accessed, so 'cc' is now the least recently used
+        self.now += 1
+        cache['dd'] = 'dd'
+        cache.save()
+
+        self.assertEqual(list(FileCache(self.path)), ['bb', 'dd'])
+
+    def test_merge_changes(self):
+        cache = FileCache(self.path, max_entries=2)
+        cache['aa'] = 'aa'
+        self.now += 1
+        cache['bb'] = 'bb'
+        cache.save()
+
+        worker = FileCache(self.path)
+        self.now += 1
+        worker['aa']  # accessed, so 'bb' is now the least recently used
+        worker.set('cc', 'cc', duration=2.0)
+
+        entries, accessed = worker.pop_changes()
+        self.assertEqual(entries, {'cc': ('cc', None, 2.0)})
+        self.assertEqual(accessed, {'aa': 1002.0})
+        self.assertEqual(worker.pop_changes(), ({}, {}))
+
+        cache.merge_changes(entries, accessed)
+        cache.save()
+
+        self.assertEqual(list(FileCache(self.path)), ['aa', 'cc'])
+
+    def test_max_bytes(self):
+        cache = FileCache(self.path, max_bytes=30)
+        for key in ['aa', 'bb', 'cc']:
+            cache[key] = 'x' * 10  # 11 bytes of YAML each
+            self.now += 1
+        cache.save()
+
+        self.assertEqual(list(FileCache(self.path)), ['bb', 'cc'])
+
+    def test_access_times_saved_without_changes(self):
+        cache = FileCache(self.path)
+        cache.update({'aa': 1, 'bb': 2})
+        cache.save()
+
+        self.now += 10
+        cache = FileCache(self.path)
+        cache['aa']
+        self.assertFalse(cache.changed)
+        cache.save()
+
+        with sqlite3.connect(self.path) as connection:
+            rows = connection.execute(
+                'SELECT key, accessed FROM cache ORDER BY key').fetchall()
+        self.assertEqual(rows, [('aa', 1010.0), ('bb', 1000.0)])
+
+    def test_save_without_entries_creates_no_file(self):
+        cache = FileCache(self.path, max_entries=1)
+        cache.save()
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_schema_upgrade(self):
+        with sqlite3.connect(self.path) as connection:
+            connection.execute('CREATE TABLE cache '
+                               '(key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            connection.execute("INSERT INTO cache VALUES ('aa', '1\n')")
+        connection.close()
+
+        cache = FileCache(self.path)
+
+        self.assertEqual(cache['aa'], 1)
+        with sqlite3.connect(self.path) as connection:
+            rows = connection.execute(
+                'SELECT size, expires FROM cache').fetchall()
+        self.assertEqual(rows, [(2, None)])
+
+
+class TestCacheStats(TestCase):
+    def setUp(self):
+        self.test_directory = TemporaryDirectory()
+        self.path = os.path.join(self.test_directory.name, 'cache.db')
+        self.clock = 0.0
+        self.clock_patcher = patch('znoyder.lib.cache.perf_counter',
+                                   side_effect=lambda: self.clock)
+        self.clock_patcher.start()
+
+    def tearDown(self):
+        self.clock_patcher.stop()
+        self.test_directory.cleanup()
+
+    def make_function(self, cache):
+        @cache(readable=True)
+        def function(n: int) -> str:
+            '''Helper function to be decorated in tests.'''
+            self.clock += 2.5
+            return 'x' * n
+
+        return function
+
+    def test_time_saved(self):
+        cache = FileCache(self.path)
+        function = self.make_function(cache)
+
+        function(3)
+        function(3)
+        function(3)
+        function(4)
+
+        stats = cache.stats()[function.__qualname__]
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['time_saved'], 5.0)
+
+        cache.save()
+
+        # Durations and counters are kept in the file
+        cache = FileCache(self.path)
+        function = self.make_function(cache)
+        function(4)
+
+        self.assertEqual(cache.stats(), {function.__qualname__: {
+            'entries': 2,
+            'size': 17,  # 'xxx\n...\n' and 'xxxx\n...\n'
+            'hits': 3,
+            'misses': 2,
+            'time_saved': 7.5,
+        }})
+
+        cache.save()
+        self.assertEqual(FileCache(self.path).stats()[
+            function.__qualname__]['hits'], 3)
+
+    def test_stats_yaml_backend(self):
+        cache = FileCache(os.path.join(self.test_directory.name, 'cache'),
+                          backend=YAMLBackend)
+        function = self.make_function(cache)
+        function(3)
+
+        self.assertEqual(cache.stats(), {function.__qualname__: {
+            'entries': 1, 'size': 8, 'hits': 0, 'misses': 1,
+            'time_saved': 0,
+        }})
+
+    def test_merge_counters(self):
+        cache = FileCache()
+        function = self.make_function(cache)
+        function(1)
+
+        cache.merge_counters({function.__qualname__: {
+            'hits': 2, 'misses': 1, 'key_time': 0.0, 'time_saved': 5.0
+        }, 'other': {
+            'hits': 1, 'misses': 0, 'key_time': 0.0, 'time_saved': 1.0
+        }})
+
+        self.assertEqual(cache.counters[function.__qualname__]['hits'], 2)
+        self.assertEqual(cache.counters[function.__qualname__]['misses'], 2)
+        self.assertEqual(cache.counters['other']['time_saved'], 1.0)
+
+        cache.reset_counters()
+        self.assertEqual(cache.counters, {})
+
+    def test_keys_and_evict(self):
+        cache = FileCache(self.path)
+        cache.update({'aa(1)': 1, 'aa(2)': 2, 'bb(1)': 3})
+        cache.save()
+
+        cache = FileCache(self.path)
+        self.assertEqual(cache.keys(), ['aa(1)', 'aa(2)', 'bb(1)'])
+        self.assertEqual(cache.keys('aa(*'), ['aa(1)', 'aa(2)'])
+        self.assertEqual(cache.evict('*(1)'), 2)
+        cache.save()
 
-        mock_file.assert_called_once_with(path, 'w')
-        mock_write = mock_file.return_value.__enter__().write
-        mock_write.assert_any_call(expected)
-        mock_write.assert_any_call('\n')
-        self.assertEqual(mock_write.call_count, 2)
+        self.assertEqual(FileCache(self.path).keys(), ['aa(2)'])
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+#
+# Copyright 2024 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+from argparse import Namespace
+import os
+from tempfile import TemporaryDirectory
+from time import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from znoyder.cacher import format_stats
+from znoyder.cacher import main
+from znoyder.lib.cache import FileCache
+from znoyder.lib.logger import LOG
+
+
+class TestCacher(TestCase):
+    def setUp(self):
+        self.test_directory = TemporaryDirectory()
+        self.path = os.path.join(self.test_directory.name, 'jobs.db')
+
+        cache = FileCache(self.path)
+        cache.set('function1(1)', 1)
+        cache.set('function1(2)', 2)
+        cache.set('function2(1)', 1, expires=time() + 60)
+        cache.save()
+
+    def tearDown(self):
+        self.test_directory.cleanup()
+
+    def run_command(self, subcommand, **kwargs):
+        args = Namespace(cache_file=self.path, subcommand=subcommand,
+                         **kwargs)
+        with patch('builtins.print') as mock_print:
+            main(args)
+
+        return [call.args[0] for call in mock_print.call_args_list]
+
+    def test_format_stats(self):
+        stats = {
+            'function2': {'entries': 0, 'size': 0, 'hits': 0, 'misses': 0,
+                          'time_saved': 0},
+            'function1': {'entries': 2, 'size': 10, 'hits': 3, 'misses': 1,
+                          'time_saved': 12.345},
+        }
+
+        self.assertEqual(format_stats(stats), [
+            ('function1', '2', '10', '3', '1', '75%', '12.3s'),
+            ('function2', '0', '0', '0', '0', '-', '0.0s'),
+        ])
+
+    def test_stats(self):
+        output = self.run_command('stats')
+
+        self.assertEqual(output, [
+            'function   entries  size  hits  misses  hit-ratio  saved',
+            '---------  -------  ----  ----  ------  ---------  -----',
+            'function1  2        12    0     0       -          0.0s',
+            'function2  1        6     0     0       -          0.0s',
+        ])
+
+    def test_list(self):
+        self.assertEqual(self.run_command('list', pattern='*'),
+                         ['function1(1)', 'function1(2)', 'function2(1)'])
+        self.assertEqual(self.run_command('list', pattern='*(2)'),
+                         ['function1(2)'])
+
+    def test_evict(self):
+        with self.assertLogs(LOG) as mock_log:
+            self.run_command('evict', pattern='function1(1*')
+
+        self.assertEqual(mock_log.output,
+                         ['INFO:znoyderLogger:Evicted 1 cache entries'])
+        self.assertEqual(list(FileCache(self.path)),
+                         ['function1(2)', 'function2(1)'])
+
+    @patch('znoyder.lib.cache.time', side_effect=lambda: time() + 120)
+    def test_purge(self, mock_time):
+        with self.assertLogs(LOG) as mock_log:
+            self.run_command('purge', all=False)
+            self.run_command('purge', all=True)
+
+        self.assertEqual(mock_log.output, [
+            'INFO:znoyderLogger:Purged 1 cache entries',
+            'INFO:znoyderLogger:Purged 2 cache entries',
+        ])
+        self.assertEqual(len(FileCache(self.path)), 0)
@@ -73,6 +73,28 @@ class TestCli(TestCase):
         self.assertEqual(args.subcommand, "releases")
         self.assertTrue(args.debug)
 
+    @patch('argparse.ArgumentParser._print_message')
+    def test_cache(self, mock_argpare_print):
+        """Test parsing of znoyder cache arguments."""
+        self.assertRaises(SystemExit, process_arguments, ["cache"])
+
+        args = process_arguments(["cache", "stats"])
+        self.assertEqual(args.subcommand, "stats")
+        self.assertEqual(args.cache_file, "jobs.db")
+
+        args = process_arguments(["cache", "--cache-file", "http.db",
+                                  "list"])
+        self.assertEqual(args.subcommand, "list")
+        self.assertEqual(args.cache_file, "http.db")
+        self.assertEqual(args.pattern, "*")
+
+        args = process_arguments(["cache", "evict", "fetch_*"])
+        self.assertEqual(args.pattern, "fetch_*")
+        self.assertRaises(SystemExit, process_arguments, ["cache", "evict"])
+
+        args = process_arguments(["cache", "purge", "--all"])
+        self.assertTrue(args.all)
+
     @patch('argparse.ArgumentParser._print_message')
     def test_download(self, mock_argpare_print):
         """Test parsing of znoyder download arguments."""
@@ -84,6 +106,10 @@ class TestCli(TestCase):
         self.assertEqual(args.destination, "dest/")
         self.assertTrue(args.errors_fatal)
         self.assertFalse(args.skip_existing)
+        self.assertEqual(args.mode, "contents")
+
+        args = process_arguments(cmd + ["--mode", "archive"])
+        self.assertEqual(args.mode, "archive")
 
     @patch('argparse.ArgumentParser._print_message')
     def test_download_missing_destination(self, mock_argpare_print):
@@ -143,3 +169,19 @@ class TestCli(TestCase):
         self.assertIsNone(args.name)
         self.assertEqual(args.component, "network")
         self.assertEqual(args.tag, "osp-17")
+        self.assertEqual(args.jobs, 1)
+
+    @patch('argparse.ArgumentParser._print_message')
+    def test_generate_jobs(self, mock_argpare_print):
+        """Test parsing of znoyder generate arguments."""
+        cmd = "generate --jobs 8".split()
+        args = process_arguments(cmd)
+        self.assertEqual(args.jobs, 8)
+
+    @patch('argparse.ArgumentParser._print_message')
+    def test_generate_jobs_invalid(self, mock_argpare_print):
+        """Test rejection of invalid znoyder generate --jobs values."""
+        for value in ('-1', 'many'):
+            with self.subTest(value=value):
+                cmd = ["generate", "--jobs", value]
+                self.assertRaises(SystemExit, process_arguments, cmd)
@@ -19,17 +19,34 @@ import json
 import os
 from argparse import Namespace
 from dataclasses import dataclass
+from dataclasses import field
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 import logging
+import tarfile
+from threading import Barrier
+from threading import Lock
+from threading import Thread
+import time
 from unittest import TestCase
+from unittest.mock import Mock
 from unittest.mock import patch
 from tempfile import TemporaryDirectory
 
 from requests.exceptions import RequestException
 
 from znoyder.downloader import (CONTENT_ENDPOINT, GITHUB_API_URL,
+                                HTTP_METADATA_TTL,
                                 OPENDEV_API_URL, REPO_ENDPOINT, download_file,
                                 download_files_parallel, download_zuul_config,
-                                get_raw_url_files_in_repository, main)
+                                download_zuul_configs,
+                                conditional_get,
+                                get_raw_url_files_in_repository,
+                                get_raw_url_files_in_tree,
+                                get_rate_limit_delay, get_session, http_get,
+                                main)
+from znoyder.lib.cache import FileCache
 
 
 def setUpModule() -> None:
@@ -47,6 +64,7 @@ class MockHTMLResponse:
     text: str
     url: str
     content: bytes
+    headers: dict = field(default_factory=dict)
 
 
 class TestDownloader(TestCase):
@@ -58,8 +76,12 @@ class TestDownloader(TestCase):
     def setUp(self):
         self.test_directory = TemporaryDirectory()
         self.dest_dir = self.test_directory.name
+        self.metadata_patcher = patch('znoyder.downloader.http_metadata',
+                                      FileCache())
+        self.metadata_patcher.start()
 
     def tearDown(self):
+        self.metadata_patcher.stop()
         self.test_directory.cleanup()
 
     def test_get_raw_url_wrong_repo(self):
@@ -77,7 +99,7 @@ class TestDownloader(TestCase):
         data = get_raw_url_files_in_repository(repo, {}, errors_fatal=False)
         self.assertEqual(data, {})
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_get_raw_url_get_unsuccessful(self, patched_get):
         """Test that get_raw_url_files_in_repository fails when getting
         a response other than 200 and errors_fatal set to True.
@@ -91,7 +113,7 @@ class TestDownloader(TestCase):
         self.assertRaises(SystemExit, get_raw_url_files_in_repository, repo,
                           {}, errors_fatal=True)
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_get_raw_url_get_unsuccessful_non_fatal(self, patched_get):
         """Test that get_raw_url_files_in_repository fails when getting
         a response other than 200 and errors_fatal set to True.
@@ -106,7 +128,7 @@ class TestDownloader(TestCase):
         self.assertEqual(data, {repo: []})
         patched_get.assert_called_with(url=url, auth=None)
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_get_raw_url_get_files(self, patched_get):
         """Test that get_raw_url_files_in_repository processes
         correctly a response.
@@ -132,7 +154,7 @@ class TestDownloader(TestCase):
                                                errors_fatal=False)
         self.assertEqual(data, {repo: ["url1", "url2"]})
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_get_raw_url_get_files_github(self, patched_get):
         """Test that get_raw_url_files_in_repository processes
         correctly a response.
@@ -158,7 +180,7 @@ class TestDownloader(TestCase):
                                                errors_fatal=False)
         self.assertEqual(data, {repo: ["url1", "url2"]})
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_get_raw_url_get_directories(self, patched_get):
         """Test that get_raw_url_files_in_repository processes
         correctly a response.
@@ -186,7 +208,7 @@ class TestDownloader(TestCase):
         self.assertEqual(data, {repo: ["url2"],
                                 repo+"/.github": ["url2"]})
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_download_file_exception(self, patched_get):
         """Test that download_file properly  catches any exception occurred
         when sending a request.
@@ -195,7 +217,7 @@ class TestDownloader(TestCase):
         patched_get.side_effect = RequestException
         self.assertRaises(SystemExit, download_file, "", self.dest_dir)
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_download_file(self, patched_get):
         """Test that download_file properly write the file to download."""
 
@@ -208,7 +230,7 @@ class TestDownloader(TestCase):
             content_read = file_obj.read()
         self.assertEqual(content, content_read)
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_download_file_exists(self, patched_get):
         """Test that download_file skips the download if the file already
         exists.
@@ -223,7 +245,7 @@ class TestDownloader(TestCase):
         # if the call ends without raising, that means that download_file
         # returned early
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_download_file_parallel(self, patched_get):
         """Test that download_files_parallel properly writes the files
         to download.
@@ -240,7 +262,7 @@ class TestDownloader(TestCase):
                 content_read = file_obj.read()
             self.assertEqual(content, content_read)
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_download_zuul_config(self, patched_get):
         """Test that download_zuul_config properly writes the files
         to download.
@@ -272,6 +294,67 @@ class TestDownloader(TestCase):
                 content_read = file_obj.read()
             self.assertEqual(content, content_read)
 
+    @patch("znoyder.downloader.download_file")
+    @patch("znoyder.downloader.get_raw_url_files_in_repository")
+    def test_download_zuul_configs(self, get_files_call, download_call):
+        """Test that download_zuul_configs fetches many repositories
+        concurrently and returns the results for each of them.
+        """
+        repos = ["https://opendev.org/organization/project%d" % index
+                 for index in range(10)]
+        get_files_call.side_effect = lambda repo, *args: {
+            repo.split("/", 3)[-1]: ["url1", "url2"],
+            repo.split("/", 3)[-1] + "/zuul.d": ["url3"],
+        }
+
+        results = download_zuul_configs(repos + repos[:2], branch="master",
+                                        destination=self.dest_dir,
+                                        concurrency=4)
+
+        self.assertEqual(list(results.keys()), repos)
+        self.assertEqual(results[repos[3]],
+                         {"organization/project3": ["url1", "url2"],
+                          "organization/project3/zuul.d": ["url3"]})
+        self.assertEqual(get_files_call.call_count, 10)
+        self.assertEqual(download_call.call_count, 30)
+        download_call.assert_any_call(
+            "url3", f"{self.dest_dir}/organization/project3/zuul.d",
+            skip_existing=False
+        )
+        self.assertTrue(os.path.isdir(
+            os.path.join(self.dest_dir, "organization/project3/zuul.d")))
+
+    @patch("znoyder.downloader.download_file")
+    @patch("znoyder.downloader.get_raw_url_files_in_repository")
+    def test_download_zuul_configs_concurrency(self, get_files_call,
+                                               download_call):
+        """Test that download_zuul_configs respects the concurrency limit
+        shared by all the requests.
+        """
+        lock = Lock()
+        running = []
+        peak = []
+
+        def request(*args, **kwargs):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.pop()
+            return {"organization/project": ["url1", "url2", "url3"]}
+
+        get_files_call.side_effect = request
+        download_call.side_effect = request
+
+        repos = ["https://opendev.org/organization/project%d" % index
+                 for index in range(6)]
+        download_zuul_configs(repos, branch="master",
+                              destination=self.dest_dir, concurrency=3)
+
+        self.assertEqual(len(peak), 24)
+        self.assertLessEqual(max(peak), 3)
+
     @patch("os.path.exists")
     @patch("znoyder.downloader.get_raw_url_files_in_repository")
     def test_download_zuul_config_skip(self, get_files_call, exists_call):
@@ -285,7 +368,7 @@ class TestDownloader(TestCase):
         self.assertEqual(files, {'organization/project_name': []})
         self.assertFalse(get_files_call.called)
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_main(self, patched_get):
         """Test that main properly calls the module functions."""
         payload = [{"name": ".zuul.yaml",
@@ -316,3 +399,485 @@ class TestDownloader(TestCase):
             with open(os.path.join(out_folder, name), "rb") as file_obj:
                 content_read = file_obj.read()
             self.assertEqual(content, content_read)
+
+    @patch("requests.Session.get")
+    def test_get_raw_url_files_in_tree(self, patched_get):
+        """Test that the tree mode finds Zuul files with a single listing
+        and follows the Gitea pagination.
+        """
+        pages = [
+            {"tree": [{"path": ".zuul.yaml", "type": "blob"},
+                      {"path": "setup.py", "type": "blob"},
+                      {"path": "zuul.d", "type": "tree"},
+                      {"path": "zuul.d/jobs.yaml", "type": "blob"}],
+             "truncated": True},
+            {"tree": [{"path": "zuul.d/project.yaml", "type": "blob"},
+                      {"path": "zuul.d/other/jobs.yaml", "type": "blob"},
+                      {"path": "docs/zuul.yaml", "type": "blob"}],
+             "truncated": False},
+        ]
+        patched_get.side_effect = [
+            MockHTMLResponse(200, json.dumps(page), "url", b"")
+            for page in pages
+        ]
+
+        files = get_raw_url_files_in_tree(
+            "https://opendev.org/openstack/project",
+            {"directories": ["zuul.d", ".zuul.d"],
+             "files": ["zuul.yaml", ".zuul.yaml"]},
+            "master")
+
+        raw = OPENDEV_API_URL + "repos/openstack/project/raw/"
+        self.assertEqual(files, {
+            "openstack/project": [raw + ".zuul.yaml?ref=master"],
+            "openstack/project/zuul.d": [
+                raw + "zuul.d/jobs.yaml?ref=master",
+                raw + "zuul.d/project.yaml?ref=master"],
+        })
+        self.assertEqual(patched_get.call_count, 2)
+        self.assertIn("page=2", patched_get.call_args.kwargs["url"])
+
+    @patch("requests.Session.get")
+    def test_get_raw_url_files_in_tree_github(self, patched_get):
+        """Test that the tree mode builds raw URLs of GitHub."""
+        tree = {"tree": [{"path": "zuul.yaml", "type": "blob"}],
+                "truncated": False}
+        patched_get.return_value = MockHTMLResponse(200, json.dumps(tree),
+                                                    "url", b"")
+
+        files = get_raw_url_files_in_tree(
+            "https://github.com/organization/project",
+            {"directories": [], "files": ["zuul.yaml"]},
+            "main")
+
+        self.assertEqual(files, {"organization/project": [
+            "https://raw.githubusercontent.com/organization/project/"
+            "main/zuul.yaml"]})
+        self.assertEqual(
+            patched_get.call_args.kwargs["url"],
+            GITHUB_API_URL + "repos/organization/project/"
+            "git/trees/main?recursive=1")
+
+    @patch("requests.Session.get")
+    def test_get_raw_url_files_in_tree_branch_with_slash(self, patched_get):
+        """Test that branches with a slash are resolved to their last
+        commit for the trees endpoint, but kept in the raw URLs.
+        """
+        commits = [{"sha": "0123abcd"}]
+        tree = {"tree": [{"path": "zuul.yaml", "type": "blob"}]}
+
+        for host, api_url, commits_url, raw_url in [
+                ("https://opendev.org", OPENDEV_API_URL,
+                 "commits?sha=stable%2F2023.1&limit=1&stat=false",
+                 OPENDEV_API_URL + "repos/openstack/project/raw/"
+                 "zuul.yaml?ref=stable/2023.1"),
+                ("https://github.com", GITHUB_API_URL,
+                 "commits?sha=stable%2F2023.1&per_page=1",
+                 "https://raw.githubusercontent.com/openstack/project/"
+                 "stable/2023.1/zuul.yaml")]:
+            with self.subTest(host=host):
+                patched_get.reset_mock()
+                patched_get.side_effect = [
+                    MockHTMLResponse(200, json.dumps(commits), "url", b""),
+                    MockHTMLResponse(200, json.dumps(tree), "url", b""),
+                ]
+
+                files = get_raw_url_files_in_tree(
+                    host + "/openstack/project",
+                    {"directories": [], "files": ["zuul.yaml"]},
+                    "stable/2023.1")
+
+                self.assertEqual(files, {"openstack/project": [raw_url]})
+                urls = [call.kwargs["url"]
+                        for call in patched_get.call_args_list]
+                self.assertEqual(urls[0], api_url + "repos/openstack/"
+                                 "project/" + commits_url)
+                self.assertTrue(urls[1].startswith(
+                    api_url + "repos/openstack/project/git/trees/0123abcd?"))
+
+    @patch("requests.Session.get")
+    def test_get_raw_url_files_in_tree_unknown_branch(self, patched_get):
+        """Test that a branch which cannot be resolved is an error."""
+        patched_get.return_value = MockHTMLResponse(404, "{}", "url", b"")
+        repository = "https://opendev.org/openstack/project"
+        data_required = {"directories": [], "files": ["zuul.yaml"]}
+
+        files = get_raw_url_files_in_tree(repository, data_required,
+                                          "stable/none", errors_fatal=False)
+        self.assertEqual(files, {"openstack/project": []})
+
+        with self.assertRaises(SystemExit):
+            get_raw_url_files_in_tree(repository, data_required,
+                                      "stable/none")
+
+    @patch("requests.Session.get")
+    def test_download_zuul_config_tree(self, patched_get):
+        """Test that files listed in tree mode are stored without the
+        query part of raw URLs in their names.
+        """
+        tree = {"tree": [{"path": "zuul.d/jobs.yaml", "type": "blob"}]}
+        patched_get.side_effect = [
+            MockHTMLResponse(200, json.dumps(tree), "url", b""),
+            MockHTMLResponse(200, "", "url", b"content"),
+        ]
+
+        repo = "https://opendev.org/openstack/project"
+        download_zuul_config(repository=repo, branch="master",
+                             destination=self.dest_dir, mode="tree")
+
+        path = os.path.join(self.dest_dir, "openstack/project/zuul.d",
+                            "jobs.yaml")
+        with open(path, "rb") as file_obj:
+            self.assertEqual(file_obj.read(), b"content")
+
+    @patch("requests.Session.get")
+    def test_download_zuul_config_removes_stale(self, patched_get):
+        """Test that local Zuul config files which are not in the listing
+        anymore are removed, while other files are kept.
+        """
+        tree = {"tree": [{"path": "zuul.d/jobs.yaml", "type": "blob"}]}
+        patched_get.side_effect = [
+            MockHTMLResponse(200, json.dumps(tree), "url", b""),
+            MockHTMLResponse(200, "", "url", b"content"),
+        ]
+
+        project_dir = os.path.join(self.dest_dir, "openstack/project")
+        os.makedirs(os.path.join(project_dir, "zuul.d"))
+        for name in ["zuul.d/removed.yaml", "zuul.yaml", "README"]:
+            with open(os.path.join(project_dir, name), "w") as file_obj:
+                file_obj.write("old")
+
+        repo = "https://opendev.org/openstack/project"
+        download_zuul_config(repository=repo, branch="master",
+                             destination=self.dest_dir, mode="tree")
+
+        self.assertEqual(os.listdir(os.path.join(project_dir, "zuul.d")),
+                         ["jobs.yaml"])
+        self.assertEqual(sorted(os.listdir(project_dir)),
+                         ["README", "zuul.d"])
+
+    @patch("requests.Session.get")
+    def test_download_zuul_config_error_keeps_files(self, patched_get):
+        """Test that nothing is removed when the listing fails."""
+        patched_get.return_value = MockHTMLResponse(404, "{}", "url", b"")
+
+        project_dir = os.path.join(self.dest_dir, "openstack/project")
+        os.makedirs(project_dir)
+        with open(os.path.join(project_dir, "zuul.yaml"), "w") as file_obj:
+            file_obj.write("old")
+
+        repo = "https://opendev.org/openstack/project"
+        files = download_zuul_config(repository=repo, branch="master",
+                                     destination=self.dest_dir, mode="tree",
+                                     errors_fatal=False)
+
+        self.assertEqual(files, {"openstack/project": []})
+        self.assertEqual(os.listdir(project_dir), ["zuul.yaml"])
+
+    @patch("requests.Session.get")
+    def test_download_zuul_config_archive(self, patched_get):
+        """Test that archive mode extracts only the Zuul configuration."""
+        archive = BytesIO()
+        with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+            for name in ["project-abc/zuul.yaml", "project-abc/setup.py",
+                         "project-abc/zuul.d/jobs.yaml",
+                         "project-abc/zuul.d/nested/jobs.yaml"]:
+                data = name.encode()
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, BytesIO(data))
+        archive.seek(0)
+        patched_get.return_value = Mock(status_code=200, url="url",
+                                        raw=archive, headers={})
+
+        repo = "https://github.com/organization/project"
+        files = download_zuul_config(repository=repo, branch="master",
+                                     destination=self.dest_dir,
+                                     mode="archive")
+
+        self.assertEqual(files, {
+            "organization/project": ["zuul.yaml"],
+            "organization/project/zuul.d": ["zuul.d/jobs.yaml"],
+        })
+        self.assertEqual(
+            patched_get.call_args.kwargs["url"],
+            GITHUB_API_URL + "repos/organization/project/tarball/master")
+        path = os.path.join(self.dest_dir, "organization/project/zuul.d",
+                            "jobs.yaml")
+        with open(path, "rb") as file_obj:
+            self.assertEqual(file_obj.read(),
+                             b"project-abc/zuul.d/jobs.yaml")
+        self.assertFalse(os.path.exists(os.path.join(
+            self.dest_dir, "organization/project/setup.py")))
+
+    def test_download_zuul_configs_unknown_mode(self):
+        """Test that an unknown download mode is rejected."""
+        with self.assertRaises(ValueError):
+            download_zuul_configs(["https://opendev.org/org/project"],
+                                  branch="master", destination=self.dest_dir,
+                                  mode="clone")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Replies with the queued responses, then with 200 and empty body."""
+    responses = []
+    requests = []
+    requests_headers = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        self.requests_headers.append(dict(self.headers))
+        status, headers = (self.responses.pop(0) if self.responses
+                           else (200, {}))
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status == 304:
+            self.end_headers()
+            return
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServerTestCase(TestCase):
+    """Base for tests talking to a local stand-in HTTP server."""
+
+    def shortDescription(self):  # pragma: no cover
+        return None
+
+    def setUp(self):
+        StandInHandler.responses = []
+        StandInHandler.requests = []
+        StandInHandler.requests_headers = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.thread = Thread(target=self.server.serve_forever,
+                             kwargs={'poll_interval': 0.01}, daemon=True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+        self.session = get_session(pool_size=2, retries=3, backoff_factor=0)
+
+    def tearDown(self):
+        get_session(pool_size=2)  # drop the test-specific settings
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestHttpSession(StandInServerTestCase):
+    """Test the HTTP session against a local stand-in server."""
+
+    def test_session_shared(self):
+        self.assertIs(get_session(), self.session)
+        self.assertIsNot(get_session(retries=1), self.session)
+
+    def test_session_shared_between_threads(self):
+        barrier = Barrier(16)
+        sessions = []
+
+        def slow_session():
+            time.sleep(0.01)  # widen the window for a race
+            return Mock()
+
+        def worker():
+            barrier.wait()
+            sessions.append(get_session())
+
+        with patch('znoyder.downloader._session', None), \
+                patch('requests.Session', side_effect=slow_session):
+            threads = [Thread(target=worker) for _ in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(sessions), 16)
+        self.assertEqual(len({id(session) for session in sessions}), 1)
+
+    def test_retry_on_server_errors(self):
+        StandInHandler.responses = [(500, {}), (502, {}), (503, {})]
+
+        response = http_get(self.url + 'file')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StandInHandler.requests, ['/file'] * 4)
+
+    def test_retry_gives_up(self):
+        StandInHandler.responses = [(503, {})] * 5
+
+        response = http_get(self.url + 'file')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(StandInHandler.requests), 4)
+
+    def test_retry_after(self):
+        StandInHandler.responses = [(429, {'Retry-After': '0'})]
+
+        response = http_get(self.url + 'file')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(StandInHandler.requests), 2)
+
+    def test_no_retry_on_client_errors(self):
+        StandInHandler.responses = [(404, {})]
+
+        response = http_get(self.url + 'file')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(StandInHandler.requests), 1)
+
+    @patch('znoyder.downloader.sleep')
+    def test_github_rate_limit(self, mock_sleep):
+        headers = {'X-RateLimit-Remaining': '0',
+                   'X-RateLimit-Reset': str(int(time.time()) + 10)}
+        StandInHandler.responses = [(403, headers)]
+
+        response = http_get(self.url + 'file')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(StandInHandler.requests), 2)
+        mock_sleep.assert_called_once()
+        self.assertLessEqual(mock_sleep.call_args[0][0], 11)
+
+    @patch('znoyder.downloader.sleep')
+    def test_github_rate_limit_too_long(self, mock_sleep):
+        headers = {'X-RateLimit-Remaining': '0',
+                   'X-RateLimit-Reset': str(int(time.time()) + 3600)}
+        StandInHandler.responses = [(403, headers)]
+
+        response = http_get(self.url + 'file')
+
+        self.assertEqual(response.status_code, 403)
+        mock_sleep.assert_not_called()
+
+    def test_get_rate_limit_delay(self):
+        reset = str(int(time.time()) + 60)
+
+        self.assertIsNone(get_rate_limit_delay(
+            MockHTMLResponse(200, '', '', b'')))
+        self.assertIsNone(get_rate_limit_delay(
+            MockHTMLResponse(403, '', '', b'', {})))
+        self.assertIsNone(get_rate_limit_delay(
+            MockHTMLResponse(403, '', '', b'',
+                             {'X-RateLimit-Remaining': '0'})))
+        self.assertIsNotNone(get_rate_limit_delay(
+            MockHTMLResponse(429, '', '', b'',
+                             {'X-RateLimit-Remaining': '0',
+                              'X-RateLimit-Reset': reset})))
+
+
+class TestConditionalRequests(StandInServerTestCase):
+    """Test the revalidation of downloads against a local stand-in."""
+
+    def setUp(self):
+        super().setUp()
+        self.test_directory = TemporaryDirectory()
+        self.dest_dir = self.test_directory.name
+        self.metadata = FileCache()
+        self.metadata_patcher = patch('znoyder.downloader.http_metadata',
+                                      self.metadata)
+        self.metadata_patcher.start()
+
+    def tearDown(self):
+        self.metadata_patcher.stop()
+        self.test_directory.cleanup()
+        super().tearDown()
+
+    def test_listing_not_modified(self):
+        url = self.url + 'listing'
+        validators = {'ETag': '"abc"',
+                      'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+        StandInHandler.responses = [(200, validators), (304, {})]
+
+        first = conditional_get(url)
+        second = conditional_get(url)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.text, first.text)
+        self.assertEqual(self.metadata[url],
+                         {'etag': '"abc"', 'body': '{}',
+                          'last-modified': validators['Last-Modified']})
+
+        self.assertNotIn('If-None-Match', StandInHandler.requests_headers[0])
+        self.assertEqual(StandInHandler.requests_headers[1]['If-None-Match'],
+                         '"abc"')
+        self.assertEqual(
+            StandInHandler.requests_headers[1]['If-Modified-Since'],
+            validators['Last-Modified']
+        )
+
+    def test_file_not_modified(self):
+        url = self.url + 'zuul.yaml'
+        file_path = os.path.join(self.dest_dir, 'zuul.yaml')
+        StandInHandler.responses = [(200, {'ETag': '"abc"'}), (304, {})]
+
+        download_file(url, self.dest_dir)
+        with open(file_path, 'w') as file:
+            file.write('local copy')
+        download_file(url, self.dest_dir)
+
+        with open(file_path) as file:
+            self.assertEqual(file.read(), 'local copy')
+        self.assertEqual(self.metadata[url], {'etag': '"abc"'})
+        self.assertEqual(StandInHandler.requests_headers[1]['If-None-Match'],
+                         '"abc"')
+
+    def test_metadata_on_disk_parallel(self):
+        """Test that metadata kept in an SQLite file can be used from the
+        worker threads in consecutive runs.
+        """
+        filename = os.path.join(self.dest_dir, 'http.db')
+        urls = [self.url + 'zuul.yaml', self.url + '.zuul.yaml']
+        StandInHandler.responses = [(200, {'ETag': '"a"'})] * 2
+
+        for _ in range(2):  # the second run reads the existing file
+            with patch('znoyder.downloader.http_metadata',
+                       FileCache(filename)):
+                download_files_parallel(urls, self.dest_dir)
+            StandInHandler.responses = [(304, {})] * 2
+
+        self.assertEqual(len(StandInHandler.requests), 4)
+        for headers in StandInHandler.requests_headers[2:]:
+            self.assertEqual(headers['If-None-Match'], '"a"')
+
+    def test_file_write_failed(self):
+        url = self.url + 'zuul.yaml'
+        file_path = os.path.join(self.dest_dir, 'zuul.yaml')
+        with open(file_path, 'w') as file:
+            file.write('local copy')
+        StandInHandler.responses = [(200, {'ETag': '"abc"'})]
+
+        with patch('znoyder.downloader.write_atomically',
+                   side_effect=OSError('No space left on device')):
+            with self.assertRaises(SystemExit):
+                download_file(url, self.dest_dir)
+
+        self.assertNotIn(url, self.metadata)
+        with open(file_path) as file:
+            self.assertEqual(file.read(), 'local copy')
+
+    def test_validators_expire(self):
+        url = self.url + 'zuul.yaml'
+        StandInHandler.responses = [(200, {'ETag': '"abc"'})]
+
+        download_file(url, self.dest_dir)
+
+        value, expires, _ = self.metadata.get_entry(url)
+        self.assertEqual(value, {'etag': '"abc"'})
+        self.assertAlmostEqual(expires, time.time() + HTTP_METADATA_TTL,
+                               delta=60)
+
+    def test_file_missing_locally(self):
+        url = self.url + 'zuul.yaml'
+        self.metadata[url] = {'etag': '"abc"'}
+
+        download_file(url, self.dest_dir)
+
+        self.assertNotIn('If-None-Match', StandInHandler.requests_headers[0])
+        self.assertTrue(os.path.exists(os.path.join(self.dest_dir,
+                                                    'zuul.yaml')))
+        self.assertNotIn(url, self.metadata)  # no validators this time
@@ -28,6 +28,7 @@ from znoyder.finder import find_templates
 from znoyder.finder import main
 from znoyder.lib.exceptions import PipelineError
 from znoyder.lib.exceptions import PathError
+from znoyder.lib.zuul import TemplateRegistry
 from znoyder.lib.zuul import ZuulPipeline
 
 
@@ -131,6 +132,7 @@ class TestFinder(TestCase):
     def test_find_templates(self):
         """Test find_teamplates."""
         output = find_templates(self.dest_dir, [ZuulPipeline.CHECK])
+        self.assertIsInstance(output, TemplateRegistry)
         self.assertEqual(len(output), 2)
         template1, template2 = output
         self.assertEqual(template1.template_name, "template1")
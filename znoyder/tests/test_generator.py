@@ -17,6 +17,7 @@
 #
 
 import os.path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 from unittest.mock import Mock
 from unittest.mock import patch
@@ -27,16 +28,22 @@ from znoyder.config import extra_projects
 from znoyder.config import UPSTREAM_CONFIGS_DIR
 from znoyder.generator import cache
 from znoyder.generator import cleanup_generated_jobs_dir
+from znoyder.generator import fetch_templates
 from znoyder.generator import fetch_templates_directory
 from znoyder.generator import fetch_osp_projects
 from znoyder.generator import discover_jobs
+from znoyder.generator import discover_projects_jobs
+from znoyder.generator import discover_upstream_jobs
 from znoyder.generator import generate_projects_pipelines_dict
 from znoyder.generator import generate_projects_templates
 from znoyder.generator import generate_projects_config
 from znoyder.generator import generate_resources_config
 from znoyder.generator import main
 from znoyder.lib.logger import LOG
+from znoyder.lib.zuul import TemplateRegistry
 from znoyder.lib.zuul import ZuulJob
+from znoyder.lib.zuul import ZuulPipeline
+from znoyder.lib.zuul import ZuulProjectTemplate
 
 
 class TestGenerator(TestCase):
@@ -130,11 +137,53 @@ class TestGenerator(TestCase):
             branch='master',
             destination='files-upstream/',
             errors_fatal=False,
-            skip_existing=True,
+            skip_existing=False,
         )
         self.assertEqual(templates_directory, 'organization/repository')
 
-    @patch('znoyder.downloader.download_zuul_config')
+    @patch('znoyder.generator.fetch_templates_directory')
+    def test_fetch_templates(self, mock_templates_directory):
+        mock_templates_directory.return_value = 'organization/templates'
+        pipelines = [ZuulPipeline.CHECK]
+
+        template = ZuulProjectTemplate('template1', 'templates')
+        template.associate_job([ZuulJob('job1', 'check')])
+
+        with TemporaryDirectory() as directory, \
+                patch('znoyder.generator.UPSTREAM_CONFIGS_DIR', directory), \
+                patch('znoyder.finder.find_templates') as mock_finder:
+            path = os.path.join(directory, 'organization/templates')
+            os.makedirs(path)
+            config_file = os.path.join(path, 'zuul.yaml')
+            with open(config_file, 'w') as file:
+                file.write('- project-template: {name: template1}\n')
+
+            mock_finder.return_value = TemplateRegistry([template])
+
+            templates1 = fetch_templates(pipelines)
+            templates2 = fetch_templates(pipelines)
+
+            mock_finder.assert_called_once_with(path, pipelines, 1)
+
+            with open(config_file, 'a') as file:
+                file.write('- project-template: {name: template2}\n')
+
+            fetch_templates(pipelines)
+
+            self.assertEqual(mock_finder.call_count, 2)
+
+        for templates in (templates1, templates2):
+            self.assertIsInstance(templates, TemplateRegistry)
+            self.assertEqual([str(template) for template in templates],
+                             ['template1'])
+            self.assertEqual(templates['template1'].template_jobs,
+                             [ZuulJob('job1', 'check')])
+
+        self.assertEqual(len(cache), 2)  # one snapshot per fingerprint
+        self.assertEqual(templates1.fingerprint, templates2.fingerprint)
+        self.assertEqual(len(templates1.fingerprint), 64)
+
+    @patch('znoyder.downloader.download_zuul_configs')
     @patch('znoyder.browser.get_packages')
     def test_fetch_osp_projects(self, mock_browser, mock_downloader):
         extra_projects.clear()
@@ -157,47 +206,55 @@ class TestGenerator(TestCase):
                 'tag': 'tag3',
             },
         ]
-        mock_downloader.side_effect = [
-            {'organization/repository1': ['url-to-yaml-file1']},
-            {'organization/repository2': ['url-to-yaml-file2']},
-            {'organization/repository3': ['url-to-yaml-file3']},
-            {'additional/project1': ['url-to-yaml-file4']},
-        ]
+        mock_downloader.return_value = {
+            'url1': {'organization/repository1': ['url-to-yaml-file1']},
+            'url2': {'organization/repository2': ['url-to-yaml-file2']},
+            'url3': {'organization/repository3': ['url-to-yaml-file3']},
+            'url-to-additional-repo': {
+                'additional/project1': ['url-to-yaml-file4']
+            },
+        }
 
         projects = fetch_osp_projects('any-tag', {})
 
+        mock_downloader.assert_called_once_with(
+            repositories=['url1', 'url2', 'url3', 'url-to-additional-repo'],
+            branch='any-tag',
+            destination=os.path.join(UPSTREAM_CONFIGS_DIR, 'any-tag'),
+            errors_fatal=False,
+            skip_existing=False,
+        )
+
         self.assertEqual({'project1': 'any-tag/organization/repository1',
                           'project2': 'any-tag/organization/repository2',
                           'project3': 'any-tag/organization/repository3',
                           'additional-project': 'any-tag/additional/project1'},
                          projects)
 
-    @patch('znoyder.mapper.copy_jobs')
-    @patch('znoyder.mapper.override_jobs')
-    @patch('znoyder.mapper.add_jobs')
-    @patch('znoyder.mapper.exclude_jobs')
+    @patch('znoyder.mapper.map_jobs')
     @patch('znoyder.mapper.include_jobs')
     @patch('znoyder.finder.find_jobs')
+    @patch('znoyder.lib.utils.get_files_fingerprint')
+    @patch('znoyder.lib.utils.get_config_paths')
     @patch('os.path.exists', return_value=True)
-    def test_discover_jobs(self, mock_exists, mock_finder,
-                           mock_include, mock_exclude,
-                           mock_add, mock_override, mock_copy):
+    def test_discover_jobs(self, mock_exists, mock_paths, mock_fingerprint,
+                           mock_finder, mock_include, mock_map):
         job1 = ZuulJob('job1', 'check')
         job2 = ZuulJob('job2', 'check')
         job3 = ZuulJob('job3', 'check')
 
         mock_finder.return_value = [1]  # Values do not matter here
         mock_include.return_value = [2]  # as the mapper is tested
-        mock_exclude.return_value = [3]  # in a separate module, hence
-        mock_add.return_value = [4]  # here we just assume any output
-        mock_override.return_value = [5]  # to ensure the execution order
-        mock_copy.return_value = [job1, job2, job3]
+        # in a separate module, hence here we just assume any output
+        # to ensure the execution order
+        mock_map.return_value = [job1, job2, job3]
 
         project_name = 'project1'
         tag = 'any-tag'
         directory = 'example/path'
-        templates = ['templates']
+        templates = TemplateRegistry()
         pipelines = ['pipelines']
+        mock_fingerprint.return_value = 'fingerprint'
 
         with self.assertLogs(LOG) as mock_log:
             jobs = discover_jobs(project_name, tag, directory,
@@ -213,27 +270,103 @@ class TestGenerator(TestCase):
         expected_dir = os.path.join(UPSTREAM_CONFIGS_DIR, directory)
 
         mock_exists.assert_called_once_with(expected_dir)
+        mock_paths.assert_called_once_with(expected_dir)
+        mock_fingerprint.assert_called_once_with(mock_paths.return_value)
         mock_finder.assert_called_once_with(expected_dir, templates, pipelines)
         mock_include.assert_called_once_with([1], tag)
-        mock_exclude.assert_called_once_with([2], project_name, tag)
-        mock_add.assert_called_once_with([3], project_name, tag)
-        mock_override.assert_called_once_with([4], project_name, tag)
-        mock_copy.assert_called_once_with([5], project_name, tag)
+        mock_map.assert_called_once_with([2], project_name, tag)
 
         self.assertEqual([job1, job2, job3], jobs)
 
+    @patch('znoyder.finder.find_jobs')
+    def test_discover_upstream_jobs_fingerprints(self, mock_finder):
+        mock_finder.return_value = [ZuulJob('job1', 'check')]
+        pipelines = [ZuulPipeline.CHECK]
+        templates = TemplateRegistry()
+        path = 'organization/project'
+
+        templates.fingerprint = 'bb'
+
+        discover_upstream_jobs(path, templates, pipelines, 'aa')
+        discover_upstream_jobs(path, templates, pipelines, 'aa')
+        self.assertEqual(mock_finder.call_count, 1)
+
+        # Modified project files
+        discover_upstream_jobs(path, templates, pipelines, 'cc')
+        self.assertEqual(mock_finder.call_count, 2)
+
+        # Modified templates
+        templates.fingerprint = 'dd'
+        discover_upstream_jobs(path, templates, pipelines, 'cc')
+        self.assertEqual(mock_finder.call_count, 3)
+
+        self.assertEqual(len(cache), 3)
+        self.assertIn("discover_upstream_jobs('organization/project', "
+                      "'dd', [1], 'cc')", cache)
+
+    def test_discover_projects_jobs_parallel(self):
+        with TemporaryDirectory() as directory, \
+                patch('znoyder.generator.UPSTREAM_CONFIGS_DIR', directory):
+            projects = {}
+            for index in range(5):
+                project_name = f'project{index}'
+                path = os.path.join(directory, 'organization', project_name)
+                os.makedirs(path)
+                with open(os.path.join(path, 'zuul.yaml'), 'w') as file:
+                    file.write(
+                        '- project:\n'
+                        '    templates: [template1]\n'
+                        '    check:\n'
+                        '      jobs:\n'
+                        '        - openstack-tox-functional\n'
+                        '        - openstack-tox-py39:\n'
+                        f'            vars: {{index: {index}}}\n'
+                    )
+                projects[project_name] = f'organization/{project_name}'
+            projects['project-without-config'] = None
+
+            template = ZuulProjectTemplate('template1', 'templates')
+            template.associate_job([ZuulJob('openstack-tox-pep8', 'check')])
+            templates = TemplateRegistry([template])
+            pipelines = [ZuulPipeline.CHECK]
+
+            sequential = discover_projects_jobs(projects, 'osp-18.0',
+                                                templates, pipelines)
+            sequential_cache = {key: cache[key] for key in cache}
+            cache.clear()
+
+            parallel = discover_projects_jobs(projects, 'osp-18.0',
+                                              templates, pipelines,
+                                              processes=3)
+            parallel_cache = {key: cache[key] for key in cache}
+
+        self.assertEqual(len(parallel), len(projects))
+        for jobs1, jobs2 in zip(sequential, parallel):
+            self.assertEqual(len(jobs1), len(jobs2))
+            for job1, job2 in zip(jobs1, jobs2):
+                self.assertTrue(job1.really_equal(job2))
+
+        self.assertEqual([job.parameters['vars'].get('index')
+                          for jobs in parallel[:-1] for job in jobs
+                          if job.name == 'osp-rpm-py39'
+                          and job.pipeline == 'check'],
+                         [0, 1, 2, 3, 4])
+        self.assertEqual(parallel[-1], [])
+
+        self.assertEqual(len(parallel_cache), 5)
+        self.assertEqual(sequential_cache.keys(), parallel_cache.keys())
+        self.assertTrue(cache.changed)
+
     @patch('znoyder.generator.discover_jobs')
-    @patch('znoyder.finder.find_templates')
     @patch('znoyder.finder.find_pipelines')
     @patch('znoyder.generator.fetch_osp_projects')
-    @patch('znoyder.generator.fetch_templates_directory')
+    @patch('znoyder.generator.fetch_templates')
     @patch('znoyder.generator.branches_map')
     def test_generate_projects_pipelines_dict(self,
                                               mock_branches_map,
                                               mock_gen_templates,
                                               mock_gen_projects,
                                               mock_find_pipelines,
-                                              mock_find_templates,
                                               mock_discover_jobs):
         args = Mock()
         args.tag = 'tag1,tag2'
@@ -242,10 +375,10 @@ class TestGenerator(TestCase):
         args.osp_name = None
         args.osp_project = None
         args.project = None
+        args.jobs = 1
 
         mock_branches_map.get.return_value = {'upstream': 'upstream1',
                                               'downstream': 'branch1'}
-        mock_gen_templates.return_value = 'organization/templates'
         mock_gen_projects.side_effect = [
             # tag1
             {'project1': 'upstream1/organization/repository1',
@@ -263,7 +396,7 @@ class TestGenerator(TestCase):
         job5 = ZuulJob('job5', 'check')
 
         mock_find_pipelines.return_value = ['check', 'gate']
-        mock_find_templates.return_value = [job0]
+        mock_gen_templates.return_value = [job0]
 
         mock_discover_jobs.side_effect = [
             [job1, job2, job3],
@@ -302,8 +435,16 @@ class TestGenerator(TestCase):
         self.assertEqual(len(mock_log.records), 10)
         self.assertEqual(mock_log.output, expected_log)
 
+        # The templates are discovered only once for all the tags
+        mock_gen_templates.assert_called_once_with(['check', 'gate'], 1)
+        self.assertEqual(mock_discover_jobs.call_count, 3)
+        mock_discover_jobs.assert_any_call(
+            'project1', 'tag1', 'upstream1/organization/repository1',
+            [job0], ['check', 'gate']
+        )
+
     @patch('znoyder.generator.fetch_osp_projects')
-    @patch('znoyder.generator.fetch_templates_directory')
+    @patch('znoyder.generator.fetch_templates')
     @patch('znoyder.generator.branches_map')
     def test_generate_projects_pipelines_dict_no_projects(self,
                                                           mock_branches_map,
@@ -316,11 +457,12 @@ class TestGenerator(TestCase):
         args.osp_name = 'any3'
         args.osp_project = 'any4'
         args.project = 'any5'
+        args.jobs = 1
 
         mock_branches_map.keys.return_value = {'tag2'}
         mock_branches_map.get.return_value = {'upstream': 'non-relevant',
                                               'downstream': 'branch1'}
-        mock_gen_templates.return_value = 'organization/templates'
+        mock_gen_templates.return_value = []
         mock_gen_projects.return_value = {}
 
         with self.assertLogs(LOG) as mock_log:
@@ -472,3 +614,18 @@ class TestGenerator(TestCase):
         ]
         self.assertEqual(len(mock_log.records), 1)
         self.assertEqual(mock_log.output, expected_log)
+
+    @patch('znoyder.generator.cache')
+    @patch('znoyder.generator.generate_resources_config')
+    @patch('znoyder.generator.generate_projects_config')
+    @patch('znoyder.generator.generate_projects_templates')
+    @patch('znoyder.generator.generate_projects_pipelines_dict')
+    @patch('znoyder.generator.cleanup_generated_jobs_dir')
+    def test_main_cache_unchanged(self, mock_cleanup, mock_gen_dict,
+                                  mock_gen_templates, mock_gen_projects,
+                                  mock_gen_resources, mock_cache):
+        mock_cache.changed = False
+        main(None)
+
+        # Access times are recorded even if no entry has changed
+        mock_cache.save.assert_called_once()
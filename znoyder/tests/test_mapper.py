@@ -30,6 +30,7 @@ from znoyder.mapper import include_map
 from znoyder.mapper import include_jobs
 from znoyder.mapper import override_map
 from znoyder.mapper import override_jobs
+from znoyder.mapper import RuleSet
 from znoyder.lib.zuul import ZuulJob
 
 
@@ -763,3 +764,102 @@ class TestCopyJobs(TestCase):
         })
 
         self.assertRaises(SystemExit, copy_jobs, jobs, 'any', 'any')
+
+
+class TestRuleSet(TestCase):
+    def setUp(self) -> None:
+        self.exclude = {
+            '/.*/': {'/.*/': {'job1': ''}},
+            'project_2': {'/.*/': {'/^job2/': ''}},
+        }
+        self.add = {
+            '/^project_/': {
+                'tag_1': {'job3': {'pipeline': ['check', 'gate']}},
+            },
+        }
+        self.override = {
+            '/.*/': {
+                '/.*/': {
+                    '/^job/': {'voting': False},
+                    'job3': {'pipeline': 'gate', 'voting': None},
+                },
+            },
+        }
+        self.copy = {
+            '/.*/': {
+                'tag_1': [{'job4': {'as': 'job5', 'voting': True}}],
+            },
+        }
+        self.rules = RuleSet(exclude=self.exclude, add=self.add,
+                             override=self.override, copy=self.copy)
+
+    def get_jobs(self) -> list:
+        return [ZuulJob('job1', 'check'), ZuulJob('job2', 'check'),
+                ZuulJob('job4', 'check', {'timeout': 10})]
+
+    def test_same_as_mapper_functions(self):
+        exclude_map.clear()
+        exclude_map.update(self.exclude)
+        add_map.clear()
+        add_map.update(self.add)
+        override_map.clear()
+        override_map.update(self.override)
+        copy_map.clear()
+        copy_map.update(self.copy)
+
+        for project in ('project_1', 'project_2', 'other'):
+            for tag in ('tag_1', 'tag_2'):
+                with self.subTest(project=project, tag=tag):
+                    expected = self.get_jobs()
+                    expected = exclude_jobs(expected, project, tag)
+                    expected = add_jobs(expected, project, tag)
+                    expected = override_jobs(expected, project, tag)
+                    expected = copy_jobs(expected, project, tag)
+
+                    jobs = self.rules.apply(self.get_jobs(), project, tag)
+
+                    self.assertEqual(jobs, expected)
+                    for job, expected_job in zip(jobs, expected):
+                        self.assertTrue(job.really_equal(expected_job))
+
+    def test_apply(self):
+        jobs = self.rules.apply(self.get_jobs(), 'project_2', 'tag_1')
+
+        self.assertEqual(jobs, [ZuulJob('job4', 'check'),
+                                ZuulJob('job3', 'check'),
+                                ZuulJob('job3', 'gate'),
+                                ZuulJob('job5', 'check')])
+        self.assertEqual(jobs[0].parameters, {'timeout': 10,
+                                              'voting': False})
+        self.assertEqual(jobs[1].parameters, {'voting': False})
+        self.assertEqual(jobs[2].parameters, {})
+        self.assertEqual(jobs[3].parameters, {'timeout': 10,
+                                              'voting': True})
+
+    def test_resolve_memoized(self):
+        actions = self.rules.resolve('project_1', 'tag_1')
+
+        self.assertIs(self.rules.resolve('project_1', 'tag_1'), actions)
+        self.assertIsNot(self.rules.resolve('project_1', 'tag_2'), actions)
+
+        exclude, add, override, copy = actions
+        self.assertEqual([specifier.specifier for specifier in exclude],
+                         ['job1'])
+        self.assertEqual(add, [ZuulJob('job3', 'check'),
+                               ZuulJob('job3', 'gate')])
+        self.assertEqual([(job.specifier, pipeline.specifier, options)
+                          for job, pipeline, options in override],
+                         [('/^job/', '/.*/', {'voting': False}),
+                          ('job3', 'gate', {'voting': None})])
+        self.assertEqual(copy, self.copy['/.*/']['tag_1'])
+
+    def test_maps_not_modified(self):
+        self.rules.apply(self.get_jobs(), 'project_1', 'tag_1')
+        self.rules.apply(self.get_jobs(), 'project_2', 'tag_1')
+
+        self.assertEqual(self.add['/^project_/']['tag_1'],
+                         {'job3': {'pipeline': ['check', 'gate']}})
+        self.assertEqual(self.override['/.*/']['/.*/']['job3'],
+                         {'pipeline': 'gate', 'voting': None})
+        self.assertEqual(self.copy['/.*/']['tag_1'],
+                         [{'job4': {'as': 'job5', 'voting': True}}])
@@ -16,12 +16,25 @@
 #    under the License.
 #
 
+import logging
+import multiprocessing
+import os
+import re
+from tempfile import TemporaryDirectory
 from unittest import TestCase
+from unittest.mock import patch
 
+from znoyder.lib.exceptions import PathError
+from znoyder.lib.utils import compile_specifiers
 from znoyder.lib.utils import drop_nones_from_dict
+from znoyder.lib.utils import get_config_paths
+from znoyder.lib.utils import get_files_fingerprint
+from znoyder.lib.utils import get_process_context
+from znoyder.lib.utils import get_specifier
 from znoyder.lib.utils import match
 from znoyder.lib.utils import merge_dicts
 from znoyder.lib.utils import sort_dict_by_keys
+from znoyder.lib.utils import Specifier
 
 
 class TestDropper(TestCase):
@@ -35,12 +48,155 @@ class TestDropper(TestCase):
         self.assertEqual(actual, expected)
 
 
+class TestConfigPaths(TestCase):
+    FILES = [
+        'zuul.yaml', '.zuul.yaml', 'zuul.yaml.orig', 'setup.py',
+        'zuul.d/b.yaml', 'zuul.d/a.yaml', 'zuul.d/README',
+        'zuul.d/nested/c.yaml', '.zuul.d/d.yaml',
+        'docs/zuul.yaml', 'docs/zuul.d/e.yaml', '.git/zuul.yaml',
+    ]
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.test_directory = TemporaryDirectory()
+        self.directory = self.test_directory.name
+
+        for name in self.FILES:
+            path = os.path.join(self.directory, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as file:
+                file.write('---\n')
+
+    def tearDown(self):
+        self.test_directory.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def get_paths(self, *names) -> list:
+        return [os.path.join(self.directory, name) for name in names]
+
+    def test_known_locations(self):
+        self.assertEqual(get_config_paths(self.directory), self.get_paths(
+            '.zuul.d/d.yaml', '.zuul.yaml',
+            'zuul.d/a.yaml', 'zuul.d/b.yaml', 'zuul.yaml',
+        ))
+
+    def test_recursive(self):
+        self.assertEqual(
+            get_config_paths(self.directory, recursive=True),
+            self.get_paths(
+                '.zuul.d/d.yaml', '.zuul.yaml',
+                'docs/zuul.d/e.yaml', 'docs/zuul.yaml',
+                'zuul.d/a.yaml', 'zuul.d/b.yaml', 'zuul.yaml',
+            )
+        )
+
+    def test_config_directory(self):
+        directory = os.path.join(self.directory, 'zuul.d')
+
+        self.assertEqual(get_config_paths(directory),
+                         self.get_paths('zuul.d/a.yaml', 'zuul.d/b.yaml'))
+        self.assertEqual(get_config_paths(directory + '/'),
+                         self.get_paths('zuul.d/a.yaml', 'zuul.d/b.yaml'))
+
+    def test_config_file_named_as_directory(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'zuul.d')
+            with open(path, 'w') as file:
+                file.write('---\n')
+
+            self.assertEqual(get_config_paths(directory), [path])
+
+    def test_errors(self):
+        self.assertRaises(PathError, get_config_paths,
+                          os.path.join(self.directory, 'missing'))
+        self.assertRaises(PathError, get_config_paths,
+                          os.path.join(self.directory, 'setup.py'))
+
+
+class TestFingerprint(TestCase):
+    def test_get_files_fingerprint(self):
+        with TemporaryDirectory() as directory:
+            path1 = os.path.join(directory, 'file1')
+            path2 = os.path.join(directory, 'file2')
+            for path in (path1, path2):
+                with open(path, 'w') as file:
+                    file.write('content')
+
+            fingerprint = get_files_fingerprint([path1, path2])
+
+            self.assertEqual(fingerprint, get_files_fingerprint([path2,
+                                                                 path1]))
+            self.assertNotEqual(fingerprint, get_files_fingerprint([path1]))
+            self.assertNotEqual(fingerprint, get_files_fingerprint([]))
+
+            with open(path2, 'a') as file:
+                file.write('more content')
+
+            self.assertNotEqual(fingerprint, get_files_fingerprint([path1,
+                                                                    path2]))
+
+
+class TestProcessContext(TestCase):
+    def test_get_process_context(self):
+        context = get_process_context()
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            self.assertEqual(context.get_start_method(), 'fork')
+        else:  # pragma: no cover
+            self.assertIs(context, multiprocessing.get_context())
+
+
 class TestMatcher(TestCase):
     def test_match(self):
         self.assertTrue(match('foobar', 'foobar'))
         self.assertFalse(match('foobar', 'foo'))
         self.assertTrue(match('foobar', '/foo/'))
 
+    def test_match_whole_regex(self):
+        self.assertTrue(match('foobar', '/bar$/'))
+        self.assertFalse(match('foobaz', '/bar$/'))
+        self.assertTrue(match('', '/.*/'))
+
+    def test_match_literal(self):
+        self.assertTrue(match('oslo.log', 'oslo.log'))
+        self.assertFalse(match('osloXlog', 'oslo.log'))
+        self.assertTrue(match('/', '/'))
+        self.assertFalse(match('foo', '/'))
+
+    def test_specifier(self):
+        regex = Specifier('/^osp-1[67]/')
+        literal = Specifier('osp-17.0')
+
+        self.assertIsNone(literal.regex)
+        self.assertEqual(regex.regex.pattern, '^osp-1[67]')
+        self.assertTrue(regex.match('osp-16.2'))
+        self.assertFalse(regex.match('osp-18.0'))
+        self.assertTrue(match('osp-17.1', regex))
+        self.assertTrue(match('osp-17.0', literal))
+        self.assertEqual(repr(literal), "Specifier('osp-17.0')")
+
+    def test_get_specifier(self):
+        specifier = get_specifier('/some-unique-specifier/')
+
+        self.assertIsInstance(specifier, Specifier)
+        self.assertIs(get_specifier('/some-unique-specifier/'), specifier)
+        self.assertIs(get_specifier(specifier), specifier)
+
+    @patch('znoyder.lib.utils.re.compile', wraps=re.compile)
+    def test_compile_specifiers(self, mock_compile):
+        rules = {'/^project-a/': {'/^tag-a/': {'/^job-a/': {}}},
+                 '/^project-b/': {}}
+
+        compile_specifiers(rules, depth=2)
+        self.assertEqual(mock_compile.call_count, 3)
+
+        self.assertTrue(match('project-a', '/^project-a/'))
+        self.assertTrue(match('tag-a', '/^tag-a/'))
+        self.assertEqual(mock_compile.call_count, 3)
+
+        self.assertTrue(match('job-a', '/^job-a/'))
+        self.assertEqual(mock_compile.call_count, 4)
+
 
 class TestMerger(TestCase):
     def test_merge_dicts(self):
@@ -55,6 +211,14 @@ class TestMerger(TestCase):
         self.assertRaises(Exception, merge_dicts,
                           {'a': 1, 'b': {'c': 2}}, {'b': {'c': 3}})
 
+    def test_merge_dicts_copies_values(self):
+        source = {'a': {'b': [1]}, 'c': {'d': 2}}
+        actual = merge_dicts({'c': {'d': 1}}, source, override=True)
+
+        actual['a']['b'].append(2)
+        actual['c']['d'] = 3
+        self.assertEqual(source, {'a': {'b': [1]}, 'c': {'d': 2}})
+
 
 class TestSorter(TestCase):
     def test_sort_dict_by_keys(self):
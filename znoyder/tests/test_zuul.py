@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+#
+# Copyright 2024 Red Hat, Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import logging
+import os
+import pickle
+from tempfile import TemporaryDirectory
+from unittest import skipIf
+from unittest import TestCase
+from unittest.mock import patch
+
+import yaml
+
+from znoyder.lib.exceptions import YAMLDuplicateKeyError
+from znoyder.lib.zuul import extract_config
+from znoyder.lib.zuul import ExtractionError
+from znoyder.lib.zuul import JobSet
+from znoyder.lib.zuul import parse_config
+from znoyder.lib.zuul import TemplateRegistry
+from znoyder.lib.yaml import NoAliasDumper
+from znoyder.lib.zuul import ZuulConfigBuffer
+from znoyder.lib.zuul import ZuulCSafeLoader
+from znoyder.lib.zuul import ZuulJob
+from znoyder.lib.zuul import ZuulLoader
+from znoyder.lib.zuul import ZuulMark
+from znoyder.lib.zuul import ZuulPipeline
+from znoyder.lib.zuul import ZuulProject
+from znoyder.lib.zuul import ZuulProjectTemplate
+from znoyder.lib.zuul import ZuulSafeLoader
+
+
+def setUpModule() -> None:
+    logging.disable(logging.CRITICAL)
+
+
+def tearDownModule() -> None:
+    logging.disable(logging.NOTSET)
+
+
+EXAMPLE_ZUUL_CONFIG = """
+- job:
+    name: job1
+    parent: base
+
+- project:
+    templates:
+      - template1
+    check:
+      jobs:
+        - job1
+        - job2
+
+- project-template:
+    name: template1
+    check:
+      jobs:
+        - job3
+"""
+
+
+DUPLICATED_KEY_CONFIG = """
+- job:
+    name: job1
+    name: job2
+"""
+
+
+class TestZuulLoaders(TestCase):
+    loaders = [ZuulSafeLoader]
+    if ZuulCSafeLoader is not None:
+        loaders.append(ZuulCSafeLoader)
+
+    def test_default_loader(self):
+        if ZuulCSafeLoader is not None:
+            self.assertIs(ZuulLoader, ZuulCSafeLoader)
+        else:  # pragma: no cover
+            self.assertIs(ZuulLoader, ZuulSafeLoader)
+
+    def test_duplicated_keys(self):
+        for loader in self.loaders:
+            with self.subTest(loader=loader.__name__):
+                with self.assertRaises(YAMLDuplicateKeyError) as error:
+                    loader(DUPLICATED_KEY_CONFIG, 'null').get_single_data()
+
+                self.assertIn("The key 'name' appears more than once",
+                              error.exception.message)
+                self.assertIn('name: job1', error.exception.message)
+
+    def test_encrypted(self):
+        config = '- secret:\n    data: !encrypted/pkcs1-oaep [a, b]\n'
+
+        for loader in self.loaders:
+            with self.subTest(loader=loader.__name__):
+                data = loader(config, 'null').get_single_data()
+                self.assertEqual(data[0]['secret']['data'], ['a', 'b'])
+
+    def test_marks(self):
+        for loader in self.loaders:
+            with self.subTest(loader=loader.__name__):
+                data = loader(EXAMPLE_ZUUL_CONFIG, 'null').get_single_data()
+                mark = data[0]['job']['_start_mark']
+
+                self.assertIs(mark._stream.text, EXAMPLE_ZUUL_CONFIG)
+                self.assertEqual(mark.snippet,
+                                 'job:\n    name: job1\n    parent: base\n\n')
+                self.assertEqual(mark.line, 1)
+
+                restored = pickle.loads(pickle.dumps(mark))
+                self.assertEqual(restored, mark)
+                self.assertEqual(restored.serialize(), mark.serialize())
+                self.assertEqual(
+                    ZuulMark.deserialize(mark.serialize()).snippet,
+                    mark.snippet
+                )
+
+    def test_marks_from_bytes(self):
+        config = '- job:\n    name: zażółć\n\n- job:\n    name: gęślą\n'
+
+        for loader in self.loaders:
+            with self.subTest(loader=loader.__name__):
+                buffer = ZuulConfigBuffer(config.encode('utf-8'))
+                data = loader(buffer, 'null').get_single_data()
+                mark = data[1]['job']['_start_mark']
+
+                self.assertEqual(data[1]['job']['name'], 'gęślą')
+                self.assertIs(mark._stream, buffer)
+                self.assertIsNone(buffer._text)
+
+                self.assertEqual(mark.snippet, 'job:\n    name: gęślą\n')
+                self.assertEqual(buffer.text, config)
+                self.assertEqual(pickle.loads(pickle.dumps(mark)).snippet,
+                                 mark.snippet)
+
+    def test_marks_disabled(self):
+        for loader in self.loaders:
+            with self.subTest(loader=loader.__name__):
+                data = loader(EXAMPLE_ZUUL_CONFIG, 'null',
+                              marks=False).get_single_data()
+                self.assertEqual(data[0]['job'],
+                                 {'name': 'job1', 'parent': 'base',
+                                  '_source_context': 'null'})
+
+                with self.assertRaises(YAMLDuplicateKeyError) as error:
+                    loader(DUPLICATED_KEY_CONFIG, 'null',
+                           marks=False).get_single_data()
+                self.assertIn('name: job1', error.exception.message)
+
+    @skipIf(ZuulCSafeLoader is None, 'libyaml is not available')
+    def test_same_results(self):
+        expected = ZuulSafeLoader(EXAMPLE_ZUUL_CONFIG,
+                                  'null').get_single_data()
+        actual = ZuulCSafeLoader(EXAMPLE_ZUUL_CONFIG,
+                                 'null').get_single_data()
+
+        self.assertEqual(actual, expected)
+        for entry_actual, entry_expected in zip(actual, expected):
+            mark_actual = list(entry_actual.values())[0]['_start_mark']
+            mark_expected = list(entry_expected.values())[0]['_start_mark']
+            self.assertEqual(mark_actual.serialize(),
+                             mark_expected.serialize())
+
+
+class TestExtractConfig(TestCase):
+    config = EXAMPLE_ZUUL_CONFIG + """
+- project:
+    name: project1
+    vars:
+      key: value
+    gate:
+      jobs:
+        - job4
+    check:
+      jobs:
+        - job5:
+            voting: false
+"""
+
+    def full_config(self):
+        config = {}
+        for entry in ZuulLoader(self.config, 'null').get_single_data():
+            for section, value in entry.items():
+                config.setdefault(section, []).append(value)
+        return config
+
+    loaders = [yaml.SafeLoader]
+    if ZuulCSafeLoader is not None:
+        loaders.append(yaml.CSafeLoader)
+
+    def test_extract(self):
+        full = self.full_config()
+
+        for loader in self.loaders:
+            with self.subTest(loader=loader.__name__), \
+                    patch('znoyder.lib.zuul.EventLoader', loader):
+                config = extract_config(self.config, ['check'])
+
+                self.assertNotIn('job', config)
+                self.assertEqual(config['project-template'],
+                                 full['project-template'])
+                self.assertEqual(config['project'][0], full['project'][0])
+                self.assertEqual(config['project'][1], {
+                    'name': 'project1',
+                    'check': {'jobs': [{'job5': {'voting': False}}]},
+                    '_source_context': 'null',
+                    '_start_mark': full['project'][1]['_start_mark'],
+                })
+
+                for section in ('project', 'project-template'):
+                    for actual, expected in zip(config[section],
+                                                full[section]):
+                        self.assertEqual(
+                            actual['_start_mark'].serialize(),
+                            expected['_start_mark'].serialize()
+                        )
+
+    def test_extract_without_marks(self):
+        config = extract_config(self.config, [], marks=False)
+
+        self.assertEqual(config, {
+            'project': [
+                {'templates': ['template1'], '_source_context': 'null'},
+                {'name': 'project1', '_source_context': 'null'},
+            ],
+            'project-template': [
+                {'name': 'template1', '_source_context': 'null'},
+            ],
+        })
+
+    def test_extract_empty(self):
+        for stream in ('', '---\n', '# comment\n'):
+            with self.subTest(stream=stream):
+                self.assertEqual(extract_config(stream, ['check']), {})
+
+    def test_extract_unsupported(self):
+        streams = [
+            '- project: &anchor\n    check: {}\n- project: *anchor\n',
+            '- project:\n    check: !custom {}\n',
+            '- project:\n    name: a\n    name: b\n',
+            '- project:\n    name: a\n---\n- job:\n    name: b\n',
+            'project:\n  name: a\n',
+            '- project: {name: p, <<: {check: {jobs: [b]}}}\n',
+            '- job: &job {name: a}\n- project:\n    vars: *job\n',
+            '- <<: {project: {name: p}}\n',
+        ]
+
+        for stream in streams:
+            with self.subTest(stream=stream):
+                with self.assertRaises(ExtractionError):
+                    extract_config(stream, ['check'])
+
+    def test_parse_config_fallback(self):
+        stream = ('- project: &anchor\n    check: {}\n- project: *anchor\n'
+                  '- project: {name: p, <<: {check: {jobs: [b]}}}\n')
+
+        with TemporaryDirectory() as directory:
+            config_file = os.path.join(directory, 'zuul.yaml')
+            with open(config_file, 'w', encoding='utf-8') as file:
+                file.write(stream)
+
+            config = parse_config(config_file, pipelines=['check'])
+            self.assertEqual(config, parse_config(config_file))
+            self.assertEqual(config['project'][2]['check'],
+                             {'jobs': ['b']})
+
+
+class TestZuulProject(TestCase):
+    def setUp(self):
+        self.test_directory = TemporaryDirectory()
+        self.project_dir = self.test_directory.name
+        self.config_file = os.path.join(self.project_dir, 'zuul.yaml')
+        with open(self.config_file, 'w', encoding='utf-8') as file:
+            file.write(EXAMPLE_ZUUL_CONFIG)
+
+    def tearDown(self):
+        self.test_directory.cleanup()
+
+    def test_config_parsed_once(self):
+        pipelines = [ZuulPipeline.CHECK]
+        project = ZuulProject(project_path=self.project_dir)
+
+        with patch.object(ZuulLoader, 'get_single_data',
+                          autospec=True,
+                          side_effect=ZuulLoader.get_single_data) as mock:
+            jobs = project.get_list_of_jobs(pipelines)
+            templates = project.get_list_of_used_templates()
+            defined = project.get_list_of_defined_templates(pipelines)
+
+        self.assertEqual(mock.call_count, 1)
+        self.assertEqual([job.name for job in jobs], ['job1', 'job2'])
+        self.assertEqual([str(template) for template in templates],
+                         ['template1'])
+        self.assertEqual([str(template) for template in defined],
+                         ['template1'])
+
+    def test_parsed_config_indexed_by_section(self):
+        project = ZuulProject(project_path=self.project_dir)
+
+        config = project._get_parsed_config(self.config_file)
+
+        self.assertEqual(sorted(config.keys()),
+                         ['job', 'project', 'project-template'])
+        self.assertEqual(config['job'][0]['name'], 'job1')
+        self.assertEqual(config['project-template'][0]['name'], 'template1')
+        self.assertEqual(
+            project._get_entries_from_config(self.config_file, 'semaphore'),
+            []
+        )
+
+    def write_config_dir(self, count) -> None:
+        config_dir = os.path.join(self.project_dir, 'zuul.d')
+        os.makedirs(config_dir)
+
+        for index in range(count):
+            path = os.path.join(config_dir, f'jobs{index}.yaml')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(f'- project-template:\n'
+                           f'    name: template{index}\n'
+                           f'    check:\n'
+                           f'      jobs:\n'
+                           f'        - job{index}\n')
+
+    def test_parallel_parsing(self):
+        self.write_config_dir(5)
+        pipelines = [ZuulPipeline.CHECK]
+
+        expected = ZuulProject(project_path=self.project_dir)
+        project = ZuulProject(project_path=self.project_dir, processes=3)
+
+        templates = project.get_list_of_defined_templates(pipelines)
+
+        self.assertEqual(list(project.parsed_configs),
+                         project.get_project_config_files())
+        self.assertEqual(project.parsed_configs,
+                         {path: expected._get_parsed_config(path)
+                          for path in expected.get_project_config_files()})
+        self.assertEqual(
+            [str(template) for template in templates],
+            [str(template) for template in
+             expected.get_list_of_defined_templates(pipelines)]
+        )
+        self.assertEqual(templates[4].template_jobs,
+                         [ZuulJob('job4', 'check')])
+
+    def test_without_marks(self):
+        project = ZuulProject(project_path=self.project_dir, marks=False)
+
+        config = project._get_parsed_config(self.config_file)
+        self.assertNotIn('_start_mark', config['project'][0])
+        self.assertEqual([job.name for job in
+                          project.get_list_of_jobs([ZuulPipeline.CHECK])],
+                         ['job1', 'job2'])
+
+    def test_extracted_pipelines(self):
+        project = ZuulProject(project_path=self.project_dir,
+                              pipelines=[ZuulPipeline.CHECK])
+
+        config = project._get_parsed_config(self.config_file)
+        self.assertNotIn('job', config)
+        self.assertEqual([job.name for job in
+                          project.get_list_of_jobs([ZuulPipeline.CHECK])],
+                         ['job1', 'job2'])
+
+    def test_parallel_parsing_error(self):
+        self.write_config_dir(2)
+        with open(self.config_file, 'a', encoding='utf-8') as file:
+            file.write(DUPLICATED_KEY_CONFIG)
+
+        project = ZuulProject(project_path=self.project_dir, processes=2)
+
+        with self.assertRaises(YAMLDuplicateKeyError):
+            project.get_list_of_jobs([ZuulPipeline.CHECK])
+
+    def test_empty_config(self):
+        with open(self.config_file, 'w', encoding='utf-8') as file:
+            file.write('---\n')
+
+        project = ZuulProject(project_path=self.project_dir)
+
+        self.assertEqual(project.get_list_of_jobs([ZuulPipeline.CHECK]), [])
+        self.assertEqual(project._get_parsed_config(self.config_file), {})
+
+
+class TestTemplateRegistry(TestCase):
+    def test_lookup(self):
+        template1 = ZuulProjectTemplate('template1', 'project1')
+        template2 = ZuulProjectTemplate('template2', 'project1')
+
+        registry = TemplateRegistry([template1, template2])
+
+        self.assertEqual(len(registry), 2)
+        self.assertEqual(list(registry), [template1, template2])
+        self.assertIs(registry['template1'], template1)
+        self.assertIs(registry.get('template2'), template2)
+        self.assertIsNone(registry.get('template3'))
+        self.assertIn('template1', registry)
+        self.assertNotIn('template3', registry)
+        self.assertEqual(registry.collisions, [])
+
+    def test_collisions(self):
+        template1 = ZuulProjectTemplate('template1', 'project1')
+        duplicate = ZuulProjectTemplate('template1', 'project1')
+        shadowed = ZuulProjectTemplate('template1', 'project2')
+
+        registry = TemplateRegistry()
+
+        self.assertTrue(registry.add(template1))
+        self.assertFalse(registry.add(duplicate))
+        self.assertFalse(registry.add(shadowed))
+
+        self.assertEqual(len(registry), 1)
+        self.assertIs(registry['template1'], template1)
+        self.assertEqual(registry.collisions,
+                         [(template1, duplicate), (template1, shadowed)])
+
+    def test_project_accepts_registry_and_list(self):
+        template1 = ZuulProjectTemplate('template1', 'project1')
+        registry = TemplateRegistry([template1])
+
+        project = ZuulProject(project_path='some/path', templates=registry)
+        self.assertIs(project.all_templates, registry)
+        self.assertIs(project._get_availabie_template('template1'),
+                      template1)
+
+        project = ZuulProject(project_path='some/path',
+                              templates=[template1])
+        self.assertIsInstance(project.all_templates, TemplateRegistry)
+        self.assertIs(project._get_availabie_template('template1'),
+                      template1)
+
+        missing = project._get_availabie_template('template2')
+        self.assertIsInstance(missing, ZuulProjectTemplate)
+        self.assertEqual(str(missing), 'template2')
+
+    def test_snapshot(self):
+        template1 = ZuulProjectTemplate('template1', 'project1')
+        template1.associate_job([ZuulJob('job1', 'check', {'voting': True})])
+        template2 = ZuulProjectTemplate('template2', 'project2')
+
+        registry = TemplateRegistry([template1, template2])
+        data = yaml.dump(registry.serialize(), Dumper=NoAliasDumper)
+        restored = TemplateRegistry.deserialize(yaml.safe_load(data))
+
+        self.assertEqual([str(template) for template in restored],
+                         ['template1', 'template2'])
+        self.assertEqual(restored['template1'].template_project, 'project1')
+        self.assertEqual(restored['template2'].template_project, 'project2')
+        self.assertEqual(restored['template1'].template_jobs,
+                         [ZuulJob('job1', 'check')])
+        self.assertTrue(restored['template1'].template_jobs[0].really_equal(
+            ZuulJob('job1', 'check', {'voting': True})))
+        self.assertEqual(restored['template2'].template_jobs, [])
+
+    def test_fingerprint(self):
+        template1 = ZuulProjectTemplate('template1', 'project1')
+        template1.associate_job([ZuulJob('job1', 'check')])
+        template2 = ZuulProjectTemplate('template2', 'project1')
+
+        registry = TemplateRegistry([template1])
+        same = TemplateRegistry([template1])
+        fingerprint = registry.fingerprint
+
+        self.assertEqual(len(fingerprint), 64)
+        self.assertEqual(fingerprint, same.fingerprint)
+
+        registry.add(template2)
+        self.assertNotEqual(registry.fingerprint, fingerprint)
+
+        registry.fingerprint = 'files-fingerprint'
+        self.assertEqual(registry.fingerprint, 'files-fingerprint')
+
+    def test_snapshot_version(self):
+        data = TemplateRegistry().serialize()
+        data['version'] = TemplateRegistry.SNAPSHOT_VERSION + 1
+
+        with self.assertRaises(ValueError):
+            TemplateRegistry.deserialize(data)
+
+
+class TestJobSet(TestCase):
+    def setUp(self):
+        self.jobs = [ZuulJob('job1', 'check'), ZuulJob('job2', 'check'),
+                     ZuulJob('job1', 'gate'), ZuulJob('other', 'check')]
+        self.job_set = JobSet(self.jobs)
+
+    def test_select_literal(self):
+        self.assertEqual(self.job_set.select('job1'),
+                         [self.jobs[0], self.jobs[2]])
+        self.assertEqual(self.job_set.select('job1', 'gate'), [self.jobs[2]])
+        self.assertEqual(self.job_set.get('job1', 'gate'), [self.jobs[2]])
+        self.assertEqual(self.job_set.select('job3'), [])
+        self.assertEqual(self.job_set.select('job2', 'gate'), [])
+
+    def test_select_regex(self):
+        self.assertEqual(self.job_set.select('/^job/', 'check'),
+                         [self.jobs[0], self.jobs[1]])
+        self.assertEqual(self.job_set.select('/.*/', '/^(gate|check)$/'),
+                         self.jobs)
+
+    def test_add_keeps_list_and_order(self):
+        job = ZuulJob('job0', 'check')
+        self.job_set.add(job)
+
+        self.assertIs(self.job_set.jobs, self.jobs)
+        self.assertEqual(len(self.job_set), 5)
+        self.assertEqual(list(self.job_set)[-1], job)
+        self.assertEqual(self.job_set.select('/^job/', 'check'),
+                         [self.jobs[0], self.jobs[1], job])
+
+    def test_exclude(self):
+        self.job_set.exclude(['job2', '/^oth/', 'job3'])
+
+        self.assertEqual(self.job_set.jobs, [self.jobs[0], self.jobs[2]])
+        self.assertEqual(self.job_set.select('/.*/'),
+                         [self.jobs[0], self.jobs[2]])
+        self.assertEqual(len(self.jobs), 4)
+
+        self.job_set.exclude([])
+        self.assertEqual(len(self.job_set), 2)
+
+
+class TestZuulJob(TestCase):
+    def test_copy_on_write(self):
+        parameters = {'vars': {'index': 1}}
+        job = ZuulJob('job1', 'check', parameters)
+        copy = job.copy()
+
+        self.assertIs(copy._parameters, job._parameters)
+
+        copy.parameters['vars']['index'] = 2
+        self.assertEqual(job.parameters, {'vars': {'index': 1}})
+        self.assertEqual(copy.parameters, {'vars': {'index': 2}})
+        self.assertEqual(parameters, {'vars': {'index': 1}})
+
+        job.parameters['voting'] = False
+        self.assertEqual(parameters, {'vars': {'index': 1}})
+
+    def test_parameters_setter(self):
+        job = ZuulJob('job1', 'check', {'voting': True})
+        parameters = {'voting': False}
+        job.parameters = parameters
+
+        self.assertIs(job.parameters, parameters)
+
+    def test_yaml_round_trip(self):
+        job = ZuulJob('job1', 'check', {'voting': True})
+        job.copy()  # shared parameters are not part of the state
+
+        data = yaml.dump(job, Dumper=NoAliasDumper)
+        self.assertEqual(yaml.safe_load(data.replace('!ZuulJob', '')),
+                         {'name': 'job1', 'parameters': {'voting': True},
+                          'pipeline': 'check'})
+
+        restored = yaml.safe_load(data)
+        self.assertTrue(restored.really_equal(job))
+        restored.parameters['voting'] = False
+        self.assertEqual(job.parameters, {'voting': True})
+
+    def test_compact(self):
+        job = ZuulJob(''.join(['job', '1']), 'check')
+        template = ZuulProjectTemplate('template1', 'project1')
+
+        self.assertFalse(hasattr(job, '__dict__'))
+        self.assertFalse(hasattr(template, '__dict__'))
+        self.assertIs(job.name, ZuulJob('job1', 'gate').name)
+
+    def test_cached_hash(self):
+        job = ZuulJob('job1', 'check')
+        self.assertEqual(hash(job), hash(ZuulJob('job1', 'check')))
+
+        job.name = 'job2'
+        self.assertEqual(hash(job), hash(ZuulJob('job2', 'check')))
+        job.pipeline = 'gate'
+        self.assertEqual(hash(job), hash(ZuulJob('job2', 'gate')))
+        self.assertIn(job, {ZuulJob('job2', 'gate')})
+
+    def test_pickle(self):
+        job = ZuulJob('job1', 'check', {'voting': True})
+
+        restored = pickle.loads(pickle.dumps(job))
+        self.assertTrue(restored.really_equal(job))
+        self.assertFalse(restored._shared)
+
+    def test_load_existing_yaml(self):
+        data = ('- !ZuulJob\n'
+                '  name: job1\n'
+                '  parameters:\n'
+                '    voting: false\n'
+                '  pipeline: check\n')
+
+        for loader in ZuulJob.yaml_loader:
+            with self.subTest(loader=loader.__name__):
+                jobs = yaml.load(data, Loader=loader)
+                self.assertTrue(jobs[0].really_equal(
+                    ZuulJob('job1', 'check', {'voting': False})))